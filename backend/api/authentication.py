@@ -1,48 +1,52 @@
 import json
 import time
+from urllib.parse import parse_qs
 import requests
+from asgiref.sync import sync_to_async
 from jose import jwt
 from rest_framework import authentication, exceptions
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 
 class KeycloakOIDCAuthentication(authentication.BaseAuthentication):
     """Validate incoming Authorization: Bearer <JWT> from Keycloak.
     If settings.OIDC_VERIFY == 'mock', accept any token and set request.user as AnonymousUser
-    but with a .oidc_sub attribute via SimpleUser wrapper.
+    but with a .oidc_sub attribute via SimpleUser wrapper. Mock tokens of the form
+    'mock:<sub>' act as that subject (multi-user local testing, load tests).
     """
     def authenticate(self, request):
         auth = authentication.get_authorization_header(request).decode('utf-8')
         if not auth or not auth.lower().startswith('bearer '):
             return None
         token = auth.split(' ')[1]
+        return (SimpleUser(subject_for_token(token)), None)
 
-        if settings.OIDC_VERIFY == 'mock':
-            sub = 'mock-user'
-            user = SimpleUser(sub)
-            return (user, None)
-
-        try:
-            unverified = jwt.get_unverified_header(token)
-            jwks = _fetch_jwks(settings.OIDC_ISSUER)
-            key = None
-            for k in jwks['keys']:
-                if k['kid'] == unverified['kid']:
-                    key = k
-                    break
-            if not key:
-                raise exceptions.AuthenticationFailed('JWKS key not found')
-            payload = jwt.decode(
-                token,
-                key,
-                audience=settings.OIDC_AUDIENCE,
-                issuer=settings.OIDC_ISSUER,
-                options={'verify_at_hash': False},
-            )
-            sub = payload['sub']
-            user = SimpleUser(sub)
-            return (user, None)
-        except Exception as e:
-            raise exceptions.AuthenticationFailed(f'Invalid token: {e}')
+
+def subject_for_token(token: str) -> str:
+    """The OIDC subject a bearer token stands for; raises AuthenticationFailed if it is invalid."""
+    if settings.OIDC_VERIFY == 'mock':
+        return token[len('mock:'):] if token.startswith('mock:') and len(token) > 5 else 'mock-user'
+
+    try:
+        unverified = jwt.get_unverified_header(token)
+        jwks = _fetch_jwks(settings.OIDC_ISSUER)
+        key = None
+        for k in jwks['keys']:
+            if k['kid'] == unverified['kid']:
+                key = k
+                break
+        if not key:
+            raise exceptions.AuthenticationFailed('JWKS key not found')
+        payload = jwt.decode(
+            token,
+            key,
+            audience=settings.OIDC_AUDIENCE,
+            issuer=settings.OIDC_ISSUER,
+            options={'verify_at_hash': False},
+        )
+        return payload['sub']
+    except Exception as e:
+        raise exceptions.AuthenticationFailed(f'Invalid token: {e}')
 
 class SimpleUser:
     is_authenticated = True
@@ -51,6 +55,31 @@ class SimpleUser:
         self.username = sub
 
 
+class WebSocketTokenAuthMiddleware:
+    """Channels middleware setting scope['user'] from the socket's bearer token, as the REST API does.
+
+    Browsers can't set headers on a WebSocket, so the token is read from the
+    access_token query parameter, or else from an Authorization header.
+    Without a valid token the user is anonymous.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('access_token', [''])[0]
+        if not token:
+            auth = dict(scope.get('headers', ())).get(b'authorization', b'').decode('latin-1')
+            token = auth.split(' ', 1)[1] if auth.lower().startswith('bearer ') else ''
+        user = AnonymousUser()
+        if token:
+            try:
+                # Off the event loop: verifying a real token can fetch the JWKS
+                user = SimpleUser(await sync_to_async(subject_for_token)(token))
+            except exceptions.AuthenticationFailed:
+                pass
+        return await self.app({**scope, 'user': user}, receive, send)
+
+
 def _fetch_jwks(issuer: str):
     r = requests.get(f"{issuer}/.well-known/openid-configuration", timeout=5)
     r.raise_for_status()
@@ -0,0 +1,83 @@
+"""Session-backed asks: a bounded history window and retrieval reuse for follow-ups.
+
+A session remembers its last full retrieval: the unit query embedding and the
+best CHAT_CANDIDATE_POOL chunk ids. A follow-up whose embedding is close to
+that query (cosine >= CHAT_REUSE_SIMILARITY), asked while the owner's chunks
+are unchanged, is answered by re-ranking only those candidates; anything else
+scans the owner's index and replaces the cached candidates.
+"""
+from typing import List, Optional, Tuple
+from django.conf import settings
+from django.utils import timezone
+from .invalidation import current_version
+from .metrics import SESSION_RETRIEVALS
+from .models import ChatMessage, ChatSession
+from .rag import search
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; close enough for a budget
+    return len(text) // 4 + 1
+
+
+def history(session: ChatSession) -> List[Tuple[str, str]]:
+    """(role, content) of the session's latest messages within CHAT_HISTORY_TOKENS, oldest first."""
+    rows = (ChatMessage.objects.filter(session=session).order_by('-created_at', '-id')
+            .values_list('role', 'content')[:settings.CHAT_HISTORY_MESSAGES])
+    window, used = [], 0
+    for role, content in rows:
+        used += estimate_tokens(content)
+        if used > settings.CHAT_HISTORY_TOKENS:
+            break
+        window.append((role, content))
+    return window[::-1]
+
+
+def record(session: ChatSession, question: str, answer: str):
+    now = timezone.now()
+    # Same timestamp; the id keeps the answer after its question
+    ChatMessage.objects.bulk_create([
+        ChatMessage(session=session, role='user', content=question, created_at=now),
+        ChatMessage(session=session, role='assistant', content=answer, created_at=now),
+    ])
+
+
+def retrieve(session: ChatSession, owner_sub: str, query_embedding: List[float], top_k: int,
+             document_ids: Optional[List[int]] = None, mmr_lambda: float = 1.0, mmr_pool: int = 0):
+    """rag.search for a session ask, re-ranking the cached candidates when the follow-up allows it.
+
+    Returns (results, reused). Filtered asks always scan and don't replace the cache.
+    """
+    import numpy as np
+    q = np.asarray(query_embedding, dtype=np.float32)
+    norm = np.linalg.norm(q)
+    if norm:
+        q = q / norm
+    version = current_version(owner_sub)
+    if document_ids is None and _reusable(session, q, version, top_k):
+        results = search(owner_sub, q, top_k, mmr_lambda=mmr_lambda, mmr_pool=mmr_pool,
+                         chunk_ids=session.retrieval_chunks)
+        if len(results) >= top_k:
+            SESSION_RETRIEVALS.labels(source='cache').inc()
+            return results, True
+
+    SESSION_RETRIEVALS.labels(source='scan').inc()
+    pool = search(owner_sub, q, max(settings.CHAT_CANDIDATE_POOL, top_k), document_ids)
+    if document_ids is None:
+        ids = [chunk.pk for chunk, _ in pool]
+        ChatSession.objects.filter(pk=session.pk).update(
+            retrieval_query=q.astype('<f4').tobytes(), retrieval_chunks=ids, retrieval_version=version)
+    if mmr_lambda < 1.0 and mmr_pool > top_k:
+        return search(owner_sub, q, top_k, mmr_lambda=mmr_lambda, mmr_pool=mmr_pool,
+                      chunk_ids=[chunk.pk for chunk, _ in pool]), False
+    return pool[:top_k], False
+
+
+def _reusable(session: ChatSession, q, version: int, top_k: int) -> bool:
+    import numpy as np
+    if session.retrieval_query is None or session.retrieval_version != version:
+        return False
+    if len(session.retrieval_chunks) < top_k:
+        return False
+    previous = np.frombuffer(bytes(session.retrieval_query), dtype='<f4')
+    return previous.shape == q.shape and float(previous @ q) >= settings.CHAT_REUSE_SIMILARITY
@@ -0,0 +1,110 @@
+import zlib
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Every stored blob starts with one byte naming its codec, so the codec can
+# change between deployments without rewriting old rows. Blobs compressed with a
+# zstd dictionary also carry the dictionary's id (CRC-32 of the dictionary file,
+# 4 bytes little-endian); old dictionaries stay readable as long as their files
+# are listed in TEXT_COMPRESSION_DICTS.
+RAW = 0
+ZLIB = 1
+ZSTD = 2       # no dictionary (or, for rows written before ids were stored, the dictionary named in the frame)
+ZSTD_DICT = 3  # tag, dictionary id, zstd frame
+
+
+def compress_text(text: str, codec: str = None) -> bytes:
+    codec = codec or settings.TEXT_COMPRESSION
+    data = text.encode('utf-8')
+    if codec == 'none':
+        return bytes([RAW]) + data
+    if codec == 'zlib':
+        return bytes([ZLIB]) + zlib.compress(data, settings.TEXT_COMPRESSION_LEVEL)
+    if codec == 'zstd':
+        dict_id, dictionary = _current_dictionary()
+        payload = _zstd_compressor(dictionary).compress(data)
+        if dictionary is None:
+            return bytes([ZSTD]) + payload
+        return bytes([ZSTD_DICT]) + dict_id.to_bytes(4, 'little') + payload
+    raise ImproperlyConfigured(f'Unknown TEXT_COMPRESSION codec: {codec}')
+
+
+def decompress_text(blob) -> str:
+    blob = bytes(blob)
+    if not blob:
+        return ''
+    codec, payload = blob[0], blob[1:]
+    if codec == RAW:
+        return payload.decode('utf-8')
+    if codec == ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if codec == ZSTD:
+        return _zstd_decompressor(_frame_dictionary(payload)).decompress(payload).decode('utf-8')
+    if codec == ZSTD_DICT:
+        dict_id, payload = int.from_bytes(payload[:4], 'little'), payload[4:]
+        dictionary = _dictionaries().get(dict_id)
+        if dictionary is None:
+            raise ImproperlyConfigured(f'zstd dictionary {dict_id:08x} is not in TEXT_COMPRESSION_DICT(S)')
+        return _zstd_decompressor(dictionary).decompress(payload).decode('utf-8')
+    raise ValueError(f'Unknown compressed text frame type: {codec}')
+
+
+def dictionary_id(data: bytes) -> int:
+    """Id stored in blobs compressed with this dictionary file's contents."""
+    return zlib.crc32(data)
+
+
+def train_dictionary(samples, size: int) -> bytes:
+    zstd = _zstandard()
+    return zstd.train_dictionary(size, [s.encode('utf-8') for s in samples]).as_bytes()
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImproperlyConfigured('zstd text compression requires the "zstandard" package')
+    return zstandard
+
+
+@lru_cache(maxsize=None)
+def _load_dictionary(path: str):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return dictionary_id(data), _zstandard().ZstdCompressionDict(data)
+
+
+def _current_dictionary():
+    """(id, dictionary) that new blobs are compressed with, or (None, None)."""
+    if not settings.TEXT_COMPRESSION_DICT:
+        return None, None
+    return _load_dictionary(settings.TEXT_COMPRESSION_DICT)
+
+
+def _dictionaries() -> dict:
+    """Every configured dictionary by id: the current one and those kept for reading old rows."""
+    paths = [settings.TEXT_COMPRESSION_DICT, *settings.TEXT_COMPRESSION_DICTS]
+    return dict(_load_dictionary(path) for path in paths if path)
+
+
+def _frame_dictionary(payload: bytes):
+    # Rows written before dictionary ids were stored: zstd frames name their
+    # dictionary by zstd's own id (0 for none)
+    frame_id = _zstandard().get_frame_parameters(payload).dict_id
+    if not frame_id:
+        return None
+    for dictionary in _dictionaries().values():
+        if dictionary.dict_id() == frame_id:
+            return dictionary
+    raise ImproperlyConfigured(f'zstd dictionary with zstd id {frame_id} is not in TEXT_COMPRESSION_DICT(S)')
+
+
+def _zstd_compressor(dictionary):
+    zstd = _zstandard()
+    # Compressor objects are not thread-safe; indexing runs on several threads
+    return zstd.ZstdCompressor(level=settings.TEXT_COMPRESSION_LEVEL, dict_data=dictionary)
+
+
+def _zstd_decompressor(dictionary):
+    return _zstandard().ZstdDecompressor(dict_data=dictionary)
@@ -1,15 +1,54 @@
+import asyncio
+import logging
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from . import progress_log
+
+logger = logging.getLogger(__name__)
+
 
 class ProgressConsumer(AsyncJsonWebsocketConsumer):
+    group_name = None
+
     async def connect(self):
-        # Expect querystring like ?sub=<subject>
-        self.sub = self.scope['query_string'].decode().split('sub=')[-1] or 'mock-user'
+        # The owner is whoever the token authenticates (WebSocketTokenAuthMiddleware), never a client-named one
+        user = self.scope.get('user')
+        if not getattr(user, 'is_authenticated', False):
+            await self.close()
+            return
+        # Expect querystring like ?access_token=<token>[&last_id=<id of the last event received>]
+        params = parse_qs(self.scope['query_string'].decode())
+        self.sub = user.oidc_sub
         self.group_name = f"progress.{self.sub}"
+        self.last_seen = None
+        # Join before reading the log: an event logged meanwhile arrives live, possibly twice (skipped below)
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
+        last_id = params.get('last_id', [''])[0]
+        if last_id:
+            await self.replay(last_id)
+
+    async def replay(self, last_id: str):
+        try:
+            events, complete = await asyncio.to_thread(progress_log.since, self.sub, last_id)
+        except Exception as e:
+            logger.warning('Could not replay progress events for %s: %s', self.sub, e)
+            events, complete = [], False
+        if not complete:
+            # Some events may be gone; the client should re-read its documents
+            await self.send_json({"stage": "resync"})
+        for payload in events:
+            await self.send_json(payload)
+        self.last_seen = progress_log.parse_id(events[-1]['id']) if events else progress_log.parse_id(last_id)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def progress_message(self, event):
-        await self.send_json(event['payload'])
+        payload = event['payload']
+        if self.last_seen is not None:
+            event_id = progress_log.parse_id(payload.get('id'))
+            if event_id is not None and event_id <= self.last_seen:
+                return  # already replayed
+        await self.send_json(payload)
@@ -0,0 +1,56 @@
+"""Shared store of extracted text and chunk embeddings, keyed by file content.
+
+The same file uploaded again, by the same or another owner, skips
+extraction and, when the chunking settings and embedding model are
+unchanged, embedding too. Each upload still gets its own Document and
+Chunk rows, so what an owner can see is unaffected.
+"""
+from typing import List, Optional
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .metrics import CONTENT_STORE_LOOKUPS
+from .models import ExtractedContent
+
+
+def chunking_key() -> str:
+    return f'words/{settings.MAX_CHUNK_TOKENS}/{settings.CHUNK_OVERLAP_TOKENS}'
+
+
+def lookup(sha256: str, extractor: str) -> Optional[ExtractedContent]:
+    entry = ExtractedContent.objects.filter(sha256=sha256, extractor=extractor).first()
+    if entry is None:
+        CONTENT_STORE_LOOKUPS.labels(result='miss').inc()
+    return entry
+
+
+def embeddings(entry: ExtractedContent, chunks: int) -> Optional[List[List[float]]]:
+    """The entry's chunk embeddings if they fit the current settings and `chunks` chunks, else None."""
+    import numpy as np
+    usable = (entry.embeddings is not None and entry.chunking == chunking_key()
+              and entry.embedding_model == settings.EMBEDDING_MODEL)
+    vectors = None
+    if usable:
+        matrix = np.frombuffer(bytes(entry.embeddings), dtype='<f4')
+        if entry.dim and matrix.size == chunks * entry.dim:
+            vectors = matrix.reshape(chunks, entry.dim).tolist()
+    CONTENT_STORE_LOOKUPS.labels(result='embeddings' if vectors is not None else 'text').inc()
+    return vectors
+
+
+def save(sha256: str, extractor: str, text: str, vectors: List[List[float]]):
+    """Store (or refresh) the extraction and embeddings of a freshly indexed file."""
+    import numpy as np
+    matrix = np.asarray(vectors, dtype='<f4')
+    fields = {
+        'text': text, 'chunking': chunking_key(), 'embedding_model': settings.EMBEDDING_MODEL,
+        'embeddings': matrix.tobytes(), 'dim': matrix.shape[1] if matrix.ndim == 2 else 0,
+    }
+    entries = ExtractedContent.objects.filter(sha256=sha256, extractor=extractor)
+    try:
+        # Write before reading: update_or_create's SELECT then INSERT needs a lock
+        # upgrade, which SQLite refuses outright while other writers are active
+        with transaction.atomic():
+            if not entries.update(**fields):
+                ExtractedContent.objects.create(sha256=sha256, extractor=extractor, **fields)
+    except IntegrityError:
+        pass  # a concurrent upload of the same file stored it first
@@ -0,0 +1,146 @@
+"""Near-duplicate chunk detection with MinHash and banded LSH.
+
+Each chunk's word 3-gram shingles are MinHashed into NUM_PERM 32-bit values.
+The signature is split into BANDS bands; chunks sharing any band key are
+candidates, and a candidate is a duplicate when the fraction of equal MinHash
+values (an estimate of shingle Jaccard similarity) reaches
+settings.DEDUP_THRESHOLD. Band keys of an owner's canonical chunks live in
+ChunkBand, so lookups are indexed queries scoped to that owner.
+
+Deleting a canonical chunk promotes its near-duplicates: each is embedded
+from its own text and gets its own bands, so it is searched and matched
+like any chunk indexed without a duplicate.
+"""
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from .embeddings import get_embedder
+from .models import Chunk, ChunkBand
+
+NUM_PERM = 64
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+LOOKUP_BATCH = 500
+
+
+@lru_cache(maxsize=None)
+def _permutations():
+    import numpy as np
+    rng = np.random.default_rng(0x5EED)  # fixed: stored signatures must stay comparable
+    a = rng.integers(1, 2 ** 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+    return a, b
+
+
+def signature(text: str) -> bytes:
+    """MinHash signature of the text's word shingles, as NUM_PERM little-endian uint32."""
+    import numpy as np
+    words = text.lower().split()
+    n = max(len(words) - SHINGLE_WORDS + 1, 1)
+    shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(n)}
+    x = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+    a, b = _permutations()
+    # Multiply-shift hashing; uint64 arithmetic wraps, the high 32 bits are the hash
+    with np.errstate(over='ignore'):
+        hashed = (x[:, None] * a[None, :] + b[None, :]) >> np.uint64(32)
+    return hashed.min(axis=0).astype('<u4').tobytes()
+
+
+def similarity(sig_a: bytes, sig_b: bytes) -> float:
+    import numpy as np
+    return float(np.mean(np.frombuffer(sig_a, dtype='<u4') == np.frombuffer(sig_b, dtype='<u4')))
+
+
+def band_keys(sig: bytes) -> List[int]:
+    """One signed 64-bit key per band (fits a BigIntegerField)."""
+    keys = []
+    for band in range(BANDS):
+        chunk = sig[band * ROWS * 4:(band + 1) * ROWS * 4]
+        key = zlib.crc32(chunk, band) << 32 | zlib.crc32(chunk, band + BANDS)
+        keys.append(key - (1 << 64) if key >= 1 << 63 else key)
+    return keys
+
+
+def find_duplicates(owner_sub: str, signatures: List[bytes]) -> List[Optional[Tuple[int, list]]]:
+    """For each signature, (chunk id, embedding) of the owner's most similar canonical chunk, if close enough."""
+    found = []
+    for start in range(0, len(signatures), LOOKUP_BATCH):
+        batch = signatures[start:start + LOOKUP_BATCH]
+        keys = [band_keys(sig) for sig in batch]
+        candidates: Dict[int, set] = {}
+        rows = (ChunkBand.objects.filter(owner_sub=owner_sub, key__in={k for ks in keys for k in ks})
+                .values_list('key', 'chunk_id'))
+        for key, chunk_id in rows:
+            candidates.setdefault(key, set()).add(chunk_id)
+        ids = set().union(*candidates.values()) if candidates else set()
+        existing = {cid: (sig, emb) for cid, sig, emb in
+                    Chunk.objects.filter(owner_sub=owner_sub, id__in=ids).values_list('id', 'minhash', 'embedding')}
+        for sig, ks in zip(batch, keys):
+            best, best_sim = None, settings.DEDUP_THRESHOLD
+            for cid in set().union(*(candidates.get(k, ()) for k in ks)):
+                if cid not in existing or existing[cid][0] is None:
+                    continue
+                sim = similarity(sig, bytes(existing[cid][0]))
+                if sim >= best_sim:
+                    best, best_sim = cid, sim
+            found.append((best, existing[best][1]) if best is not None else None)
+    return found
+
+
+def find_repeats(signatures: List[Optional[bytes]], skip: List = None) -> List[Optional[int]]:
+    """For each signature, the index of the first earlier one in the list it nearly duplicates, if any.
+
+    Catches repeats among chunks that aren't stored yet (within a document or
+    a persist batch), which find_duplicates can't see. Only non-repeats are
+    matched against, so a repeat always points at a canonical entry. Entries
+    with no signature or with `skip[i]` set (already duplicates of stored
+    chunks) are left out.
+    """
+    buckets: Dict[int, List[int]] = {}
+    found = []
+    for i, sig in enumerate(signatures):
+        if sig is None or (skip and skip[i]):
+            found.append(None)
+            continue
+        keys = band_keys(bytes(sig))
+        best, best_sim = None, settings.DEDUP_THRESHOLD
+        for j in sorted({j for k in keys for j in buckets.get(k, ())}):
+            sim = similarity(bytes(sig), bytes(signatures[j]))
+            if sim > best_sim or (best is None and sim >= best_sim):
+                best, best_sim = j, sim
+        found.append(best)
+        if best is None:
+            for k in keys:
+                buckets.setdefault(k, []).append(i)
+    return found
+
+
+def bands_for(chunks: List[Chunk]) -> List[ChunkBand]:
+    """ChunkBand rows for saved canonical chunks that carry a signature."""
+    return [ChunkBand(owner_sub=ch.owner_sub, key=key, chunk_id=ch.pk)
+            for ch in chunks if ch.minhash is not None and ch.duplicate_of_id is None
+            for key in band_keys(bytes(ch.minhash))]
+
+
+def promotions(owner_sub: str, canonical_ids, exclude_chunks=(), exclude_documents=()) -> List[Chunk]:
+    """The owner's near-duplicates of `canonical_ids`, re-embedded and unlinked, ready for promote().
+
+    Embeds, so call it before the deleting transaction where possible.
+    Duplicates in `exclude_documents` (deleted along with their canonical
+    chunks) and `exclude_chunks` (already prepared) are left out.
+    """
+    chunks = list(Chunk.objects.filter(owner_sub=owner_sub, duplicate_of_id__in=canonical_ids)
+                  .exclude(document_id__in=exclude_documents).exclude(id__in=exclude_chunks)
+                  .only('id', 'owner_sub', 'document_id', 'text', 'minhash'))
+    if chunks:
+        for chunk, vector in zip(chunks, get_embedder().embed([str(chunk.text) for chunk in chunks])):
+            chunk.embedding, chunk.duplicate_of_id = vector, None
+    return chunks
+
+
+def promote(chunks: List[Chunk]):
+    """Store promotions() as canonical chunks with their own bands (in the transaction deleting their canonicals)."""
+    Chunk.objects.bulk_update(chunks, ['embedding', 'duplicate_of'], batch_size=LOOKUP_BATCH)
+    ChunkBand.objects.bulk_create(bands_for(chunks), batch_size=1000)
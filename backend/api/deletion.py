@@ -0,0 +1,117 @@
+"""Bulk document deletion with set-based SQL, off the request path.
+
+Deleting a Document through the ORM makes Django's collector load every
+chunk (to cascade ChunkBand rows and null out duplicate_of links) before
+deleting anything. Here each batch of DELETION_BATCH_CHUNKS chunk ids is
+removed in a short transaction: promote the chunks' near-duplicates in
+other documents (embedded beforehand, see dedup.promotions), delete the
+chunks' bands, delete the chunks. Documents go last.
+Each batch of documents publishes one index change: the removed documents,
+plus the documents whose chunks were promoted, so every worker patches its
+resident index instead of reloading it.
+"""
+import logging
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Set
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from . import dedup, invalidation
+from .indexing import _send_progress
+from .models import Chunk, ChunkBand, Document
+
+logger = logging.getLogger(__name__)
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=settings.DELETION_WORKERS, thread_name_prefix='deletion')
+# Documents per published index change and progress event
+DOCUMENT_BATCH = 50
+DELETABLE = (Document.STATUS_INDEXED, Document.STATUS_FAILED)
+
+
+def _raw_delete(model, owner_sub: str, ids: List[int]) -> int:
+    # owner_sub lets Postgres prune to one partition of a partitioned api_chunk
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cur:
+        cur.execute(f'DELETE FROM {model._meta.db_table} WHERE owner_sub = %s AND id IN ({placeholders})',
+                    [owner_sub, *ids])
+        return cur.rowcount
+
+
+def _delete_chunks(owner_sub: str, ids: List[int], document_ids: List[int]) -> Set[int]:
+    """Delete chunks of `document_ids`, promoting their duplicates elsewhere; returns the promoted chunks' documents."""
+    promoted = dedup.promotions(owner_sub, ids, exclude_documents=document_ids)
+    with transaction.atomic():
+        # Duplicates indexed since the lookup above are embedded here; rare, and it keeps none behind
+        promoted += dedup.promotions(owner_sub, ids, exclude_documents=document_ids,
+                                     exclude_chunks=[c.pk for c in promoted])
+        dedup.promote(promoted)
+        # Duplicates in the deleted documents themselves only need unlinking (what SET_NULL does in the ORM)
+        Chunk.objects.filter(owner_sub=owner_sub, duplicate_of_id__in=ids).update(duplicate_of=None)
+        ChunkBand.objects.filter(owner_sub=owner_sub, chunk_id__in=ids).delete()  # no dependents: one DELETE
+        _raw_delete(Chunk, owner_sub, ids)
+    return {c.document_id for c in promoted}
+
+
+def delete_documents(owner_sub: str, document_ids: List[int]) -> dict:
+    """Delete the owner's documents and everything indexed from them; returns counts."""
+    total, deleted, chunks = len(document_ids), 0, 0
+    for start in range(0, total, DOCUMENT_BATCH):
+        batch = document_ids[start:start + DOCUMENT_BATCH]
+        promoted = set()
+        while True:
+            ids = list(Chunk.objects.filter(owner_sub=owner_sub, document_id__in=batch)
+                       .values_list('id', flat=True)[:settings.DELETION_BATCH_CHUNKS])
+            if not ids:
+                break
+            promoted |= _delete_chunks(owner_sub, ids, batch)
+            chunks += len(ids)
+        with transaction.atomic():
+            # Chunks are gone, so this is a plain DELETE (no post_delete signals; published here instead)
+            deleted += _raw_delete(Document, owner_sub, batch)
+            invalidation.publish(owner_sub, added=sorted(promoted), removed=batch)
+        _send_progress(owner_sub, {"stage": "deleting", "deleted": deleted, "total": total, "chunks": chunks})
+    return {'documents': deleted, 'chunks': chunks}
+
+
+def _run(owner_sub: str, document_ids: List[int]):
+    try:
+        result = delete_documents(owner_sub, document_ids)
+        _send_progress(owner_sub, {"stage": "deleted", "document_ids": document_ids, **result})
+    except Exception:
+        logger.exception('Deleting %d documents failed', len(document_ids))
+        # Visible again, so the user can retry; whatever was already deleted stays deleted
+        Document.objects.filter(owner_sub=owner_sub, id__in=document_ids, status=Document.STATUS_DELETING).update(
+            status=Document.STATUS_FAILED, status_changed_at=timezone.now())
+        _send_progress(owner_sub, {"stage": "delete_error", "document_ids": document_ids})
+    finally:
+        connections.close_all()
+
+
+def stale_before():
+    """Rows indexing or deleting since before this are presumed orphaned by a dead process."""
+    return timezone.now() - timedelta(seconds=settings.STALE_DOCUMENT_SECONDS)
+
+
+def submit(owner_sub: str, document_ids: List[int]):
+    """Delete documents already marked deleting, in the background."""
+    _EXECUTOR.submit(_run, owner_sub, document_ids)
+
+
+def delete_documents_async(owner_sub: str, document_ids: List[int]) -> List[int]:
+    """Mark the indexed or failed documents among `document_ids` as deleting and remove them in the background.
+
+    Documents still indexing are left alone (their chunks are not written
+    yet), unless they have been for STALE_DOCUMENT_SECONDS. Returns the ids
+    of the documents that will be deleted.
+    """
+    deletable = Q(status__in=DELETABLE) | Q(status=Document.STATUS_INDEXING, status_changed_at__lt=stale_before())
+    with transaction.atomic():
+        ids = list(Document.objects.select_for_update()
+                   .filter(deletable, owner_sub=owner_sub, id__in=document_ids)
+                   .order_by('id').values_list('id', flat=True))
+        Document.objects.filter(id__in=ids).update(status=Document.STATUS_DELETING, status_changed_at=timezone.now())
+    if ids:
+        submit(owner_sub, ids)
+    return ids
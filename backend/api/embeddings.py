@@ -1,5 +1,5 @@
 import os
-import numpy as np
+from functools import lru_cache
 from typing import List
 
 class Embedder:
@@ -19,8 +19,23 @@ class Embedder:
             resp = client.embeddings.create(model=self.model, input=texts)
             return [d.embedding for d in resp.data]
 
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        """embed() without blocking the event loop on the API call."""
+        if self.mode == 'mock':
+            return self.embed(texts)
+        from openai import AsyncOpenAI
+        async with AsyncOpenAI(api_key=self.api_key) as client:
+            resp = await client.embeddings.create(model=self.model, input=texts)
+        return [d.embedding for d in resp.data]
+
     def _mock_embedding(self, text: str, dim: int = 256) -> List[float]:
         import hashlib, random
         h = hashlib.sha256(text.encode('utf-8')).digest()
         rng = random.Random(h)
         return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+@lru_cache(maxsize=None)
+def get_embedder() -> Embedder:
+    """Process-wide Embedder, built on first use rather than at import."""
+    return Embedder()
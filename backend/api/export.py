@@ -0,0 +1,312 @@
+"""Portable per-owner export files, for restoring or moving a tenant without re-embedding.
+
+An export is a zip archive of:
+
+* documents.jsonl — one Document per line (metadata and extracted text)
+* chunk_ids.npy, chunk_documents.npy, chunk_idx.npy, duplicate_of.npy — chunk
+  metadata as int64 arrays, grouped by document; duplicate_of is -1 for
+  canonical chunks
+* embeddings.npy — float32 (chunks, dim)
+* minhash.npy — uint32 (chunks, dedup.NUM_PERM), all-zero rows for chunks
+  without a signature
+* texts.bin, text_offsets.npy — UTF-8 chunk texts back to back; chunk i is
+  texts.bin[offsets[i]:offsets[i + 1]]
+* manifest.json — format version, counts, embedding model and the SHA-256
+  of every other member, written last
+
+Chunks are streamed from the database into spooled temporary files, so an
+export never holds every embedding as Python lists. Import verifies every
+checksum and that the members agree with each other (lengths, offsets and
+references) before it writes anything, then bulk-loads the rows under new
+ids in one transaction and publishes the new documents so every worker's
+search index picks them up. Documents exported mid-indexing or
+mid-deletion are imported as failed: their chunks may be incomplete.
+"""
+import hashlib
+import io
+import json
+import tempfile
+import zipfile
+from typing import BinaryIO, Dict
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from . import dedup, invalidation
+from .models import Chunk, ChunkBand, Document
+
+FORMAT = 'docuchat-owner-export'
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+BATCH = 1000
+SPOOL_BYTES = 64 * 1024 * 1024
+# Status a document is imported with; anything not listed is rejected
+IMPORT_STATUS = {
+    Document.STATUS_INDEXED: Document.STATUS_INDEXED,
+    Document.STATUS_FAILED: Document.STATUS_FAILED,
+    Document.STATUS_INDEXING: Document.STATUS_FAILED,
+    Document.STATUS_DELETING: Document.STATUS_FAILED,
+}
+
+
+def _npy_header(dtype, shape) -> bytes:
+    import numpy as np
+    buf = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buf, {'descr': np.dtype(dtype).str, 'fortran_order': False,
+                                               'shape': shape})
+    return buf.getvalue()
+
+
+def _npy(array) -> bytes:
+    import numpy as np
+    buf = io.BytesIO()
+    np.save(buf, array, allow_pickle=False)
+    return buf.getvalue()
+
+
+class _Writer:
+    """Adds members to the archive, recording each one's SHA-256."""
+
+    def __init__(self, zf: zipfile.ZipFile):
+        self.zf = zf
+        self.checksums: Dict[str, str] = {}
+
+    def add(self, name: str, *parts):
+        """Write a member from bytes or readable binary files, in order."""
+        digest = hashlib.sha256()
+        with self.zf.open(name, 'w', force_zip64=True) as out:
+            for part in parts:
+                chunks = iter(lambda: part.read(1024 * 1024), b'') if hasattr(part, 'read') else (part,)
+                for data in chunks:
+                    digest.update(data)
+                    out.write(data)
+        self.checksums[name] = digest.hexdigest()
+
+
+def export_owner(owner_sub: str, fileobj: BinaryIO) -> dict:
+    """Write the owner's documents and chunks to `fileobj`; returns the manifest."""
+    import numpy as np
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_STORED) as zf, \
+            tempfile.SpooledTemporaryFile(SPOOL_BYTES) as docs_file, \
+            tempfile.SpooledTemporaryFile(SPOOL_BYTES) as embeddings_file, \
+            tempfile.SpooledTemporaryFile(SPOOL_BYTES) as texts_file:
+        writer = _Writer(zf)
+        doc_ids = set()
+        for doc in Document.objects.filter(owner_sub=owner_sub).order_by('id').iterator(chunk_size=BATCH):
+            doc_ids.add(doc.pk)
+            docs_file.write(json.dumps({
+                'id': doc.pk, 'filename': doc.filename, 'content_type': doc.content_type,
+                'created_at': doc.created_at.isoformat(), 'status': doc.status, 'text': doc.text,
+            }).encode('utf-8') + b'\n')
+
+        meta = {'chunk_ids': [], 'chunk_documents': [], 'chunk_idx': [], 'duplicate_of': []}
+        minhashes, offsets, dim = [], [0], None
+        empty_minhash = np.zeros(dedup.NUM_PERM, dtype='<u4')
+        rows = (Chunk.objects.filter(owner_sub=owner_sub).order_by('document_id', 'id')
+                .values_list('id', 'document_id', 'idx', 'duplicate_of_id', 'embedding', 'minhash', 'text'))
+        for pk, doc_id, idx, duplicate_of, embedding, minhash, text in rows.iterator(chunk_size=BATCH):
+            if doc_id not in doc_ids:
+                continue  # document created after the listing above
+            vector = np.asarray(embedding, dtype='<f4')
+            if dim is None:
+                dim = len(vector)
+            elif len(vector) != dim:
+                raise ValueError(f'Chunk {pk} has a {len(vector)}-dimensional embedding, expected {dim}')
+            embeddings_file.write(vector.tobytes())
+            text = str(text).encode('utf-8')  # values_list rows hold CompressedText
+            texts_file.write(text)
+            offsets.append(offsets[-1] + len(text))
+            for name, value in zip(meta, (pk, doc_id, idx, duplicate_of if duplicate_of is not None else -1)):
+                meta[name].append(value)
+            minhashes.append(np.frombuffer(bytes(minhash), dtype='<u4') if minhash is not None else empty_minhash)
+
+        count = len(offsets) - 1
+        dim = dim or 0
+        for name, values in meta.items():
+            writer.add(f'{name}.npy', _npy(np.array(values, dtype=np.int64)))
+        writer.add('minhash.npy', _npy(np.array(minhashes, dtype='<u4').reshape(count, dedup.NUM_PERM)))
+        writer.add('text_offsets.npy', _npy(np.array(offsets, dtype=np.int64)))
+        for f in (docs_file, embeddings_file, texts_file):
+            f.seek(0)
+        writer.add('documents.jsonl', docs_file)
+        writer.add('texts.bin', texts_file)
+        writer.add('embeddings.npy', _npy_header('<f4', (count, dim)), embeddings_file)
+
+        manifest = {
+            'format': FORMAT, 'version': FORMAT_VERSION, 'owner_sub': owner_sub,
+            'embedding_model': settings.EMBEDDING_MODEL, 'dim': dim,
+            'documents': len(doc_ids), 'chunks': count, 'sha256': writer.checksums,
+        }
+        zf.writestr(MANIFEST, json.dumps(manifest, indent=2))
+    return manifest
+
+
+def read_manifest(zf: zipfile.ZipFile) -> dict:
+    try:
+        manifest = json.loads(zf.read(MANIFEST))
+    except KeyError:
+        raise ValueError('Not an owner export: no manifest') from None
+    if manifest.get('format') != FORMAT:
+        raise ValueError('Not an owner export')
+    if manifest.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported export version {manifest.get('version')}")
+    return manifest
+
+
+def verify(zf: zipfile.ZipFile, manifest: dict):
+    """Raise ValueError unless every member matches its manifest checksum."""
+    for name, expected in manifest['sha256'].items():
+        digest = hashlib.sha256()
+        try:
+            with zf.open(name) as f:
+                for data in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(data)
+        except KeyError:
+            raise ValueError(f'Export is missing {name}') from None
+        except zipfile.BadZipFile as e:
+            raise ValueError(f'Damaged export: {e}') from None
+        if digest.hexdigest() != expected:
+            raise ValueError(f'Checksum mismatch in {name}')
+
+
+def _load(zf: zipfile.ZipFile, name: str):
+    import numpy as np
+    with zf.open(name) as f:
+        return np.load(io.BytesIO(f.read()), allow_pickle=False)
+
+
+def _read_documents(zf: zipfile.ZipFile) -> list:
+    """documents.jsonl rows, checked and with created_at parsed and status mapped for import."""
+    rows, ids = [], set()
+    limits = {name: Document._meta.get_field(name).max_length for name in ('filename', 'content_type')}
+    with zf.open('documents.jsonl') as f:
+        for n, line in enumerate(f, start=1):
+            row = json.loads(line)
+            if not isinstance(row, dict) or not isinstance(row.get('id'), int) or not all(
+                    isinstance(row.get(key), str) for key in ('filename', 'content_type', 'created_at', 'text')):
+                raise ValueError(f'documents.jsonl line {n} is not a document')
+            if row['id'] in ids:
+                raise ValueError(f"documents.jsonl repeats document {row['id']}")
+            ids.add(row['id'])
+            for name, limit in limits.items():
+                if len(row[name]) > limit:
+                    raise ValueError(f'documents.jsonl line {n}: {name} is longer than {limit} characters')
+            created_at = parse_datetime(row['created_at'])  # raises ValueError when out of range
+            if created_at is None:
+                raise ValueError(f'documents.jsonl line {n}: bad created_at')
+            if row.get('status') not in IMPORT_STATUS:
+                raise ValueError(f"documents.jsonl line {n}: unknown status {row.get('status')!r}")
+            rows.append({**row, 'created_at': created_at, 'status': IMPORT_STATUS[row['status']]})
+    return rows
+
+
+def _embeddings_header(f, count: int, dim: int):
+    """Read embeddings.npy's header, leaving `f` at the first vector; raises ValueError unless (count, dim) float32."""
+    import numpy as np
+    if np.lib.format.read_magic(f) != (1, 0):
+        raise ValueError('Unsupported embeddings.npy header')
+    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    if shape != (count, dim) or fortran_order or dtype != np.dtype('<f4'):
+        raise ValueError(f'embeddings.npy is {dtype}{list(shape)}, expected float32[{count}, {dim}]')
+
+
+def _check_chunks(zf: zipfile.ZipFile, manifest: dict, document_ids: set, arrays: dict):
+    """Raise ValueError unless the chunk members agree with each other and with documents.jsonl."""
+    import numpy as np
+    count, dim = manifest.get('chunks'), manifest.get('dim')
+    if not isinstance(count, int) or not isinstance(dim, int) or count < 0 or dim < 0 or (count and not dim):
+        raise ValueError('Manifest has bad chunk or dim counts')
+    shapes = {'chunk_ids': (count,), 'chunk_documents': (count,), 'chunk_idx': (count,), 'duplicate_of': (count,),
+              'minhash': (count, dedup.NUM_PERM), 'text_offsets': (count + 1,)}
+    for name, shape in shapes.items():
+        array = arrays[name]
+        if array.shape != shape or not np.issubdtype(array.dtype, np.integer):
+            raise ValueError(f'{name}.npy is {array.dtype}{list(array.shape)}, expected integers{list(shape)}')
+    if len(np.unique(arrays['chunk_ids'])) != count:
+        raise ValueError('chunk_ids.npy repeats a chunk id')
+    if not np.isin(arrays['chunk_documents'], list(document_ids)).all():
+        raise ValueError('chunk_documents.npy refers to a document missing from documents.jsonl')
+    offsets = arrays['text_offsets']
+    if offsets[0] != 0 or (np.diff(offsets) < 0).any() or offsets[-1] != zf.getinfo('texts.bin').file_size:
+        raise ValueError('text_offsets.npy does not match texts.bin')
+    with zf.open('embeddings.npy') as f:
+        _embeddings_header(f, count, dim)
+
+
+def import_owner(fileobj: BinaryIO, owner_sub: str = None, allow_model_mismatch: bool = False) -> dict:
+    """Load an export into `owner_sub` (default: the exporting owner) under new ids, without embedding anything.
+
+    Returns counts of what was created. Raises ValueError for a damaged,
+    inconsistent or incompatible file, before any row is written (chunk text
+    that isn't UTF-8 is only found while loading, and rolls the import back).
+    """
+    import numpy as np
+    try:
+        zf = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ValueError('Not an owner export: not a zip archive') from None
+    with zf:
+        manifest = read_manifest(zf)
+        if manifest['embedding_model'] != settings.EMBEDDING_MODEL and not allow_model_mismatch:
+            raise ValueError(f"Export was embedded with {manifest['embedding_model']}, "
+                             f"this deployment uses {settings.EMBEDDING_MODEL}")
+        verify(zf, manifest)
+        owner_sub = owner_sub or manifest['owner_sub']
+        rows = _read_documents(zf)
+        if len(rows) != manifest.get('documents'):
+            raise ValueError('documents.jsonl does not match the manifest')
+        arrays = {name: _load(zf, f'{name}.npy') for name in
+                  ('chunk_ids', 'chunk_documents', 'chunk_idx', 'duplicate_of', 'minhash', 'text_offsets')}
+        _check_chunks(zf, manifest, {row['id'] for row in rows}, arrays)
+        chunk_ids, chunk_docs, chunk_idx, duplicate_of, minhash, offsets = arrays.values()
+
+        with transaction.atomic():
+            doc_map = {}
+            for start in range(0, len(rows), 100):
+                batch = rows[start:start + 100]
+                docs = Document.objects.bulk_create([
+                    Document(owner_sub=owner_sub, filename=row['filename'], content_type=row['content_type'],
+                             created_at=row['created_at'], status=row['status'], text=row['text'])
+                    for row in batch])
+                doc_map.update((row['id'], doc.pk) for row, doc in zip(batch, docs))
+
+            chunk_map = {}
+            dim = manifest['dim']
+            with zf.open('embeddings.npy') as emb, zf.open('texts.bin') as texts:
+                _embeddings_header(emb, len(chunk_ids), dim)
+                for start in range(0, len(chunk_ids), BATCH):
+                    stop = min(start + BATCH, len(chunk_ids))
+                    vectors = np.frombuffer(emb.read((stop - start) * dim * 4), dtype='<f4').reshape(-1, dim)
+                    objs = []
+                    for i in range(start, stop):
+                        text = texts.read(int(offsets[i + 1] - offsets[i])).decode('utf-8')
+                        objs.append(Chunk(
+                            document_id=doc_map[int(chunk_docs[i])], owner_sub=owner_sub, idx=int(chunk_idx[i]),
+                            text=text, embedding=vectors[i - start].tolist(),
+                            minhash=minhash[i].tobytes() if minhash[i].any() else None))
+                    Chunk.objects.bulk_create(objs, batch_size=100)
+                    chunk_map.update((int(chunk_ids[i]), obj.pk) for i, obj in zip(range(start, stop), objs))
+
+            # Duplicates may point at any chunk, so links are restored once every chunk has its new id
+            links = [Chunk(pk=chunk_map[int(old)], duplicate_of_id=chunk_map[int(target)])
+                     for old, target in zip(chunk_ids, duplicate_of) if target >= 0 and int(target) in chunk_map]
+            Chunk.objects.bulk_update(links, ['duplicate_of'], batch_size=BATCH)
+            duplicates = {c.pk for c in links}
+            canonical = (Chunk(pk=pk, owner_sub=owner_sub, minhash=minhash[i].tobytes())
+                         for i, pk in enumerate(chunk_map[int(old)] for old in chunk_ids)
+                         if pk not in duplicates and minhash[i].any())
+            ChunkBand.objects.bulk_create(dedup.bands_for(list(canonical)), batch_size=BATCH)
+            if doc_map:
+                invalidation.publish(owner_sub, added=list(doc_map.values()))
+    return {'owner_sub': owner_sub, 'documents': len(doc_map), 'chunks': len(chunk_map), 'duplicates': len(links)}
+
+
+def export_to_tempfile(owner_sub: str):
+    """Export into a new temporary file, rewound for reading (for streaming as a download)."""
+    f = tempfile.TemporaryFile()
+    try:
+        export_owner(owner_sub, f)
+    except Exception:
+        f.close()
+        raise
+    f.seek(0)
+    return f
@@ -0,0 +1,68 @@
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+from .compression import compress_text, decompress_text
+
+
+class CompressedText:
+    """Compressed blob as loaded from the database, decoded on first use."""
+    __slots__ = ('blob',)
+
+    def __init__(self, blob: bytes):
+        self.blob = blob
+
+    def __str__(self):
+        return decompress_text(self.blob)
+
+    def __len__(self):
+        return len(self.blob)
+
+    def __repr__(self):
+        return f'<CompressedText {len(self.blob)} bytes>'
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    # A data descriptor (it defines __set__), so __get__ runs even when the value
+    # is already in the instance __dict__ and can decompress it on first access.
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = str(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """Text stored as a compressed blob (see api.compression).
+
+    Rows come back from the database still compressed; the text is only
+    decompressed when the attribute is read, e.g. for the top-k chunks of an ask.
+    Saving an instance whose text was never read writes the original blob back.
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return CompressedText(bytes(value))
+
+    def to_python(self, value):
+        if isinstance(value, CompressedText):
+            return str(value)
+        if isinstance(value, (bytes, memoryview)):
+            return decompress_text(value)
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        if isinstance(value, CompressedText):
+            return value.blob
+        return compress_text(str(value))
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
@@ -1,31 +1,116 @@
+import hashlib
 import io
-import threading
-from typing import List
+import logging
+import time
+from collections import Counter, defaultdict
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Iterator, List, Optional
+import django
 from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from .models import Document, Chunk
-from .embeddings import Embedder
+from .embeddings import get_embedder
+from .metrics import CHUNKS_DEDUPLICATED, CHUNKS_INDEXED, INDEXING_JOBS, INDEXING_QUEUE_DEPTH, stage
+from . import content_store, dedup, ingest, invalidation, profiling, progress_log
+from .pipeline import AsyncStage, BatchStage, Pipeline, Stage
+from .scheduling import FairScheduler
 
-EMBEDDER = Embedder()
+logger = logging.getLogger(__name__)
 
 
-def _send_progress(sub: str, payload: dict):
+def _send_progress(sub: str, payload: dict, durable: bool = True):
     group = f"progress.{sub}"
     channel_layer = get_channel_layer()
+    payload = {**payload, "ts": time.time()}  # send time, lets clients measure delivery lag
+    # Logged first, so a socket connecting now can replay it
+    event_id = progress_log.append(sub, payload) if durable else None
+    if event_id:
+        payload["id"] = event_id
     async_to_sync(channel_layer.group_send)(group, {"type": "progress.message", "payload": payload})
 
 
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def _iter_docx_blocks(content: bytes) -> Iterator[str]:
+    """Paragraphs and table rows of a DOCX in reading order.
+
+    word/document.xml is decompressed and parsed incrementally, and every
+    finished block is cleared from the tree, so memory stays flat however
+    large the document is. Table cells are joined with ' | ', one row per
+    block; nested tables end up inside their enclosing cell.
+    """
+    import zipfile
+    from xml.etree.ElementTree import iterparse
+    with zipfile.ZipFile(io.BytesIO(content)) as archive, archive.open('word/document.xml') as xml:
+        body = None
+        runs = []   # text of the paragraph being read
+        rows = []   # one list of cell texts per open table row
+        cells = []  # one list of paragraph texts per open table cell
+        for event, el in iterparse(xml, events=('start', 'end')):
+            tag = el.tag
+            if event == 'start':
+                if tag == _W + 'body':
+                    body = el
+                elif tag == _W + 'tr':
+                    rows.append([])
+                elif tag == _W + 'tc':
+                    cells.append([])
+                continue
+            block = None
+            if tag == _W + 't':
+                runs.append(el.text or '')
+            elif tag == _W + 'tab':
+                runs.append('\t')
+            elif tag in (_W + 'br', _W + 'cr'):
+                runs.append('\n')
+            elif tag == _W + 'p':
+                block = ''.join(runs).strip()
+                runs = []
+            elif tag == _W + 'tc':
+                rows[-1].append(' '.join(cells.pop()))
+            elif tag == _W + 'tr':
+                block = ' | '.join(c for c in rows.pop() if c)
+                el.clear()
+            if block:
+                if cells:
+                    cells[-1].append(block)
+                else:
+                    yield block
+            if tag in (_W + 'p', _W + 'tbl') and not cells and body is not None:
+                body.clear()  # drop finished top-level blocks (and anything cleared inside them)
+
+
+# Bump when extraction output changes, so the content store stops serving older text
+EXTRACTOR_VERSION = 1
+
+
+def _extractor(filename: str, content_type: str) -> str:
+    """Which extractor handles a file: 'text', 'pdf' or 'docx'."""
+    name = filename.lower()
+    if content_type in ('text/plain', 'text/markdown') or name.endswith(('.txt', '.md')):
+        return 'text'
+    if content_type in ('application/pdf',) or name.endswith('.pdf'):
+        return 'pdf'
+    if content_type == DOCX_CONTENT_TYPE or name.endswith('.docx'):
+        return 'docx'
+    # Fallback: treat as text
+    return 'text'
+
+
 def _extract_text(filename: str, content: bytes, content_type: str) -> str:
-    if content_type in ('text/plain',) or filename.lower().endswith('.txt'):
-        return content.decode('utf-8', errors='ignore')
-    if content_type in ('text/markdown',) or filename.lower().endswith('.md'):
-        return content.decode('utf-8', errors='ignore')
-    if content_type in ('application/pdf',) or filename.lower().endswith('.pdf'):
+    kind = _extractor(filename, content_type)
+    if kind == 'pdf':
         from pdfminer.high_level import extract_text
         with io.BytesIO(content) as f:
             return extract_text(f)
-    # Fallback: treat as text
+    if kind == 'docx':
+        return '\n\n'.join(_iter_docx_blocks(content))
     return content.decode('utf-8', errors='ignore')
 
 
@@ -44,23 +129,277 @@ def _chunk_text(text: str, max_tokens: int, overlap: int) -> List[str]:
     return chunks
 
 
-def index_file(owner_sub: str, filename: str, content: bytes, content_type: str):
-    _send_progress(owner_sub, {"stage": "received", "filename": filename})
-    text = _extract_text(filename, content, content_type)
-    doc = Document.objects.create(owner_sub=owner_sub, filename=filename, content_type=content_type, text=text)
+class _Job:
+    """One file on its way through the indexing stages."""
+
+    def __init__(self, owner_sub: str, filename: str, content: bytes, content_type: str, content_hash: str = None):
+        self.owner_sub = owner_sub
+        self.filename = filename
+        self.content = content
+        self.content_type = content_type
+        self.content_hash = content_hash or hashlib.sha256(content).hexdigest()
+        self.extractor = f'{_extractor(filename, content_type)}/{EXTRACTOR_VERSION}'
+        self.timings = {}
+        self.stored = None  # content store entry of an identical earlier file
+        self.stored_vectors = None
+        self.reused = None
+        self.text = None
+        self.doc = None
+        self.dropped = False  # document deleted before its chunks were written
+        self.chunks: List[str] = []
+        self.signatures, self.duplicates, self.fresh, self.vectors = [], [], [], []
+        self.repeats = []  # index of an earlier chunk of this document that each one nearly duplicates
+        self.deduplicated = 0  # chunks stored as near-duplicates, counted by _persist
+
+
+def _extract(job: _Job, extract=_extract_text):
+    _send_progress(job.owner_sub, {"stage": "received", "filename": job.filename})
+    # A file seen before (by any owner) reuses its stored text and, if still valid, embeddings
+    job.stored = content_store.lookup(job.content_hash, job.extractor) if settings.CONTENT_STORE else None
+    with stage('extract', job.timings):
+        job.text = job.stored.text if job.stored else extract(job.filename, job.content, job.content_type)
+    job.content = None  # the upload isn't needed past this stage
+    job.doc = Document.objects.create(owner_sub=job.owner_sub, filename=job.filename, content_type=job.content_type,
+                                      text=job.text, content_hash=job.content_hash)
+
+
+def _chunk(job: _Job):
+    _send_progress(job.owner_sub, {"stage": "chunking", "filename": job.filename})
+    with stage('chunk', job.timings):
+        job.chunks = _chunk_text(job.text, settings.MAX_CHUNK_TOKENS, settings.CHUNK_OVERLAP_TOKENS)
+    job.stored_vectors = content_store.embeddings(job.stored, len(job.chunks)) if job.stored else None
+    job.reused = 'embeddings' if job.stored_vectors is not None else 'text' if job.stored else None
+
+    job.signatures, job.duplicates = [None] * len(job.chunks), [None] * len(job.chunks)
+    job.repeats = [None] * len(job.chunks)
+    if settings.DEDUP_CHUNKS:
+        with stage('dedup', job.timings):
+            job.signatures = [dedup.signature(ch) for ch in job.chunks]
+            job.duplicates = dedup.find_duplicates(job.owner_sub, job.signatures)
+            job.repeats = dedup.find_repeats(job.signatures, skip=job.duplicates)
+    job.fresh = [i for i, (dup, rep) in enumerate(zip(job.duplicates, job.repeats)) if dup is None and rep is None]
+    _send_progress(job.owner_sub, {"stage": "embedding", "filename": job.filename, "chunks": len(job.chunks),
+                                   "duplicates": len(job.chunks) - len(job.fresh), "reused": job.reused})
+
+
+def _texts_to_embed(job: _Job) -> List[str]:
+    """Fill in the vectors that need no embedding call; returns the texts that do, in job.fresh order."""
+    if job.stored_vectors is not None:
+        job.vectors = job.stored_vectors
+        return []
+    # Near-duplicates reuse the embedding of the chunk they duplicate
+    job.vectors = [dup[1] if dup else None for dup in job.duplicates]
+    return [job.chunks[i] for i in job.fresh]
+
+
+def _copy_repeats(job: _Job):
+    # Repeats within the document take the vector of the chunk they repeat, once it's embedded
+    for i, j in enumerate(job.repeats):
+        if j is not None and job.vectors[i] is None:
+            job.vectors[i] = job.vectors[j]
+
+
+def _embed(job: _Job):
+    with stage('embed', job.timings):
+        texts = _texts_to_embed(job)
+        if texts:
+            for i, vector in zip(job.fresh, get_embedder().embed(texts)):
+                job.vectors[i] = vector
+        _copy_repeats(job)
+
+
+async def _aembed(job: _Job):
+    # No DB access or progress events here: this runs on the embed stage's event loop
+    with stage('embed', job.timings):
+        texts = _texts_to_embed(job)
+        if texts:
+            for i, vector in zip(job.fresh, await get_embedder().aembed(texts)):
+                job.vectors[i] = vector
+        _copy_repeats(job)
+
+
+def _batch_repeats(rows: List[Chunk]) -> List[Optional[int]]:
+    """For each unsaved chunk, the position of an earlier chunk of the same owner it nearly duplicates."""
+    repeats = [None] * len(rows)
+    for owner_sub in {row.owner_sub for row in rows}:
+        mine = [n for n, row in enumerate(rows) if row.owner_sub == owner_sub]
+        found = dedup.find_repeats([rows[n].minhash for n in mine], skip=[rows[n].duplicate_of_id for n in mine])
+        for n, j in zip(mine, found):
+            repeats[n] = mine[j] if j is not None else None
+    return repeats
+
+
+def _persist(jobs: List[_Job]):
+    """Write the jobs' chunks and mark their documents indexed, in one transaction.
+
+    A job whose document was deleted meanwhile is dropped (nothing written)
+    rather than failing the others in the batch. Chunks that nearly duplicate
+    an earlier chunk of the batch, in the same document or another one, are
+    written after it as its duplicates: the chunk stage could only compare
+    them with chunks already stored.
+    """
+    timings = {}
+    added = defaultdict(list)
+    with stage('persist', timings), transaction.atomic():
+        live = set(Document.objects.select_for_update()
+                   .filter(pk__in=[job.doc.pk for job in jobs], status=Document.STATUS_INDEXING)
+                   .values_list('pk', flat=True))
+        for job in jobs:
+            job.dropped = job.doc.pk not in live
+        kept = [job for job in jobs if not job.dropped]
+        rows = [
+            Chunk(document=job.doc, owner_sub=job.owner_sub, idx=i, text=ch, embedding=job.vectors[i],
+                  minhash=job.signatures[i], duplicate_of_id=job.duplicates[i][0] if job.duplicates[i] else None)
+            for job in kept for i, ch in enumerate(job.chunks)]
+        repeats = _batch_repeats(rows)
+        ingest.write_chunks([row for row, j in zip(rows, repeats) if j is None])
+        for row, j in zip(rows, repeats):
+            if j is not None:
+                row.duplicate_of_id, row.embedding = rows[j].pk, rows[j].embedding
+        ingest.write_chunks([row for row, j in zip(rows, repeats) if j is not None])
+        Document.objects.filter(pk__in=live).update(status=Document.STATUS_INDEXED, status_changed_at=timezone.now())
+        deduplicated = Counter(row.document_id for row in rows if row.duplicate_of_id)
+        for job in kept:
+            added[job.owner_sub].append(job.doc.pk)
+            job.deduplicated = deduplicated[job.doc.pk]
+        for owner_sub, document_ids in added.items():
+            invalidation.publish(owner_sub, added=document_ids)  # broadcast once committed
+    for job in jobs:
+        job.timings['persist'] = timings['persist']
+
+
+def _finish(job: _Job):
+    if job.dropped:
+        logger.info('%s (document %s) was deleted while indexing; its chunks were not written',
+                    job.filename, job.doc.pk)
+        return
+    if settings.CONTENT_STORE and job.stored_vectors is None:
+        content_store.save(job.content_hash, job.extractor, job.text, job.vectors)
+    INDEXING_JOBS.labels(outcome='ok').inc()
+    CHUNKS_INDEXED.inc(len(job.chunks))
+    CHUNKS_DEDUPLICATED.inc(job.deduplicated)
+    _send_progress(job.owner_sub, {"stage": "done", "filename": job.filename, "document_id": job.doc.pk,
+                                   "chunks": len(job.chunks), "duplicates": job.deduplicated,
+                                   "reused": job.reused, "timings_ms": job.timings})
+
+
+def _fail(job: _Job):
+    INDEXING_JOBS.labels(outcome='error').inc()
+    if job.doc is not None:
+        # Unless recovery or a delete has taken the document over meanwhile
+        Document.objects.filter(pk=job.doc.pk, status=Document.STATUS_INDEXING).update(
+            status=Document.STATUS_FAILED, status_changed_at=timezone.now())
+        _send_progress(job.owner_sub, {"stage": "error", "filename": job.filename, "document_id": job.doc.pk})
+
+
+def index_file(owner_sub: str, filename: str, content: bytes, content_type: str, content_hash: str = None):
+    """Index one file, running every stage in the calling thread."""
+    job = _Job(owner_sub, filename, content, content_type, content_hash)
+    try:
+        _extract(job)
+        _chunk(job)
+        _embed(job)
+        _persist([job])
+    except Exception:
+        _fail(job)
+        raise
+    _finish(job)
+
+
+@lru_cache(maxsize=None)
+def _extract_pool():
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    # Spawned, not forked: forking a threaded process can copy locks held by other threads.
+    # Workers set Django up so the task (this module's _extract_text) can be unpickled.
+    return ProcessPoolExecutor(max_workers=settings.INDEXING_EXTRACT_PROCESSES,
+                               mp_context=multiprocessing.get_context('spawn'), initializer=django.setup)
+
+
+def _extract_in_process(filename: str, content: bytes, content_type: str) -> str:
+    if not settings.INDEXING_EXTRACT_PROCESSES:
+        return _extract_text(filename, content, content_type)
+    try:
+        return _extract_pool().submit(_extract_text, filename, content, content_type).result()
+    except BrokenProcessPool:
+        _extract_pool.cache_clear()  # a worker died (e.g. out of memory); start a fresh pool for later files
+        raise
+
+
+def _releasing(fn):
+    """Stage function that hands its thread's DB connection back to the pool after each call."""
+    def run(arg):
+        try:
+            return fn(arg)
+        finally:
+            connections.close_all()
+    return run
+
+
+# extract -> chunk (+ dedup) -> embed -> persist, each fed by a bounded queue; threads start on first submit
+_PIPELINE = Pipeline('indexing', [
+    Stage('extract', _releasing(lambda job: _extract(job, _extract_in_process)),
+          workers=settings.INDEXING_EXTRACT_PROCESSES),
+    Stage('chunk', _releasing(_chunk), workers=settings.INDEXING_CHUNK_WORKERS),
+    AsyncStage('embed', _aembed, concurrency=settings.INDEXING_EMBED_CONCURRENCY),
+    # The scheduler admits at most INDEXING_WORKERS files, so a larger batch could never fill
+    BatchStage('persist', _releasing(_persist), workers=settings.INDEXING_PERSIST_WORKERS,
+               batch=min(settings.INDEXING_PERSIST_BATCH, settings.INDEXING_WORKERS)),
+], queue_size=settings.INDEXING_STAGE_QUEUE,
+    on_queue=lambda s, q: INDEXING_QUEUE_DEPTH.labels(stage=s.name).set_function(q.qsize))
+
+
+def _index_pipelined(owner_sub: str, filename: str, content: bytes, content_type: str, content_hash: str = None):
+    job = _Job(owner_sub, filename, content, content_type, content_hash)
+    try:
+        _PIPELINE.submit(job).result()
+    except Exception:
+        _fail(job)
+        raise
+    _finish(job)
+
+
+def _run_job(owner_sub: str, filename: str, content: bytes, content_type: str, profile: bool = False,
+             content_hash: str = None):
+    try:
+        profile = profiling.should_profile(profile)
+        if settings.INDEXING_PIPELINE and not profile:
+            _index_pipelined(owner_sub, filename, content, content_type, content_hash)
+        else:
+            # A profile only sees its own thread, so profiled jobs run every stage here
+            with profiling.profiled('index', profile):
+                index_file(owner_sub, filename, content, content_type, content_hash)
+    except Exception:
+        logger.exception('Indexing %s failed', filename)
+    finally:
+        # Hand this worker's DB connection back to the pool between jobs
+        connections.close_all()
+
+
+def _queued_progress(owner_sub: str, filename: str, position: int):
+    # Live only: a position is stale by the time it could be replayed, and there can be many
+    _send_progress(owner_sub, {"stage": "queued", "filename": filename, "position": position}, durable=False)
 
-    _send_progress(owner_sub, {"stage": "chunking", "filename": filename})
-    chunks = _chunk_text(text, settings.MAX_CHUNK_TOKENS, settings.CHUNK_OVERLAP_TOKENS)
 
-    _send_progress(owner_sub, {"stage": "embedding", "filename": filename, "chunks": len(chunks)})
-    vectors = EMBEDDER.embed(chunks)
+# Bounded worker pool shared fairly between owners; threads start on first submit
+_SCHEDULER = FairScheduler(
+    workers=settings.INDEXING_WORKERS,
+    run=_run_job,
+    notify=_queued_progress,
+    quantum=settings.INDEXING_QUANTUM_BYTES,
+    owner_concurrency=settings.INDEXING_OWNER_CONCURRENCY,
+    owner_inflight_bytes=settings.INDEXING_OWNER_INFLIGHT_BYTES,
+    notify_interval=settings.INDEXING_QUEUE_NOTIFY_INTERVAL,
+)
 
-    objs = [Chunk(document=doc, owner_sub=owner_sub, idx=i, text=ch, embedding=vectors[i]) for i, ch in enumerate(chunks)]
-    Chunk.objects.bulk_create(objs, batch_size=100)
 
-    _send_progress(owner_sub, {"stage": "done", "filename": filename, "chunks": len(chunks)})
+def admits(owner_sub: str, files: int, size: int) -> bool:
+    """Admission control: keep each owner's backlog (held in memory) bounded."""
+    return _SCHEDULER.admits(owner_sub, files, size,
+                             settings.INDEXING_OWNER_MAX_QUEUED_FILES, settings.INDEXING_OWNER_MAX_QUEUED_BYTES)
 
 
-def index_file_async(owner_sub: str, filename: str, content: bytes, content_type: str):
-    # Lightweight background thread for MVP (no Celery in Step 1)
-    threading.Thread(target=index_file, args=(owner_sub, filename, content, content_type), daemon=True).start()
+def index_file_async(owner_sub: str, filename: str, content: bytes, content_type: str, profile: bool = False,
+                     content_hash: str = None):
+    # In-process worker pool for MVP (no Celery in Step 1)
+    _SCHEDULER.submit(owner_sub, filename, len(content), content, content_type, profile, content_hash)
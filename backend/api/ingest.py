@@ -0,0 +1,62 @@
+"""Writing new documents' chunks: COPY on PostgreSQL, bulk_create elsewhere.
+
+The indexing persist stage hands over the chunks of a whole batch of
+documents (up to INDEXING_PERSIST_BATCH) at once. bulk_create sends an
+INSERT per 100 chunks, each row's embedding a JSON literal in the
+statement. With CHUNK_INGEST=copy, PostgreSQL instead gets one COPY ...
+FROM STDIN stream for the whole batch through psycopg 3, with embeddings
+as compact JSON, and the new ids are read back in one query (ChunkBand
+rows need them). Either way the chunks and their bands are written in the
+caller's transaction, so a failed batch leaves no partial rows; the
+persist stage then retries its documents one at a time.
+"""
+import json
+from typing import List
+from django.conf import settings
+from django.db import connection, transaction
+from . import dedup
+from .models import Chunk, ChunkBand
+
+COLUMNS = ('document', 'owner_sub', 'idx', 'text', 'embedding', 'minhash', 'duplicate_of')
+
+
+def copy_supported() -> bool:
+    return settings.CHUNK_INGEST == 'copy' and connection.vendor == 'postgresql'
+
+
+def write_chunks(objs: List[Chunk]) -> List[Chunk]:
+    """Insert new documents' unsaved chunks and their LSH bands; sets each chunk's pk."""
+    with transaction.atomic():
+        if objs and copy_supported():
+            _copy(objs)
+        else:
+            Chunk.objects.bulk_create(objs, batch_size=100)
+        ChunkBand.objects.bulk_create(dedup.bands_for(objs), batch_size=1000)
+    return objs
+
+
+def _copy_row(obj: Chunk) -> tuple:
+    """One chunk's COPY values, in COLUMNS order."""
+    return (
+        obj.document_id, obj.owner_sub, obj.idx, Chunk._meta.get_field('text').get_prep_value(obj.text),
+        json.dumps(obj.embedding, separators=(',', ':')),
+        bytes(obj.minhash) if obj.minhash is not None else None, obj.duplicate_of_id,
+    )
+
+
+def _copy(objs: List[Chunk]):
+    fields = [Chunk._meta.get_field(name) for name in COLUMNS]
+    sql = f"COPY {Chunk._meta.db_table} ({', '.join(f.column for f in fields)}) FROM STDIN"
+    with connection.cursor() as cur:
+        # Django's wrapper has no COPY support; the psycopg 3 cursor underneath does
+        with cur.cursor.copy(sql) as copy:
+            for obj in objs:
+                copy.write_row(_copy_row(obj))
+    # New documents' chunks are exactly their (owner_sub, document, idx) index entries
+    rows = (Chunk.objects.filter(owner_sub__in={obj.owner_sub for obj in objs},
+                                 document_id__in={obj.document_id for obj in objs})
+            .values_list('document_id', 'idx', 'id'))
+    ids = {(document_id, idx): pk for document_id, idx, pk in rows}
+    for obj in objs:
+        obj.pk = ids[obj.document_id, obj.idx]
+        obj._state.adding = False
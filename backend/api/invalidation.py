@@ -0,0 +1,115 @@
+"""Per-owner index versions and the cross-worker invalidation bus.
+
+Every change to an owner's chunks bumps their OwnerIndexVersion and
+publishes (owner, version, documents added/removed). Each worker patches or
+drops its cached rag index on receipt; rag.get_index still compares versions
+on every search, so a message lost while Redis was unreachable only costs a
+reload.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import Iterable
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from .models import OwnerIndexVersion
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'docuchat:retrieval'
+# Identifies this process so it skips its own messages (already applied locally)
+_ORIGIN = uuid.uuid4().hex
+_listener_lock = threading.Lock()
+_listener = None
+
+
+def current_version(owner_sub: str) -> int:
+    version = OwnerIndexVersion.objects.filter(owner_sub=owner_sub).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump(owner_sub: str) -> int:
+    rows = OwnerIndexVersion.objects.filter(owner_sub=owner_sub)
+    # Write before reading: takes the row (or SQLite database) lock up front
+    # instead of upgrading a read lock, which deadlocks concurrent writers
+    with transaction.atomic():
+        if not rows.update(version=F('version') + 1):
+            try:
+                with transaction.atomic():
+                    OwnerIndexVersion.objects.create(owner_sub=owner_sub, version=1)
+            except IntegrityError:
+                rows.update(version=F('version') + 1)
+        return rows.values_list('version', flat=True).get()
+
+
+def publish(owner_sub: str, added: Iterable[int] = (), removed: Iterable[int] = ()) -> int:
+    """Record that documents were (re)indexed or deleted for an owner and tell every worker."""
+    version = bump(owner_sub)
+    event = {'owner': owner_sub, 'version': version, 'added': list(added), 'removed': list(removed)}
+    # Inside a transaction, workers must not reload before the chunks are visible
+    transaction.on_commit(lambda: _broadcast(event))
+    return version
+
+
+def _broadcast(event: dict):
+    _apply(event)
+    if settings.INVALIDATION_BUS != 'redis':
+        return
+    try:
+        _redis().publish(CHANNEL, json.dumps({**event, 'origin': _ORIGIN}))
+    except Exception as e:
+        # Other workers catch up through the version check on their next search
+        logger.warning('Could not publish index invalidation for version %s: %s', event['version'], e)
+
+
+def _apply(event: dict):
+    from . import rag
+    rag.apply_change(event['owner'], event['version'], event['added'], event['removed'])
+
+
+@lru_cache(maxsize=None)
+def _redis():
+    import redis
+    return redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+
+def start_listener():
+    """Subscribe this process to the bus (called from backend.asgi); no-op without Redis."""
+    global _listener
+    if settings.INVALIDATION_BUS != 'redis':
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(target=_listen, name='index-invalidation', daemon=True)
+            _listener.start()
+
+
+def _listen():
+    backoff = 1
+    while True:
+        try:
+            pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CHANNEL)
+            backoff = 1
+            for message in pubsub.listen():
+                _handle(message['data'])
+        except Exception as e:
+            logger.warning('Index invalidation bus disconnected (%s); retrying in %ss', e, backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+def _handle(data: bytes):
+    try:
+        event = json.loads(data)
+        if event.get('origin') != _ORIGIN:
+            _apply(event)
+    except Exception:
+        logger.exception('Bad index invalidation message')
+    finally:
+        # Patching an index reads the new chunks; don't pin a pooled connection
+        connections.close_all()
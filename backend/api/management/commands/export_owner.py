@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.export import export_owner
+from api.models import Document
+
+
+class Command(BaseCommand):
+    help = (
+        'Export an owner\'s documents, chunk texts and embeddings to a single '
+        'checksummed file that import_owner loads without re-embedding.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('owner_sub')
+        parser.add_argument('out', help='Path to write the export to')
+
+    def handle(self, *args, owner_sub, out, **options):
+        if not Document.objects.filter(owner_sub=owner_sub).exists():
+            raise CommandError(f'Owner {owner_sub!r} has no documents')
+        with open(out, 'wb') as f:
+            manifest = export_owner(owner_sub, f)
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {manifest['documents']} documents and {manifest['chunks']} chunks to {out}"))
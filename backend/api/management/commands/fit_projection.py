@@ -0,0 +1,79 @@
+import random
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.invalidation import bump
+from api.models import Chunk
+from api.projection import Projection, fit_pca
+
+
+class Command(BaseCommand):
+    help = (
+        'Fit a reduced-dimension projection for candidate search from a sample of '
+        'stored chunk embeddings and report recall@k and scan latency against the '
+        'exact search. Point RETRIEVAL_PROJECTION at the output; --apply also bumps '
+        'every owner\'s index version so workers rebuild with it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--method', choices=('pca', 'truncate'), default='pca',
+                            help='pca fits a basis; truncate keeps the leading dimensions (Matryoshka-style models)')
+        parser.add_argument('--dims', type=int, default=256, help='Reduced dimensionality')
+        parser.add_argument('--samples', type=int, default=20000, help='Number of chunks to fit and evaluate on')
+        parser.add_argument('--queries', type=int, default=200, help='Held-out chunks used as evaluation queries')
+        parser.add_argument('--top-k', type=int, default=settings.TOP_K)
+        parser.add_argument('--out', default=settings.RETRIEVAL_PROJECTION,
+                            help='Path to write the projection to (default: RETRIEVAL_PROJECTION)')
+        parser.add_argument('--apply', action='store_true', help='Bump every owner\'s index version after writing')
+
+    def handle(self, *args, method, dims, samples, queries, top_k, out, apply, **options):
+        import numpy as np
+        if not out:
+            raise CommandError('No output path: pass --out or set RETRIEVAL_PROJECTION')
+        ids = list(Chunk.objects.filter(duplicate_of__isnull=True).values_list('id', flat=True))
+        if len(ids) < 2:
+            raise CommandError('Not enough chunks to fit on')
+        picked = random.sample(ids, min(samples + queries, len(ids)))
+        rows = Chunk.objects.filter(id__in=picked).values_list('embedding', flat=True).iterator()
+        sample = np.array(list(rows), dtype=np.float32)
+        if dims >= sample.shape[1]:
+            raise CommandError(f'--dims must be below the embedding dimension ({sample.shape[1]})')
+        sample /= np.maximum(np.linalg.norm(sample, axis=1, keepdims=True), 1e-12)
+        held_out = min(queries, len(sample) // 2)
+        query_rows, corpus = sample[:held_out], sample[held_out:]
+
+        projection = fit_pca(corpus, dims) if method == 'pca' else Projection('truncate', dims)
+        self._report(projection, corpus, query_rows, top_k)
+        projection.save(out)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {method} projection to {dims} dims ({len(corpus)} rows) to {out}'))
+
+        if apply:
+            owners = list(Chunk.objects.values_list('owner_sub', flat=True).distinct())
+            for owner in owners:
+                # Cached indexes and snapshots are version-checked on every search
+                bump(owner)
+            self.stdout.write(f'Bumped index versions of {len(owners)} owners')
+
+    def _report(self, projection, corpus, query_rows, top_k):
+        import numpy as np
+        k = min(top_k, len(corpus))
+        shortlist = min(k * settings.RETRIEVAL_RERANK_FACTOR, len(corpus))
+        reduced = projection.reduce(corpus)
+        exact_ms, reduced_ms, hits = [], [], 0
+        for q in query_rows:
+            t0 = time.perf_counter()
+            exact = np.argpartition(-(corpus @ q), k - 1)[:k]
+            t1 = time.perf_counter()
+            cand = np.argpartition(-(reduced @ projection.reduce(q)), shortlist - 1)[:shortlist]
+            found = cand[np.argpartition(-(corpus[cand] @ q), k - 1)[:k]]
+            t2 = time.perf_counter()
+            exact_ms.append((t1 - t0) * 1000.0)
+            reduced_ms.append((t2 - t1) * 1000.0)
+            hits += len(np.intersect1d(exact, found))
+        if not len(query_rows):
+            return
+        self.stdout.write(
+            f'recall@{k} {hits / (k * len(query_rows)):.3f} with a shortlist of {shortlist}; '
+            f'median scan {np.median(exact_ms):.3f} ms exact vs {np.median(reduced_ms):.3f} ms reduced '
+            f'over {len(corpus)} rows'
+        )
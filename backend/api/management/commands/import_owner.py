@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.export import import_owner
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a file written by export_owner. Documents and chunks get new ids; '
+        'embeddings are reused as stored, so nothing is sent to the embedder.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Export file')
+        parser.add_argument('--owner', help='Import into this owner instead of the exporting one')
+        parser.add_argument('--allow-model-mismatch', action='store_true',
+                            help='Import even if the export was embedded with a different EMBEDDING_MODEL')
+
+    def handle(self, *args, path, owner, allow_model_mismatch, **options):
+        try:
+            with open(path, 'rb') as f:
+                result = import_owner(f, owner, allow_model_mismatch)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['documents']} documents and {result['chunks']} chunks "
+            f"({result['duplicates']} near-duplicates) into {result['owner_sub']}"))
@@ -0,0 +1,107 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+TABLE = 'api_chunk'
+LOCK = f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE'
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert api_chunk into a Postgres table hash-partitioned by owner_sub. '
+        'Per-owner scans then only touch one partition. Postgres only, one-way, '
+        'takes an exclusive lock on the chunk table while rows are copied.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('partitions', type=int, nargs='?', default=16)
+        parser.add_argument('--dry-run', action='store_true', help='Print the SQL without executing it')
+
+    def handle(self, *args, partitions, dry_run, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Hash partitioning requires PostgreSQL')
+        if partitions < 2:
+            raise CommandError('Use at least 2 partitions')
+        if self._is_partitioned():
+            self.stdout.write(f'{TABLE} is already partitioned; nothing to do')
+            return
+
+        with transaction.atomic(), connection.cursor() as cur:
+            if not dry_run:
+                # Before reading the catalog, so no index or constraint can be added in between
+                cur.execute(LOCK)
+            statements = _partition_sql(partitions, _indexes(cur), _foreign_keys(cur))
+            if dry_run:
+                self.stdout.write(';\n'.join([LOCK] + statements) + ';')
+                return
+            for sql in statements:
+                cur.execute(sql)
+        self.stdout.write(self.style.SUCCESS(f'{TABLE} partitioned into {partitions} hash partitions'))
+
+    def _is_partitioned(self) -> bool:
+        with connection.cursor() as cur:
+            cur.execute(
+                'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+                'WHERE c.relname = %s AND pg_table_is_visible(c.oid)',
+                [TABLE],
+            )
+            return cur.fetchone() is not None
+
+
+def _indexes(cur) -> list:
+    """(name, CREATE INDEX statement, unique, column names) of every index on the chunk table but its primary key."""
+    cur.execute(
+        'SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique, '
+        'ARRAY(SELECT a.attname FROM pg_attribute a WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)) '
+        'FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+        'WHERE i.indrelid = %s::regclass AND NOT i.indisprimary ORDER BY c.relname',
+        [TABLE],
+    )
+    return cur.fetchall()
+
+
+def _foreign_keys(cur) -> list:
+    """(name, definition, referencing table, referenced table) of foreign keys from or to the chunk table."""
+    cur.execute(
+        'SELECT conname, pg_get_constraintdef(oid), conrelid::regclass::text, confrelid::regclass::text '
+        'FROM pg_constraint WHERE contype = %s AND (conrelid = %s::regclass OR confrelid = %s::regclass) '
+        'ORDER BY conname',
+        ['f', TABLE, TABLE],
+    )
+    return cur.fetchall()
+
+
+def _partition_sql(partitions: int, indexes: list, foreign_keys: list) -> list:
+    # The primary key of a partitioned table must contain the partition key, so the
+    # PK becomes (id, owner_sub). Django still addresses rows by id alone. Identity
+    # columns are not allowed on partitioned tables before PG 17, hence the sequence.
+    # Every other index and foreign key is read from the catalog and recreated
+    # unchanged once the new table has the old name.
+    for name, _, unique, columns in indexes:
+        if unique and 'owner_sub' not in columns:
+            raise CommandError(f'Unique index {name} does not include owner_sub, so it cannot be partitioned')
+    for name, _, table, referenced in foreign_keys:
+        if referenced == TABLE:
+            # e.g. duplicate_of and ChunkBand.chunk, which are declared with db_constraint=False for this reason
+            raise CommandError(f'Foreign key {name} on {table} references {TABLE}, which will have no unique id')
+    new = f'{TABLE}_partitioned'
+    sql = [
+        f'CREATE TABLE {new} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY HASH (owner_sub)',
+        f'ALTER TABLE {new} ADD PRIMARY KEY (id, owner_sub)',
+    ]
+    for i in range(partitions):
+        sql.append(
+            f'CREATE TABLE {TABLE}_p{i} PARTITION OF {new} FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})'
+        )
+    sql += [
+        f'INSERT INTO {new} SELECT * FROM {TABLE}',
+        f'CREATE SEQUENCE {new}_id_seq',
+        f"SELECT setval('{new}_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}",
+        f'DROP TABLE {TABLE}',
+        f'ALTER TABLE {new} RENAME TO {TABLE}',
+        f'ALTER SEQUENCE {new}_id_seq RENAME TO {TABLE}_id_seq',
+        f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id',
+        f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')",
+    ]
+    sql += [f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}' for name, definition, _, _ in foreign_keys]
+    sql += [definition for _, definition, _, _ in indexes]
+    return sql
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from api.models import Document, ExtractedContent
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete content store entries (shared extracted text and embeddings) '
+        'whose file is no longer used by any document.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be deleted')
+
+    def handle(self, *args, dry_run, **options):
+        unused = (ExtractedContent.objects
+                  .annotate(used=Exists(Document.objects.filter(content_hash=OuterRef('sha256'))))
+                  .filter(used=False))
+        if dry_run:
+            self.stdout.write(f'{unused.count()} unused content store entries')
+            return
+        deleted, _ = ExtractedContent.objects.filter(pk__in=unused.values('pk')).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unused content store entries'))
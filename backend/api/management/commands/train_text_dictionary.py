@@ -0,0 +1,29 @@
+import random
+from django.core.management.base import BaseCommand, CommandError
+from api.compression import train_dictionary
+from api.models import Chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Train a zstd dictionary from a sample of stored chunk texts. Point '
+        'TEXT_COMPRESSION_DICT at the output and set TEXT_COMPRESSION=zstd. '
+        'When replacing a dictionary, write a new file and list the old one in '
+        'TEXT_COMPRESSION_DICTS for as long as rows compressed with it exist.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('out', help='Path to write the dictionary to')
+        parser.add_argument('--samples', type=int, default=5000, help='Number of chunks to sample')
+        parser.add_argument('--size', type=int, default=112640, help='Dictionary size in bytes')
+
+    def handle(self, *args, out, samples, size, **options):
+        ids = list(Chunk.objects.values_list('id', flat=True))
+        if not ids:
+            raise CommandError('No chunks to train on')
+        picked = random.sample(ids, min(samples, len(ids)))
+        texts = [ch.text for ch in Chunk.objects.filter(id__in=picked).only('id', 'text').iterator()]
+        data = train_dictionary(texts, size)
+        with open(out, 'wb') as f:
+            f.write(data)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(data)} byte dictionary from {len(texts)} chunks to {out}'))
@@ -0,0 +1,59 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+# Labels are deliberately low-cardinality: never put owner_sub or filenames here.
+STAGE_SECONDS = Histogram(
+    'docuchat_stage_seconds',
+    'Time spent in one indexing/ask stage',
+    ['stage', 'outcome'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+INDEXING_JOBS = Counter('docuchat_indexing_jobs_total', 'Indexing jobs by outcome (ok, error, rejected)', ['outcome'])
+CHUNKS_INDEXED = Counter('docuchat_chunks_indexed_total', 'Chunks written by indexing')
+CHUNKS_DEDUPLICATED = Counter('docuchat_chunks_deduplicated_total', 'Indexed chunks that reused a near-duplicate embedding')
+CONTENT_STORE_LOOKUPS = Counter('docuchat_content_store_lookups_total',
+                                'Content store lookups by result (embeddings, text, miss)', ['result'])
+ASKS = Counter('docuchat_asks_total', 'Chat asks by outcome', ['outcome'])
+RESIDENT_OWNERS = Gauge('docuchat_retrieval_resident_owners', 'Owners with a retrieval index in memory')
+RESIDENT_BYTES = Gauge('docuchat_retrieval_resident_bytes', 'Bytes of resident retrieval indexes')
+RESIDENCY_EVICTIONS = Counter('docuchat_retrieval_evictions_total', 'Retrieval indexes evicted to stay under budget')
+INDEX_LOADS = Counter('docuchat_retrieval_index_loads_total', 'Retrieval index loads by source', ['source'])
+SESSION_RETRIEVALS = Counter('docuchat_session_retrievals_total', 'Session ask retrievals by source (cache, scan)', ['source'])
+INDEXING_QUEUE_DEPTH = Gauge('docuchat_indexing_queue_depth', 'Files waiting for each indexing pipeline stage', ['stage'])
+
+
+@contextmanager
+def stage(name: str, timings: Optional[Dict[str, float]] = None):
+    """Time a block as `name`; also record milliseconds into `timings` if given."""
+    outcome = 'error'
+    t0 = time.perf_counter()
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.labels(stage=name, outcome=outcome).observe(elapsed)
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0.0) + elapsed * 1000.0, 2)
+
+
+class _DbPoolCollector:
+    """Exports backend.postgresql_pool statistics at scrape time."""
+    # psycopg_pool reports these as current values; everything else is cumulative
+    GAUGES = {'pool_min', 'pool_max', 'pool_size', 'pool_available', 'requests_waiting'}
+
+    def describe(self):
+        # Names depend on what the pool reports; don't touch the DB at registration
+        return []
+
+    def collect(self):
+        from backend.postgresql_pool.base import pool_stats
+        for key, value in pool_stats().items():
+            family = GaugeMetricFamily if key in self.GAUGES else CounterMetricFamily
+            yield family(f'docuchat_db_pool_{key}', f'psycopg_pool statistic {key}', value=value)
+
+
+REGISTRY.register(_DbPoolCollector())
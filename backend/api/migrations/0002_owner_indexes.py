@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-19 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['owner_sub', '-created_at'], name='api_session_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chunk',
+            index=models.Index(fields=['owner_sub', 'document', 'idx'], name='api_chunk_owner_doc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['owner_sub', '-created_at', '-id'], name='api_doc_owner_created_idx'),
+        ),
+    ]
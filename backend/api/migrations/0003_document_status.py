@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-19 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_owner_indexes'),
+    ]
+
+    operations = [
+        # Rows that predate the column finished indexing long ago
+        migrations.AddField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('indexing', 'Indexing'), ('indexed', 'Indexed'), ('failed', 'Failed')], default='indexed', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('indexing', 'Indexing'), ('indexed', 'Indexed'), ('failed', 'Failed')], default='indexing', max_length=16),
+        ),
+    ]
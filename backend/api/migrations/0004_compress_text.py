@@ -0,0 +1,59 @@
+from django.db import migrations, models
+
+import api.fields
+
+BATCH_SIZE = 500
+
+
+def _copy(model, source: str, target: str):
+    last = 0
+    while True:
+        batch = list(model.objects.filter(pk__gt=last).order_by('pk').only('pk', source)[:BATCH_SIZE])
+        if not batch:
+            return
+        for obj in batch:
+            setattr(obj, target, getattr(obj, source))
+        model.objects.bulk_update(batch, [target])
+        last = batch[-1].pk
+
+
+def compress_rows(apps, schema_editor):
+    for name in ('Document', 'Chunk'):
+        _copy(apps.get_model('api', name), 'text', 'text_compressed')
+
+
+def decompress_rows(apps, schema_editor):
+    for name in ('Document', 'Chunk'):
+        _copy(apps.get_model('api', name), 'text_compressed', 'text')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_document_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='text_compressed',
+            field=api.fields.CompressedTextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='text_compressed',
+            field=api.fields.CompressedTextField(null=True),
+        ),
+        # Nullable so the column can be re-added empty when migrating backwards
+        migrations.AlterField(
+            model_name='document',
+            name='text',
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='chunk',
+            name='text',
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(compress_rows, decompress_rows),
+    ]
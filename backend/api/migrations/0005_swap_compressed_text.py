@@ -0,0 +1,41 @@
+from django.db import migrations
+
+import api.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_compress_text'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='document',
+            name='text',
+        ),
+        migrations.RemoveField(
+            model_name='chunk',
+            name='text',
+        ),
+        migrations.RenameField(
+            model_name='document',
+            old_name='text_compressed',
+            new_name='text',
+        ),
+        migrations.RenameField(
+            model_name='chunk',
+            old_name='text_compressed',
+            new_name='text',
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='text',
+            field=api.fields.CompressedTextField(),
+        ),
+        migrations.AlterField(
+            model_name='chunk',
+            name='text',
+            field=api.fields.CompressedTextField(),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-19 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_swap_compressed_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerIndexVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner_sub', models.CharField(max_length=255, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-19 06:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_owner_index_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunk',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='api.chunk'),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='minhash',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.CreateModel(
+            name='ChunkBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner_sub', models.CharField(max_length=255)),
+                ('key', models.BigIntegerField()),
+                ('chunk', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='api.chunk')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner_sub', 'key'], name='api_chunkband_owner_key_idx')],
+            },
+        ),
+    ]
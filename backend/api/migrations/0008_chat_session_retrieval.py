@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-19 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_chunk_dedup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='retrieval_chunks',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='retrieval_query',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='retrieval_version',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', '-created_at', '-id'], name='api_message_session_idx'),
+        ),
+    ]
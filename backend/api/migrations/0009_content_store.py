@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-19 06:29
+
+import api.fields
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_chat_session_retrieval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('extractor', models.CharField(max_length=32)),
+                ('text', api.fields.CompressedTextField()),
+                ('chunking', models.CharField(blank=True, max_length=64)),
+                ('embedding_model', models.CharField(blank=True, max_length=100)),
+                ('embeddings', models.BinaryField(null=True)),
+                ('dim', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['content_hash'], name='api_doc_content_hash_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='extractedcontent',
+            constraint=models.UniqueConstraint(fields=('sha256', 'extractor'), name='api_extracted_content_key'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 06:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_content_store'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('indexing', 'Indexing'), ('indexed', 'Indexed'), ('failed', 'Failed'), ('deleting', 'Deleting')], default='indexing', max_length=16),
+        ),
+    ]
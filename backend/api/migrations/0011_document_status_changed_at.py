@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_document_deleting_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
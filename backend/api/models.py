@@ -1,28 +1,117 @@
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
 from django.utils import timezone
+from .fields import CompressedTextField
 
 class Document(models.Model):
+    STATUS_INDEXING = 'indexing'
+    STATUS_INDEXED = 'indexed'
+    STATUS_FAILED = 'failed'
+    STATUS_DELETING = 'deleting'
+    STATUS_CHOICES = [
+        (STATUS_INDEXING, 'Indexing'),
+        (STATUS_INDEXED, 'Indexed'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_DELETING, 'Deleting'),
+    ]
+
     owner_sub = models.CharField(max_length=255)  # OIDC subject
     filename = models.CharField(max_length=512)
     content_type = models.CharField(max_length=100)
-    text = models.TextField()
+    text = CompressedTextField()
     created_at = models.DateTimeField(default=timezone.now)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_INDEXING)
+    # Rows stuck indexing or deleting for long are taken over by api.recovery
+    status_changed_at = models.DateTimeField(default=timezone.now)
+    content_hash = models.CharField(max_length=64, blank=True)  # SHA-256 of the uploaded bytes
+
+    class Meta:
+        indexes = [
+            # Per-owner listing, newest first
+            models.Index(fields=['owner_sub', '-created_at', '-id'], name='api_doc_owner_created_idx'),
+            # prune_content_store: is any document still using a stored file?
+            models.Index(fields=['content_hash'], name='api_doc_content_hash_idx'),
+        ]
+
+class ExtractedContent(models.Model):
+    """Extracted text and chunk embeddings of one file's bytes, shared by every owner who uploads it.
+
+    Keyed by (SHA-256, extractor): a new extractor version misses. The
+    embeddings are only reused when the chunking settings and embedding
+    model still match.
+    """
+    sha256 = models.CharField(max_length=64)
+    extractor = models.CharField(max_length=32)  # '<kind>/<version>', see indexing.EXTRACTOR_VERSION
+    text = CompressedTextField()
+    chunking = models.CharField(max_length=64, blank=True)
+    embedding_model = models.CharField(max_length=100, blank=True)
+    embeddings = models.BinaryField(null=True)  # little-endian float32, (chunks, dim) row-major
+    dim = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'extractor'], name='api_extracted_content_key'),
+        ]
 
 class Chunk(models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chunks')
     owner_sub = models.CharField(max_length=255)
     idx = models.IntegerField()
-    text = models.TextField()
+    text = CompressedTextField()
     embedding = models.JSONField()  # list[float]
+    minhash = models.BinaryField(null=True, editable=False)  # api.dedup signature
+    # Near-duplicate of an earlier chunk whose embedding this one reuses; only
+    # canonical chunks (duplicate_of NULL) are searched. No DB constraint: a
+    # partitioned api_chunk has no unique key on id alone.
+    duplicate_of = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL,
+                                     db_constraint=False, related_name='duplicates')
+
+    class Meta:
+        indexes = [
+            # rag.search scans one owner's chunks; (document, idx) keeps them in reading order
+            models.Index(fields=['owner_sub', 'document', 'idx'], name='api_chunk_owner_doc_idx'),
+        ]
+
+class ChunkBand(models.Model):
+    """One LSH band key of a canonical chunk's MinHash signature (see api.dedup)."""
+    owner_sub = models.CharField(max_length=255)
+    key = models.BigIntegerField()
+    chunk = models.ForeignKey(Chunk, on_delete=models.CASCADE, db_constraint=False, related_name='bands')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner_sub', 'key'], name='api_chunkband_owner_key_idx'),
+        ]
 
 class ChatSession(models.Model):
     owner_sub = models.CharField(max_length=255)
     created_at = models.DateTimeField(default=timezone.now)
     title = models.CharField(max_length=255, blank=True)
+    # Last full retrieval (api.chat): unit float32 query embedding, candidate
+    # chunk ids best first, and the owner's index version it was made at
+    retrieval_query = models.BinaryField(null=True, editable=False)
+    retrieval_chunks = models.JSONField(default=list, editable=False)
+    retrieval_version = models.BigIntegerField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner_sub', '-created_at'], name='api_session_owner_idx'),
+        ]
 
 class ChatMessage(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
     role = models.CharField(max_length=20)  # 'user' | 'assistant' | 'system'
     content = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # A session's latest messages, newest first (api.chat.history)
+            models.Index(fields=['session', '-created_at', '-id'], name='api_message_session_idx'),
+        ]
+
+class OwnerIndexVersion(models.Model):
+    """Monotonic per-owner counter, bumped whenever the owner's chunks change."""
+    owner_sub = models.CharField(max_length=255, unique=True)
+    version = models.BigIntegerField(default=0)
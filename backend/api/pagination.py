@@ -0,0 +1,57 @@
+import base64
+import json
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """Newest-first keyset pagination on (created_at, id).
+
+    Each page is a single index range scan that starts right after the last row
+    of the previous page, so deep pages cost the same as the first one.
+    The cursor is opaque to clients: ?cursor=<next from the previous page>.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        size = self._page_size(request)
+        qs = queryset.order_by('-created_at', '-id')
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self._decode(cursor)
+            qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        page = list(qs[:size + 1])
+        self.next_cursor = self._encode(page[size - 1]) if len(page) > size else None
+        return page[:size]
+
+    def get_paginated_response(self, data):
+        return Response({'results': data, 'next': self.next_cursor})
+
+    def _page_size(self, request) -> int:
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, settings.DOCUMENTS_PAGE_SIZE))
+        except ValueError:
+            size = settings.DOCUMENTS_PAGE_SIZE
+        return max(1, min(size, self.max_page_size))
+
+    @staticmethod
+    def _encode(obj) -> str:
+        raw = json.dumps([obj.created_at.isoformat(), obj.id]).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    @staticmethod
+    def _decode(cursor: str):
+        try:
+            created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError(cursor)
+            return created_at, int(pk)
+        except Exception:
+            raise NotFound('Invalid cursor')
@@ -0,0 +1,171 @@
+"""Stages connected by bounded queues, each with its own concurrency.
+
+An item submitted to a Pipeline goes through every stage in order. Each
+stage takes items from its own queue and puts them on the next stage's,
+blocking while that queue is full, so a slow stage holds back the ones
+before it instead of letting work pile up in memory. Stages come in three
+kinds:
+
+* Stage: `workers` threads, each calling fn(item)
+* AsyncStage: one thread running an event loop with up to `concurrency`
+  coroutine_fn(item) calls in flight (for I/O-bound work)
+* BatchStage: `workers` threads, each calling fn(items) on up to `batch`
+  items that are already waiting; a failed batch is retried one item at a
+  time, so one bad item fails alone
+
+Batch functions must be all-or-nothing (one transaction, say), since a
+failed batch is run again. submit() returns a Future that gets the item
+back after the last stage, or the exception of the stage that failed (the
+item then skips the remaining stages). Threads start on first submit.
+"""
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('item', 'future')
+
+    def __init__(self, item, future: Future):
+        self.item = item
+        self.future = future
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable, workers: int = 1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue: Optional[queue.Queue] = None
+        self.pipeline: Optional['Pipeline'] = None
+
+    def start(self):
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'{self.pipeline.name}-{self.name}-{i}', daemon=True).start()
+
+    def _work(self):
+        while True:
+            entry = self.queue.get()
+            self.pipeline._run(self, entry, lambda: self.fn(entry.item))
+
+
+class AsyncStage(Stage):
+    def __init__(self, name: str, coroutine_fn: Callable, concurrency: int = 1):
+        super().__init__(name, coroutine_fn, workers=1)
+        self.concurrency = max(1, concurrency)
+
+    def start(self):
+        # Blocking queue calls stay on daemon threads (never on the loop or its executor,
+        # whose threads are joined at interpreter exit)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._finished = queue.Queue()  # bounded by the slots
+        self._loop = asyncio.new_event_loop()
+        for part, target in (('loop', self._loop.run_forever), ('feed', self._feed), ('hand-over', self._hand_over)):
+            threading.Thread(target=target, name=f'{self.pipeline.name}-{self.name}-{part}', daemon=True).start()
+
+    def _feed(self):
+        while True:
+            self._slots.acquire()
+            entry = self.queue.get()
+            asyncio.run_coroutine_threadsafe(self._one(entry), self._loop)
+
+    async def _one(self, entry: _Entry):
+        try:
+            await self.fn(entry.item)
+        except Exception as e:
+            self._finished.put((entry, e))
+        else:
+            self._finished.put((entry, None))
+
+    def _hand_over(self):
+        # May block on a full next queue; the slot stays taken until then, which holds back _feed
+        while True:
+            entry, error = self._finished.get()
+            try:
+                if error is None:
+                    self.pipeline._advance(self, entry)
+                else:
+                    self.pipeline._fail(entry, error)
+            finally:
+                self._slots.release()
+
+
+class BatchStage(Stage):
+    def __init__(self, name: str, fn: Callable, workers: int = 1, batch: int = 1):
+        super().__init__(name, fn, workers)
+        self.batch = max(1, batch)
+
+    def _work(self):
+        while True:
+            entries = [self.queue.get()]
+            while len(entries) < self.batch:
+                try:
+                    entries.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.fn([entry.item for entry in entries])
+            except Exception as e:
+                if len(entries) == 1:
+                    self.pipeline._fail(entries[0], e)
+                    continue
+                logger.warning('%s batch of %d failed; retrying one at a time', self.name, len(entries))
+                for entry in entries:
+                    self.pipeline._run(self, entry, lambda entry=entry: self.fn([entry.item]))
+                continue
+            for entry in entries:
+                self.pipeline._advance(self, entry)
+
+
+class Pipeline:
+    def __init__(self, name: str, stages: List[Stage], queue_size: int, on_queue: Callable = None):
+        """`on_queue(stage, queue)` is called for each stage's queue once created (e.g. to export its depth)."""
+        self.name = name
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_queue = on_queue
+        self._lock = threading.Lock()
+        self._started = False
+
+    def submit(self, item) -> Future:
+        """Queue an item for the first stage (blocks while that queue is full)."""
+        self._start()
+        future = Future()
+        self.stages[0].queue.put(_Entry(item, future))
+        return future
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            for s in self.stages:
+                s.pipeline = self
+                s.queue = queue.Queue(maxsize=self.queue_size)
+                if self.on_queue:
+                    self.on_queue(s, s.queue)
+            for s in self.stages:
+                s.start()
+            self._started = True
+
+    def _run(self, stage: Stage, entry: _Entry, call: Callable):
+        try:
+            call()
+        except Exception as e:
+            self._fail(entry, e)
+        else:
+            self._advance(stage, entry)
+
+    def _advance(self, stage: Stage, entry: _Entry):
+        i = self.stages.index(stage)
+        if i + 1 < len(self.stages):
+            self.stages[i + 1].queue.put(entry)
+        else:
+            entry.future.set_result(entry.item)
+
+    def _fail(self, entry: _Entry, exc: Exception):
+        entry.future.set_exception(exc)
@@ -0,0 +1,71 @@
+import cProfile
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+
+# Sent by an allowed admin (PROFILING_ADMIN_SUBS) to profile one ask or upload
+PROFILE_HEADER = 'X-Docuchat-Profile'
+
+_lock = threading.Lock()
+_last_capture = float('-inf')
+
+
+class Capture:
+    """Filled in with the written .pstats path when the profiled block exits."""
+    path = None
+
+
+def requested_by(request) -> bool:
+    sub = getattr(request.user, 'oidc_sub', None)
+    return request.headers.get(PROFILE_HEADER) == '1' and sub in settings.PROFILING_ADMIN_SUBS
+
+
+def should_profile(requested: bool = False) -> bool:
+    """Explicit request or random sampling, subject to a per-process rate limit."""
+    global _last_capture
+    rate = settings.PROFILING_SAMPLE_RATE
+    if not requested and not (rate and random.random() < rate):
+        return False
+    with _lock:
+        now = time.monotonic()
+        if now - _last_capture < settings.PROFILING_MIN_INTERVAL:
+            return False
+        _last_capture = now
+    return True
+
+
+@contextmanager
+def profiled(kind: str, enabled: bool):
+    """cProfile the block (current thread only) and dump it to PROFILING_DIR."""
+    if not enabled:
+        yield None
+        return
+    capture = Capture()
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield capture
+    finally:
+        profile.disable()
+        capture.path = _dump(profile, kind)
+
+
+def _dump(profile: cProfile.Profile, kind: str) -> Path:
+    directory = Path(settings.PROFILING_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    # No owner or filename in the name: profiles may be shared for debugging
+    path = directory / f"{kind}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:6]}.pstats"
+    profile.dump_stats(path)
+    _prune(directory)
+    return path
+
+
+def _prune(directory: Path):
+    files = sorted(directory.glob('*.pstats'), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[settings.PROFILING_MAX_FILES:]:
+        old.unlink(missing_ok=True)
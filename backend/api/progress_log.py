@@ -0,0 +1,95 @@
+"""Replayable per-owner log of progress events.
+
+Every progress event is appended to a capped per-owner log before it is sent
+to the owner's WebSocket group, and carries its log id as `id`. With
+PROGRESS_LOG=redis the log is a Redis Stream (docuchat:progress:<owner>)
+trimmed to about PROGRESS_LOG_MAX entries and expiring PROGRESS_LOG_TTL
+seconds after its last event; 'local' keeps it in process memory for
+single-process setups; empty disables it. A socket opened with
+?last_id=<id> is sent what it missed before live events (see consumers).
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'docuchat:progress:'
+_ID = re.compile(r'^(\d+)-(\d+)$')
+_local: Dict[str, deque] = {}
+_local_lock = threading.Lock()
+_local_last = (0, 0)
+
+
+def parse_id(event_id) -> Optional[Tuple[int, int]]:
+    """(milliseconds, sequence) of a stream id like '1718000000000-0' ('0' is the start); None if malformed."""
+    if event_id == '0':
+        return 0, 0
+    m = _ID.match(event_id or '')
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
+@lru_cache(maxsize=None)
+def _redis():
+    import redis
+    return redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+
+def append(owner_sub: str, payload: dict) -> Optional[str]:
+    """Log an event; returns its id, or None when the log is disabled or unreachable."""
+    try:
+        if settings.PROGRESS_LOG == 'redis':
+            key = KEY_PREFIX + owner_sub
+            pipe = _redis().pipeline()
+            pipe.xadd(key, {'payload': json.dumps(payload)}, maxlen=settings.PROGRESS_LOG_MAX, approximate=True)
+            pipe.expire(key, settings.PROGRESS_LOG_TTL)
+            return pipe.execute()[0].decode()
+        if settings.PROGRESS_LOG == 'local':
+            return _append_local(owner_sub, payload)
+    except Exception as e:
+        # Live delivery still works; only replay of this event is lost
+        logger.warning('Could not log progress event for %s: %s', owner_sub, e)
+    return None
+
+
+def _append_local(owner_sub: str, payload: dict) -> str:
+    global _local_last
+    with _local_lock:
+        ms = int(time.time() * 1000)
+        _local_last = (ms, 0) if ms > _local_last[0] else (_local_last[0], _local_last[1] + 1)
+        event_id = '%d-%d' % _local_last
+        log = _local.get(owner_sub)
+        if log is None:
+            log = _local[owner_sub] = deque(maxlen=settings.PROGRESS_LOG_MAX)
+        log.append((_local_last, event_id, payload))
+    return event_id
+
+
+def since(owner_sub: str, last_id: str) -> Tuple[List[dict], bool]:
+    """Events logged after `last_id`, oldest first, each with its `id`.
+
+    The flag is False when events after `last_id` may have been trimmed or
+    expired, so the client should re-read state instead of trusting the replay.
+    """
+    after = parse_id(last_id)
+    if after is None or not settings.PROGRESS_LOG:
+        return [], False
+    if settings.PROGRESS_LOG == 'redis':
+        key = KEY_PREFIX + owner_sub
+        entries = _redis().xrange(key, min='%d-%d' % (after[0], after[1] + 1), max='+')
+        oldest = _redis().xrange(key, min='-', max='+', count=1)
+        events = [{**json.loads(fields[b'payload']), 'id': entry_id.decode()} for entry_id, fields in entries]
+        first = parse_id(oldest[0][0].decode()) if oldest else None
+    else:
+        with _local_lock:
+            log = list(_local.get(owner_sub, ()))
+        events = [{**payload, 'id': event_id} for key, event_id, payload in log if key > after]
+        first = log[0][0] if log else None
+    complete = after == (0, 0) or (first is not None and first <= after)
+    return events, complete
@@ -0,0 +1,84 @@
+"""Reduced-dimension representation of embeddings for candidate search.
+
+A projection maps unit-normalised embeddings to `dims` dimensions, either by
+truncation (Matryoshka-style models, where leading dimensions carry the most
+signal) or by a PCA basis fit offline on a sample of stored embeddings
+(manage.py fit_projection). rag scans the reduced vectors to shortlist
+candidates and re-scores the shortlist with the full vectors.
+"""
+import os
+import threading
+from typing import Optional
+from django.conf import settings
+
+
+class Projection:
+    def __init__(self, method: str, dims: int, mean=None, components=None):
+        self.method = method  # 'truncate' | 'pca'
+        self.dims = dims
+        self.mean = mean  # (D,) for pca
+        self.components = components  # (D, dims) for pca
+
+    def reduce(self, vectors):
+        """Project rows (or a single vector) and re-normalise them to unit length."""
+        import numpy as np
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == 'truncate':
+            reduced = vectors[..., :self.dims]
+        else:
+            reduced = (vectors - self.mean) @ self.components
+        reduced = np.ascontiguousarray(reduced, dtype=np.float32)
+        norms = np.linalg.norm(reduced, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return reduced / norms
+
+    def save(self, path: str):
+        import numpy as np
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            arrays = {'mean': self.mean, 'components': self.components} if self.method == 'pca' else {}
+            np.savez(f, method=np.array(self.method), dims=np.int64(self.dims), **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'Projection':
+        import numpy as np
+        with np.load(path, allow_pickle=False) as data:
+            method = str(data['method'])
+            if method == 'pca':
+                return cls(method, int(data['dims']), data['mean'].astype(np.float32),
+                           data['components'].astype(np.float32))
+            return cls(method, int(data['dims']))
+
+
+def fit_pca(sample, dims: int) -> Projection:
+    """PCA basis of unit-normalised sample rows (n, D)."""
+    import numpy as np
+    sample = np.asarray(sample, dtype=np.float64)
+    sample = sample / np.maximum(np.linalg.norm(sample, axis=1, keepdims=True), 1e-12)
+    mean = sample.mean(axis=0)
+    centred = sample - mean
+    # Eigen-decomposition of the (D, D) covariance is cheaper than an SVD of the sample
+    eigvals, eigvecs = np.linalg.eigh(centred.T @ centred)
+    top = np.argsort(eigvals)[::-1][:dims]
+    return Projection('pca', dims, mean.astype(np.float32), eigvecs[:, top].astype(np.float32))
+
+
+_lock = threading.Lock()
+_cached = (None, None)  # ((path, mtime), Projection)
+
+
+def get_projection() -> Optional[Projection]:
+    """The configured projection (RETRIEVAL_PROJECTION), reloaded when the file changes."""
+    global _cached
+    path = settings.RETRIEVAL_PROJECTION
+    if not path:
+        return None
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    with _lock:
+        if _cached[0] != key:
+            _cached = (key, Projection.load(path))
+        return _cached[1]
@@ -1,20 +1,323 @@
-import numpy as np
-from typing import List, Tuple
+from typing import Iterable, List, Optional, Tuple
 from django.conf import settings
+from .invalidation import current_version
+from .metrics import INDEX_LOADS, stage
 from .models import Chunk
+from .projection import get_projection
+from .residency import ResidencyManager
 
+# NumPy is imported inside functions: processes that never search (migrate,
+# management commands, indexing-only workers) don't pay for it.
 
-def _cosine(a: np.ndarray, b: np.ndarray) -> float:
-    denom = (np.linalg.norm(a) * np.linalg.norm(b))
-    return float(np.dot(a, b) / denom) if denom else 0.0
 
+def _id_array(ids):
+    import numpy as np
+    return np.fromiter(ids, dtype=np.int64)
 
-def search(owner_sub: str, query_embedding: List[float], top_k: int) -> List[Tuple[Chunk, float]]:
-    q = np.array(query_embedding, dtype=float)
+
+class OwnerIndex:
+    """One owner's chunk embeddings as a row-normalised float32 matrix.
+
+    Only canonical chunks have rows. Near-duplicates are listed separately
+    (chunk id, document id, id of the canonical chunk they duplicate), so a
+    filter on their documents can still reach the canonical rows.
+    """
+
+    def __init__(self, chunk_ids, doc_ids, matrix, version: int, snapshot_version=None,
+                 projection=None, reduced=None, duplicates=None):
+        import numpy as np
+        self.chunk_ids = chunk_ids
+        self.doc_ids = doc_ids
+        self.matrix = matrix
+        empty = np.zeros(0, dtype=np.int64)
+        self.dup_chunk_ids, self.dup_doc_ids, self.dup_of = duplicates or (empty, empty, empty)
+        # OwnerIndexVersion.version this index reflects (at least)
+        self.version = version
+        # Version last written to disk by the residency manager
+        self.snapshot_version = snapshot_version
+        # Reduced-dimension rows for candidate search (api.projection), if any
+        self.projection = projection
+        self.reduced = reduced
+        self._runs = None
+
+    def rows_for_chunks(self, chunk_ids):
+        """Row positions of the given chunks that are still in the index."""
+        import numpy as np
+        return np.flatnonzero(np.isin(self.chunk_ids, _id_array(chunk_ids)))
+
+    def rows_for(self, document_ids):
+        """Row positions of the given documents' chunks, in index order.
+
+        Each document's rows are contiguous (see _rows and apply_change), so the
+        index is described by runs of (start, document id); a filter selects
+        whole runs without touching the matrix.
+        """
+        import numpy as np
+        if self._runs is None:
+            boundary = np.ones(len(self.doc_ids), dtype=bool)
+            boundary[1:] = self.doc_ids[1:] != self.doc_ids[:-1]
+            starts = np.flatnonzero(boundary)
+            self._runs = (starts, np.append(starts[1:], len(self.doc_ids)), self.doc_ids[starts])
+        starts, stops, docs = self._runs
+        picked = np.isin(docs, _id_array(document_ids))
+        if not picked.any():
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(a, b) for a, b in zip(starts[picked], stops[picked])])
+
+    def filtered_rows(self, document_ids=None, chunk_ids=None):
+        """Row positions passing the document and/or chunk filters, in index order, plus aliases.
+
+        A near-duplicate chunk that passes the filters selects its canonical
+        row. When that row passes only through the duplicate, aliases maps
+        the canonical chunk id to the duplicate's, so callers can report the
+        chunk that was actually asked for.
+        """
+        import numpy as np
+        rows = None
+        picked = np.ones(len(self.dup_chunk_ids), dtype=bool)
+        if document_ids is not None:
+            document_ids = _id_array(document_ids)
+            rows = self.rows_for(document_ids)
+            picked &= np.isin(self.dup_doc_ids, document_ids)
+        if chunk_ids is not None:
+            chunk_ids = _id_array(chunk_ids)
+            chunk_rows = self.rows_for_chunks(chunk_ids)
+            rows = chunk_rows if rows is None else np.intersect1d(rows, chunk_rows)
+            picked &= np.isin(self.dup_chunk_ids, chunk_ids)
+        if not picked.any():
+            return rows, {}
+        indirect = np.setdiff1d(self.rows_for_chunks(self.dup_of[picked]), rows)
+        reached = set(self.chunk_ids[indirect].tolist())
+        aliases = {canonical: dup for dup, canonical in zip(self.dup_chunk_ids[picked].tolist(),
+                                                             self.dup_of[picked].tolist()) if canonical in reached}
+        return np.union1d(rows, indirect), aliases
+
+    @property
+    def nbytes(self) -> int:
+        reduced = self.reduced.nbytes if self.reduced is not None else 0
+        duplicates = self.dup_chunk_ids.nbytes + self.dup_doc_ids.nbytes + self.dup_of.nbytes
+        return self.chunk_ids.nbytes + self.doc_ids.nbytes + self.matrix.nbytes + reduced + duplicates
+
+
+residency = ResidencyManager(settings.RETRIEVAL_MEMORY_BUDGET_MB * 1024 * 1024, settings.RETRIEVAL_SNAPSHOT_DIR)
+
+
+def _rows(owner_sub: str, document_ids=None):
+    # Near-duplicates share their canonical chunk's embedding; leaving them out
+    # shrinks the index and keeps copies from crowding the top-k
+    qs = Chunk.objects.filter(owner_sub=owner_sub, duplicate_of__isnull=True)
+    if document_ids is not None:
+        qs = qs.filter(document_id__in=document_ids)
+    # Grouped by document so OwnerIndex.rows_for can select row ranges
+    return list(qs.order_by('document_id', 'id').values_list('id', 'document_id', 'embedding'))
+
+
+def _duplicates(owner_sub: str, document_ids=None):
+    """(chunk ids, document ids, canonical chunk ids) of the owner's near-duplicate chunks."""
+    import numpy as np
+    qs = Chunk.objects.filter(owner_sub=owner_sub, duplicate_of__isnull=False)
+    if document_ids is not None:
+        qs = qs.filter(document_id__in=document_ids)
+    rows = np.array(list(qs.values_list('id', 'document_id', 'duplicate_of_id')), dtype=np.int64).reshape(-1, 3)
+    return rows[:, 0].copy(), rows[:, 1].copy(), rows[:, 2].copy()
+
+
+def _arrays(rows):
+    import numpy as np
+    chunk_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    doc_ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+    matrix = np.array([r[2] for r in rows], dtype=np.float32) if rows else np.zeros((0, 0), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return chunk_ids, doc_ids, matrix
+
+
+def _build(chunk_ids, doc_ids, matrix, version: int, snapshot_version=None, duplicates=None) -> OwnerIndex:
+    projection = get_projection()
+    usable = (projection is not None and len(chunk_ids) >= settings.RETRIEVAL_PROJECTION_MIN_ROWS
+              and projection.dims < matrix.shape[1]
+              and (projection.components is None or projection.components.shape[0] == matrix.shape[1]))
+    if not usable:
+        return OwnerIndex(chunk_ids, doc_ids, matrix, version, snapshot_version, duplicates=duplicates)
+    return OwnerIndex(chunk_ids, doc_ids, matrix, version, snapshot_version, projection, projection.reduce(matrix),
+                      duplicates)
+
+
+def _load(owner_sub: str, version: int) -> OwnerIndex:
+    # Version is read before the rows, so the rows are at least that new
+    with stage('snapshot_load'):
+        arrays = residency.load_snapshot(owner_sub, version)
+    if arrays is not None:
+        INDEX_LOADS.labels(source='snapshot').inc()
+        return _build(arrays['chunk_ids'], arrays['doc_ids'], arrays['matrix'], version, version,
+                      (arrays['dup_chunk_ids'], arrays['dup_doc_ids'], arrays['dup_of']))
+    with stage('index_load'):
+        index = _build(*_arrays(_rows(owner_sub)), version, duplicates=_duplicates(owner_sub))
+    INDEX_LOADS.labels(source='db').inc()
+    return index
+
+
+def get_index(owner_sub: str) -> OwnerIndex:
+    """The owner's resident index, loaded when missing or when their version has moved on."""
+    version = current_version(owner_sub)
+    index = residency.get(owner_sub)
+    if index is not None and index.version >= version:
+        return index
+    index = _load(owner_sub, version)
+    residency.put(owner_sub, index)
+    return index
+
+
+def warm(owner_sub: str):
+    get_index(owner_sub)
+
+
+def apply_change(owner_sub: str, version: int, added: Iterable[int] = (), removed: Iterable[int] = ()):
+    """Bring a cached index to `version` by patching the changed documents' rows, or drop it."""
+    import numpy as np
+    index = residency.peek(owner_sub)
+    if index is None or index.version >= version:
+        return
+    if index.version != version - 1:
+        # Missed an update: reload on next search
+        residency.discard(owner_sub, index)
+        return
+    added = list(added)
+    # Rows of removed and re-added documents are dropped; re-added ones are read back, so a
+    # load that already saw them doesn't duplicate, and duplicates promoted by a delete appear
+    changed = added + list(removed)
+    keep = ~np.isin(index.doc_ids, changed)
+    chunk_ids, doc_ids, new_rows = _arrays(_rows(owner_sub, added)) if added else _arrays([])
+    keep_dups = ~np.isin(index.dup_doc_ids, changed)
+    new_dups = _duplicates(owner_sub, added) if added else (np.zeros(0, dtype=np.int64),) * 3
+    matrix, reduced = new_rows, None
+    if index.matrix.size and new_rows.size:
+        matrix = np.vstack([index.matrix[keep], new_rows])
+    elif index.matrix.size:
+        matrix = index.matrix[keep]
+    if index.reduced is not None:
+        # Only the new rows are projected
+        reduced = index.reduced[keep]
+        if new_rows.size:
+            reduced = np.vstack([reduced, index.projection.reduce(new_rows)])
+    patched = OwnerIndex(np.concatenate([index.chunk_ids[keep], chunk_ids]),
+                         np.concatenate([index.doc_ids[keep], doc_ids]), matrix, version,
+                         projection=index.projection, reduced=reduced,
+                         duplicates=tuple(np.concatenate([old[keep_dups], new]) for old, new in
+                                          zip((index.dup_chunk_ids, index.dup_doc_ids, index.dup_of), new_dups)))
+    residency.replace(owner_sub, index, patched)
+
+
+# Queries are scored in blocks so a block's (queries x rows) score matrix stays around 32 MB
+SCORE_BLOCK_ELEMENTS = 1 << 23
+
+
+def top_rows_many(index: OwnerIndex, query_embeddings, top_k: int, rows=None):
+    """Per query, (row positions, scores) of the index's best k rows, best first.
+
+    Queries are scored together with one matrix-matrix product per block.
+    `rows` restricts scoring to those row positions (a pre-filter). With a
+    reduced-dimension projection, each query's shortlist of
+    top_k * RETRIEVAL_RERANK_FACTOR rows is re-scored with the full vectors.
+    """
+    import numpy as np
+    queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    queries = queries / norms
+    matrix = index.matrix if rows is None else index.matrix[rows]
+    k = min(top_k, len(matrix))
+    if k <= 0:
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        return [empty] * len(queries)
+    n = top_k * settings.RETRIEVAL_RERANK_FACTOR
+    reduced = None
+    if index.reduced is not None and n < len(matrix):
+        reduced = index.reduced if rows is None else index.reduced[rows]
+    block = max(1, SCORE_BLOCK_ELEMENTS // len(matrix))
     results = []
-    for ch in Chunk.objects.filter(owner_sub=owner_sub).select_related('document'):
-        e = np.array(ch.embedding, dtype=float)
-        sim = _cosine(q, e)
-        results.append((ch, sim))
-    results.sort(key=lambda x: x[1], reverse=True)
-    return results[:top_k]
+    for start in range(0, len(queries), block):
+        qs = queries[start:start + block]
+        cand = None
+        if reduced is not None:
+            cand = np.argpartition(-(index.projection.reduce(qs) @ reduced.T), n - 1, axis=1)[:, :n]
+            scores = np.einsum('qnd,qd->qn', matrix[cand], qs)
+        else:
+            scores = qs @ matrix.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        if cand is not None:
+            top = np.take_along_axis(cand, top, axis=1)
+        if rows is not None:
+            top = rows[top]
+        results.extend(zip(top, top_scores))
+    return results
+
+
+def top_rows(index: OwnerIndex, query_embedding, top_k: int, rows=None):
+    """(row positions, scores) of the index's best k rows for one query, best first."""
+    return top_rows_many(index, [query_embedding], top_k, rows)[0]
+
+
+def mmr(vectors, relevance, k: int, lam: float):
+    """Positions of k of the unit-normalised candidate `vectors`, chosen by maximal marginal relevance.
+
+    Each pick maximises lam * relevance - (1 - lam) * (highest similarity to
+    an earlier pick). The candidate-candidate similarities are one matrix
+    product; each pick is a vectorised update, so k picks cost O(k * pool).
+    """
+    import numpy as np
+    k = min(k, len(relevance))
+    similarity = vectors @ vectors.T
+    closest = np.full(len(relevance), -np.inf, dtype=np.float32)
+    picked = np.zeros(len(relevance), dtype=bool)
+    order = np.empty(k, dtype=np.int64)
+    for j in range(k):
+        gain = lam * relevance - (1.0 - lam) * closest if j else relevance.copy()
+        gain[picked] = -np.inf
+        best = int(np.argmax(gain))
+        order[j] = best
+        picked[best] = True
+        np.maximum(closest, similarity[best], out=closest)
+    return order
+
+
+def search_many(owner_sub: str, query_embeddings: List[List[float]], top_k: int,
+                document_ids: Optional[Iterable[int]] = None, mmr_lambda: float = 1.0,
+                mmr_pool: int = 0, chunk_ids: Optional[Iterable[int]] = None) -> List[List[Tuple[Chunk, float]]]:
+    """The owner's top_k chunks for each query, optionally only among `document_ids` and/or `chunk_ids`.
+
+    With mmr_lambda below 1, the top_k are picked for diversity from the best
+    `mmr_pool` candidates (see mmr) and come back in pick order.
+    """
+    if not query_embeddings:
+        return []
+    index = get_index(owner_sub)
+    if top_k <= 0 or not len(index.chunk_ids):
+        return [[] for _ in query_embeddings]
+    rows, aliases = None, {}
+    if document_ids is not None or chunk_ids is not None:
+        rows, aliases = index.filtered_rows(document_ids, chunk_ids)
+    diversify = mmr_lambda < 1.0 and mmr_pool > top_k
+    ranked = top_rows_many(index, query_embeddings, mmr_pool if diversify else top_k, rows)
+    if diversify:
+        picks = [mmr(index.matrix[r], s, top_k, mmr_lambda) for r, s in ranked]
+        ranked = [(r[p], s[p]) for (r, s), p in zip(ranked, picks)]
+    # A canonical row reached only through a filtered near-duplicate is reported as that duplicate
+    hits = [([aliases.get(i, i) for i in index.chunk_ids[r].tolist()], s.tolist()) for r, s in ranked]
+    # One fetch for every query's top-k rows; chunk text stays compressed until a caller reads it
+    chunks = (Chunk.objects.filter(owner_sub=owner_sub).select_related('document')
+              .defer('embedding', 'document__text').in_bulk({i for ids, _ in hits for i in ids}))
+    # A chunk deleted since the index was loaded is simply skipped
+    return [[(chunks[i], s) for i, s in zip(ids, scores) if i in chunks] for ids, scores in hits]
+
+
+def search(owner_sub: str, query_embedding: List[float], top_k: int,
+           document_ids: Optional[Iterable[int]] = None, mmr_lambda: float = 1.0,
+           mmr_pool: int = 0, chunk_ids: Optional[Iterable[int]] = None) -> List[Tuple[Chunk, float]]:
+    """The owner's top_k chunks for the query; see search_many."""
+    return search_many(owner_sub, [query_embedding], top_k, document_ids, mmr_lambda, mmr_pool, chunk_ids)[0]
@@ -0,0 +1,54 @@
+"""Recovery of documents left mid-operation by a process that died.
+
+Indexing and deletion run in background threads, so a crash or restart
+leaves their documents 'indexing' or 'deleting' with nothing left to
+change them: such rows could never be deleted, and deleting ones were
+hidden for good. At start-up (backend.asgi), rows in either status for
+longer than STALE_DOCUMENT_SECONDS are taken over. Indexing ones are
+marked failed, since the upload died with the process; the user can
+delete or upload them again. Deletions are resumed.
+"""
+import logging
+import threading
+from collections import defaultdict
+from django.db import connections, transaction
+from django.utils import timezone
+from . import deletion
+from .models import Document
+
+logger = logging.getLogger(__name__)
+
+
+def recover() -> dict:
+    """Fail stale indexing documents and resume stale deletions; returns counts."""
+    cutoff, now = deletion.stale_before(), timezone.now()
+    failed = (Document.objects.filter(status=Document.STATUS_INDEXING, status_changed_at__lt=cutoff)
+              .update(status=Document.STATUS_FAILED, status_changed_at=now))
+    with transaction.atomic():
+        # Claimed by refreshing status_changed_at, so processes starting together don't both resume one
+        rows = list(Document.objects.select_for_update(skip_locked=True)
+                    .filter(status=Document.STATUS_DELETING, status_changed_at__lt=cutoff)
+                    .order_by('id').values_list('owner_sub', 'id'))
+        Document.objects.filter(id__in=[pk for _, pk in rows]).update(status_changed_at=now)
+    owners = defaultdict(list)
+    for owner_sub, pk in rows:
+        owners[owner_sub].append(pk)
+    for owner_sub, ids in owners.items():
+        deletion.submit(owner_sub, ids)
+    if failed or rows:
+        logger.warning('Recovered stale documents: %d indexing marked failed, %d deletions resumed', failed, len(rows))
+    return {'failed': failed, 'resumed': len(rows)}
+
+
+def _run():
+    try:
+        recover()
+    except Exception:
+        logger.exception('Recovering stale documents failed')
+    finally:
+        connections.close_all()
+
+
+def start():
+    """Recover in a background thread (called from backend.asgi)."""
+    threading.Thread(target=_run, name='recovery', daemon=True).start()
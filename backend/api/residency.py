@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from .metrics import RESIDENCY_EVICTIONS, RESIDENT_BYTES, RESIDENT_OWNERS
+
+logger = logging.getLogger(__name__)
+
+
+class ResidencyManager:
+    """Per-owner retrieval indexes kept in memory, least recently queried evicted first.
+
+    Indexes are anything with `nbytes`, `version`, `snapshot_version` and the
+    arrays named in SNAPSHOT_ARRAYS. The total of `nbytes` is kept under
+    `budget_bytes`, except that the most recently used index always stays.
+    Evicted indexes are written to `snapshot_dir` (if set) so the next load
+    can skip the database.
+    """
+    SNAPSHOT_ARRAYS = ('chunk_ids', 'doc_ids', 'matrix', 'dup_chunk_ids', 'dup_doc_ids', 'dup_of')
+
+    def __init__(self, budget_bytes: int, snapshot_dir: str = ''):
+        self.budget_bytes = budget_bytes
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        self._bytes = 0
+
+    def get(self, owner_sub: str):
+        with self._lock:
+            index = self._indexes.get(owner_sub)
+            if index is not None:
+                self._indexes.move_to_end(owner_sub)
+            return index
+
+    def peek(self, owner_sub: str):
+        """Like get(), without counting as a query."""
+        with self._lock:
+            return self._indexes.get(owner_sub)
+
+    def put(self, owner_sub: str, index):
+        with self._lock:
+            self._remove(owner_sub)
+            self._indexes[owner_sub] = index
+            self._bytes += index.nbytes
+            evicted = self._evict_over_budget()
+        self._after_evicting(evicted)
+
+    def replace(self, owner_sub: str, old, new) -> bool:
+        """Swap in `new` only if `old` is still resident (it may have been evicted or reloaded)."""
+        with self._lock:
+            if self._indexes.get(owner_sub) is not old:
+                return False
+            self._indexes[owner_sub] = new
+            self._bytes += new.nbytes - old.nbytes
+            evicted = self._evict_over_budget()
+        self._after_evicting(evicted)
+        return True
+
+    def discard(self, owner_sub: str, old=None):
+        with self._lock:
+            if old is None or self._indexes.get(owner_sub) is old:
+                self._remove(owner_sub)
+                self._update_gauges()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'owners': len(self._indexes), 'bytes': self._bytes, 'budget_bytes': self.budget_bytes}
+
+    def _remove(self, owner_sub: str):
+        old = self._indexes.pop(owner_sub, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+
+    def _evict_over_budget(self):
+        evicted = []
+        while self._bytes > self.budget_bytes and len(self._indexes) > 1:
+            owner_sub, index = self._indexes.popitem(last=False)
+            self._bytes -= index.nbytes
+            evicted.append((owner_sub, index))
+        self._update_gauges()
+        return evicted
+
+    def _update_gauges(self):
+        RESIDENT_OWNERS.set(len(self._indexes))
+        RESIDENT_BYTES.set(self._bytes)
+
+    def _after_evicting(self, evicted):
+        # Outside the lock: snapshot writes are disk I/O
+        if evicted:
+            RESIDENCY_EVICTIONS.inc(len(evicted))
+        for owner_sub, index in evicted:
+            if index.snapshot_version != index.version:
+                self.save_snapshot(owner_sub, index)
+
+    # --- on-disk snapshots ---
+
+    def _snapshot_path(self, owner_sub: str) -> Path:
+        # Hashed so owner subjects never appear in file names
+        return self.snapshot_dir / f"{hashlib.sha256(owner_sub.encode('utf-8')).hexdigest()[:32]}.npz"
+
+    def save_snapshot(self, owner_sub: str, index):
+        if self.snapshot_dir is None:
+            return
+        import numpy as np
+        path = self._snapshot_path(owner_sub)
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                np.savez(f, version=np.int64(index.version),
+                         **{name: getattr(index, name) for name in self.SNAPSHOT_ARRAYS})
+            os.replace(tmp, path)
+            index.snapshot_version = index.version
+        except OSError as e:
+            logger.warning('Could not write index snapshot %s: %s', path.name, e)
+            tmp.unlink(missing_ok=True)
+
+    def load_snapshot(self, owner_sub: str, version: int) -> Optional[dict]:
+        """The snapshot's arrays if it is exactly at `version`, else None."""
+        if self.snapshot_dir is None:
+            return None
+        import numpy as np
+        path = self._snapshot_path(owner_sub)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != version:
+                    return None
+                return {name: data[name] for name in self.SNAPSHOT_ARRAYS}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning('Ignoring unreadable index snapshot %s: %s', path.name, e)
+            return None
@@ -0,0 +1,188 @@
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    __slots__ = ('owner', 'name', 'size', 'args', 'seq')
+
+    def __init__(self, owner: str, name: str, size: int, args: tuple, seq: int):
+        self.owner = owner
+        self.name = name
+        self.size = size
+        self.args = args
+        self.seq = seq
+
+    def __lt__(self, other):
+        # Smallest first within an owner's queue, then FIFO
+        return (self.size, self.seq) < (other.size, other.seq)
+
+
+class FairScheduler:
+    """Worker pool that shares capacity fairly between owners.
+
+    Each owner has its own queue (smallest job first). Owners take turns by
+    deficit round-robin on job size in bytes, so an owner with many large
+    files cannot starve owners with small ones. Per-owner caps on concurrent
+    jobs and in-flight bytes keep one owner from occupying every worker; a
+    job larger than the byte cap still runs when it is the owner's only one.
+
+    `notify(owner, name, position)` is called by a worker (outside the lock)
+    when a queued job's estimated position has changed noticeably since it was
+    last reported. Positions are recomputed as jobs start, at most once every
+    `notify_interval` seconds, so a long queue doesn't flood the owner.
+    """
+
+    def __init__(self, workers: int, run: Callable, notify: Callable, quantum: int,
+                 owner_concurrency: int, owner_inflight_bytes: int, notify_interval: float = 0.0):
+        self.workers = workers
+        self.run = run
+        self.notify = notify
+        self.notify_interval = notify_interval
+        self.quantum = quantum
+        self.owner_concurrency = owner_concurrency
+        self.owner_inflight_bytes = owner_inflight_bytes
+        self._cond = threading.Condition()
+        self._queues: Dict[str, List[Job]] = {}
+        self._ring = deque()  # owners with queued jobs, in turn order
+        self._deficit = defaultdict(int)
+        self._running = defaultdict(int)
+        self._running_bytes = defaultdict(int)
+        self._queued_bytes = defaultdict(int)
+        self._positions: Dict[Tuple[str, int], int] = {}  # last position reported per queued job
+        self._last_notify = float('-inf')
+        self._seq = itertools.count()
+        self._threads = []
+
+    # --- public ---
+
+    def submit(self, owner: str, name: str, size: int, *args):
+        with self._cond:
+            job = Job(owner, name, size, args, next(self._seq))
+            if owner not in self._queues:
+                self._queues[owner] = []
+                self._ring.append(owner)
+            heapq.heappush(self._queues[owner], job)
+            self._queued_bytes[owner] += size
+            self._start_workers()
+            self._cond.notify()
+
+    def admits(self, owner: str, files: int, size: int, max_files: int, max_bytes: int) -> bool:
+        """Whether `owner` may queue `files` more jobs totalling `size` bytes."""
+        with self._cond:
+            queued = len(self._queues.get(owner, ()))
+            return queued + files <= max_files and self._queued_bytes.get(owner, 0) + size <= max_bytes
+
+    def queued(self) -> int:
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queues and not self._running, timeout)
+
+    # --- scheduling (called with the lock held) ---
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work, name=f'indexing-{len(self._threads)}', daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _may_start(self, owner: str) -> bool:
+        if self._running.get(owner, 0) >= self.owner_concurrency:
+            return False
+        running_bytes = self._running_bytes.get(owner, 0)
+        return not running_bytes or running_bytes + self._queues[owner][0].size <= self.owner_inflight_bytes
+
+    def _next(self):
+        eligible = [o for o in self._ring if self._may_start(o)]
+        if not eligible:
+            return None
+        for _ in range(2):
+            for _ in range(len(self._ring)):
+                owner = self._ring[0]
+                self._ring.rotate(-1)
+                if owner in eligible and self._queues[owner][0].size <= self._deficit[owner]:
+                    return self._pop(owner)
+            # Nobody's head job fits yet: grant whole rounds of quantum at once
+            rounds = min(math.ceil((self._queues[o][0].size - self._deficit[o]) / self.quantum) for o in eligible)
+            for o in eligible:
+                self._deficit[o] += max(rounds, 1) * self.quantum
+        return None
+
+    def _pop(self, owner: str) -> Job:
+        queue = self._queues[owner]
+        job = heapq.heappop(queue)
+        self._deficit[owner] -= job.size
+        self._queued_bytes[owner] -= job.size
+        if not queue:
+            del self._queues[owner]
+            self._ring.remove(owner)
+            self._deficit.pop(owner, None)  # an idle owner doesn't bank credit
+            self._queued_bytes.pop(owner, None)
+        self._positions.pop((owner, job.seq), None)
+        self._running[owner] += 1
+        self._running_bytes[owner] += job.size
+        return job
+
+    def _position_updates(self):
+        """Estimated 1-based start position of queued jobs, where it changed noticeably.
+
+        Owners take turns, so the i-th job in an owner's queue waits for its own
+        i predecessors plus up to i+1 jobs from each other owner. A job is
+        reported when first seen, then when its position moves by a quarter of
+        the last reported one, which is every step over the last few places.
+        """
+        now = time.monotonic()
+        if now - self._last_notify < self.notify_interval:
+            return []
+        self._last_notify = now
+        lengths = {o: len(q) for o, q in self._queues.items()}
+        updates = []
+        for owner, queue in self._queues.items():
+            for i, job in enumerate(sorted(queue)):
+                position = 1 + i + sum(min(n, i + 1) for o, n in lengths.items() if o != owner)
+                reported = self._positions.get((owner, job.seq))
+                if reported is None or abs(position - reported) >= max(1, reported // 4):
+                    self._positions[(owner, job.seq)] = position
+                    updates.append((owner, job.name, position))
+        return updates
+
+    # --- workers ---
+
+    def _send(self, updates):
+        for owner, name, position in updates:
+            try:
+                self.notify(owner, name, position)
+            except Exception:
+                logger.exception('Queue position update failed')
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next()
+                updates = self._position_updates()
+            self._send(updates)
+            try:
+                self.run(job.owner, job.name, *job.args)
+            except Exception:
+                logger.exception('Job %s failed', job.name)
+            finally:
+                with self._cond:
+                    self._running[job.owner] -= 1
+                    self._running_bytes[job.owner] -= job.size
+                    if not self._running[job.owner]:
+                        del self._running[job.owner]
+                        del self._running_bytes[job.owner]
+                    self._cond.notify_all()
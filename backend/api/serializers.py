@@ -1,12 +1,48 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Document, Chunk
 
 class DocumentSerializer(serializers.ModelSerializer):
+    # Annotated by the listing queryset (see DocumentsView)
+    num_chunks = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Document
-        fields = ['id', 'filename', 'content_type', 'created_at']
+        fields = ['id', 'filename', 'content_type', 'created_at', 'status', 'num_chunks']
+
+class DocumentFilterSerializer(serializers.Serializer):
+    # Filters on the owner's documents; all given filters must match
+    document_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filename = serializers.CharField(required=False, help_text='Case-insensitive glob, e.g. "Q*_report*.pdf"')
+    content_type = serializers.CharField(required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    FILTER_FIELDS = ('document_ids', 'filename', 'content_type', 'created_after', 'created_before')
 
-class AskSerializer(serializers.Serializer):
+    def validate(self, data):
+        if 'created_after' in data and 'created_before' in data and data['created_after'] > data['created_before']:
+            raise serializers.ValidationError('created_after must not be later than created_before')
+        return data
+
+class AskFiltersSerializer(DocumentFilterSerializer):
+    top_k = serializers.IntegerField(required=False)
+    # Diversity re-ranking (rag.mmr); defaults are MMR_LAMBDA / MMR_POOL
+    mmr_lambda = serializers.FloatField(required=False, min_value=0.0, max_value=1.0)
+    mmr_pool = serializers.IntegerField(required=False, min_value=1, max_value=settings.MMR_MAX_POOL)
+
+class AskSerializer(AskFiltersSerializer):
     session_id = serializers.IntegerField(required=False)
+    new_session = serializers.BooleanField(required=False, default=False)
     question = serializers.CharField()
-    top_k = serializers.IntegerField(required=False)
+
+class BatchAskSerializer(AskFiltersSerializer):
+    questions = serializers.ListField(child=serializers.CharField(), allow_empty=False,
+                                      max_length=settings.ASK_BATCH_MAX_QUESTIONS)
+
+class DeleteDocumentsSerializer(DocumentFilterSerializer):
+    def validate(self, data):
+        data = super().validate(data)
+        if not any(f in data for f in self.FILTER_FIELDS):
+            raise serializers.ValidationError('Give document_ids or at least one filter')
+        return data
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from . import dedup, invalidation
+from .models import Chunk, Document
+
+
+@receiver(pre_delete, sender=Document)
+def _document_deleting(sender, instance, **kwargs):
+    # Near-duplicates in other documents become canonical (SET_NULL); embedded now, stored after the delete
+    instance._promoted = dedup.promotions(instance.owner_sub, Chunk.objects.filter(document=instance).values('id'),
+                                          exclude_documents=[instance.pk])
+
+
+@receiver(post_delete, sender=Document)
+def _document_deleted(sender, instance, **kwargs):
+    promoted = getattr(instance, '_promoted', [])
+    if promoted:
+        # A queryset delete may have removed the duplicates' documents too
+        kept = set(Chunk.objects.filter(pk__in=[c.pk for c in promoted]).values_list('pk', flat=True))
+        promoted = [c for c in promoted if c.pk in kept]
+        dedup.promote(promoted)  # still inside the deleting transaction
+    # Chunks go with the document (CASCADE); evict them from every worker's index
+    invalidation.publish(instance.owner_sub, added=sorted({c.document_id for c in promoted}), removed=[instance.pk])
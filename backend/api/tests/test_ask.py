@@ -0,0 +1,147 @@
+import json
+import pytest
+from asgiref.sync import async_to_sync
+from rest_framework.test import APIClient
+from api import chat, indexing, rag
+from api.embeddings import get_embedder
+from api.models import ChatMessage, ChatSession, Chunk
+from api.views import BatchAskView
+
+OWNER = 'ask-test'
+QUESTIONS = ['What is the refund policy?', 'How is shipping charged?', 'When are invoices due?']
+DOCUMENTS = {
+    'refunds.txt': ' '.join(f'Refunds are paid within {i} days of a return.' for i in range(300)),
+    'shipping.txt': ' '.join(f'Shipping costs {i} euros per parcel.' for i in range(300)),
+}
+
+
+@pytest.fixture
+def api(settings):
+    settings.OIDC_VERIFY = 'mock'
+    for filename, text in DOCUMENTS.items():
+        indexing.index_file(OWNER, filename, text.encode(), 'text/plain')
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer mock:{OWNER}')
+    yield client
+    rag.residency.discard(OWNER)
+
+
+def _batch(api, body):
+    response = api.post('/api/chat/ask/batch', body, format='json')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/x-ndjson'
+
+    async def lines():
+        return [line async for line in response.streaming_content]
+    return [json.loads(line) for line in b''.join(async_to_sync(lines)()).decode().splitlines()]
+
+
+@pytest.mark.django_db
+def test_batch_answers_every_question_like_single_asks(api):
+    lines = _batch(api, {'questions': QUESTIONS, 'top_k': 2})
+    assert sorted(line['index'] for line in lines) == [0, 1, 2]
+    for line in lines:
+        single = api.post('/api/chat/ask', {'question': QUESTIONS[line['index']], 'top_k': 2}, format='json').json()
+        assert line['question'] == QUESTIONS[line['index']]
+        assert line['answer'] == single['answer']
+        assert line['citations'] == single['citations']
+
+
+@pytest.mark.django_db
+def test_failed_llm_call_fails_only_its_line(api, monkeypatch):
+    def llm(prompt):
+        if 'invoices' in prompt:
+            raise RuntimeError('LLM down')
+        return 'ok'
+    monkeypatch.setattr(BatchAskView, '_llm', staticmethod(llm))
+
+    lines = {line['index']: line for line in _batch(api, {'questions': QUESTIONS})}
+    assert lines[2] == {'index': 2, 'question': QUESTIONS[2], 'error': 'LLM call failed'}
+    assert lines[0]['answer'] == lines[1]['answer'] == 'ok'
+
+
+@pytest.mark.django_db
+def test_batch_respects_document_filter(api):
+    documents = {d['filename']: d['id'] for d in api.get('/api/documents').json()['results']}
+    lines = _batch(api, {'questions': QUESTIONS, 'document_ids': [documents['shipping.txt']]})
+    assert {c['filename'] for line in lines for c in line['citations']} == {'shipping.txt'}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('questions', [[], ['q'] * 1000])
+def test_batch_size_is_validated(api, questions):
+    assert api.post('/api/chat/ask/batch', {'questions': questions}, format='json').status_code == 400
+
+
+def _session_ask(api, question, **body):
+    response = api.post('/api/chat/ask', {'question': question, **body}, format='json')
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.django_db
+def test_session_keeps_the_conversation(api):
+    first = _session_ask(api, QUESTIONS[0], new_session=True)
+    session = ChatSession.objects.get(pk=first['session_id'], owner_sub=OWNER)
+    second = _session_ask(api, QUESTIONS[1], session_id=session.pk)
+    assert second['session_id'] == session.pk
+    assert list(ChatMessage.objects.filter(session=session).order_by('created_at', 'id')
+                .values_list('role', 'content')) == [
+        ('user', QUESTIONS[0]), ('assistant', first['answer']), ('user', QUESTIONS[1]), ('assistant', second['answer'])]
+
+
+@pytest.mark.django_db
+def test_session_of_another_owner_is_404(api):
+    session = ChatSession.objects.create(owner_sub='someone-else')
+    assert api.post('/api/chat/ask', {'question': 'q', 'session_id': session.pk}, format='json').status_code == 404
+
+
+@pytest.mark.django_db
+def test_history_keeps_the_latest_messages_within_the_budget(settings):
+    settings.CHAT_HISTORY_TOKENS = 30
+    session = ChatSession.objects.create(owner_sub=OWNER)
+    for i in range(5):
+        chat.record(session, f'question {i} ' + 'x' * 20, f'answer {i} ' + 'y' * 20)
+    # Each message is estimated at 8 tokens, so three fit, newest kept
+    assert [content[:10] for _, content in chat.history(session)] == ['answer 3 y', 'question 4', 'answer 4 y']
+
+
+def _retrieved(session, query, top_k=3, **kwargs):
+    """Retrieve for a session ask, then reload what the session cached."""
+    results, reused = chat.retrieve(session, OWNER, query, top_k, **kwargs)
+    session.refresh_from_db()
+    return [chunk.pk for chunk, _ in results], reused
+
+
+@pytest.mark.django_db
+def test_follow_up_reuses_the_cached_candidates(api):
+    session = ChatSession.objects.create(owner_sub=OWNER)
+    query = get_embedder().embed([QUESTIONS[0]])[0]
+
+    first, reused = _retrieved(session, query)
+    assert not reused
+    assert session.retrieval_chunks[:3] == first
+
+    again, reused = _retrieved(session, query)
+    assert reused
+    assert again == first
+
+
+@pytest.mark.django_db
+def test_unrelated_filtered_or_stale_asks_scan_again(api):
+    session = ChatSession.objects.create(owner_sub=OWNER)
+    query = get_embedder().embed([QUESTIONS[0]])[0]
+    _retrieved(session, query)
+    cached = session.retrieval_chunks
+
+    assert not _retrieved(session, [-x for x in query])[1]  # unrelated: scans and replaces the cache
+    assert session.retrieval_chunks != cached
+
+    _retrieved(session, query)
+    cached = session.retrieval_chunks
+    document_id = Chunk.objects.get(pk=cached[-1]).document_id
+    assert not _retrieved(session, query, document_ids=[document_id])[1]
+    assert session.retrieval_chunks == cached  # filtered asks leave the cache alone
+
+    indexing.index_file(OWNER, 'invoices.txt', b'Invoices are due in 30 days. ' * 50, 'text/plain')
+    assert not _retrieved(session, query)[1]  # the owner's chunks changed
@@ -0,0 +1,89 @@
+import random
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from api import compression
+from api.compression import compress_text, decompress_text
+from api.models import Chunk, Document
+
+TEXTS = ['', 'plain ascii', 'ünïcödé – 文字 – emoji 🙂', 'repeated words ' * 500]
+
+
+def _corpus(seed: int, n: int = 400):
+    rng = random.Random(seed)
+    vocabulary = [f'term{i}' for i in range(300)]
+    return [f'Section {i}: ' + ' '.join(rng.choices(vocabulary, k=40)) for i in range(n)]
+
+
+def _dictionary(tmp_path, name: str, seed: int) -> str:
+    pytest.importorskip('zstandard')
+    path = tmp_path / name
+    path.write_bytes(compression.train_dictionary(_corpus(seed), 4096))
+    return str(path)
+
+
+@pytest.mark.parametrize('codec', ['none', 'zlib', 'zstd'])
+@pytest.mark.parametrize('text', TEXTS)
+def test_round_trip(codec, text, settings):
+    if codec == 'zstd':
+        pytest.importorskip('zstandard')
+    settings.TEXT_COMPRESSION_DICT = ''
+    assert decompress_text(compress_text(text, codec)) == text
+
+
+def test_blobs_of_every_codec_stay_readable_after_switching(settings):
+    blobs = [compress_text('first', 'zlib'), compress_text('second', 'none')]
+    settings.TEXT_COMPRESSION = 'none'
+    assert [decompress_text(b) for b in blobs] == ['first', 'second']
+    assert compress_text('x')[0] == compression.RAW
+
+
+def test_unknown_codec_tag_is_rejected():
+    with pytest.raises(ValueError):
+        decompress_text(bytes([99]) + b'data')
+
+
+def test_dictionary_blobs_carry_the_dictionary_id(tmp_path, settings):
+    settings.TEXT_COMPRESSION_DICT = _dictionary(tmp_path, 'a.zdict', 1)
+    blob = compress_text(_corpus(1)[0], 'zstd')
+    assert blob[0] == compression.ZSTD_DICT
+    expected = compression.dictionary_id((tmp_path / 'a.zdict').read_bytes())
+    assert int.from_bytes(blob[1:5], 'little') == expected
+
+
+def test_old_dictionaries_stay_readable_after_retraining(tmp_path, settings):
+    old, new = _dictionary(tmp_path, 'old.zdict', 1), _dictionary(tmp_path, 'new.zdict', 2)
+    text = _corpus(3)[0]
+    settings.TEXT_COMPRESSION_DICT = old
+    written_before = [compress_text(text, 'zstd'), compress_text(text, 'zlib')]
+
+    settings.TEXT_COMPRESSION_DICT = new
+    settings.TEXT_COMPRESSION_DICTS = [old]
+    written_after = compress_text(text, 'zstd')
+    assert written_after[1:5] != written_before[0][1:5]
+    assert [decompress_text(b) for b in written_before + [written_after]] == [text] * 3
+
+    settings.TEXT_COMPRESSION_DICTS = []
+    with pytest.raises(ImproperlyConfigured):
+        decompress_text(written_before[0])
+
+
+def test_rows_from_before_dictionary_ids_are_found_by_frame_id(tmp_path, settings):
+    zstandard = pytest.importorskip('zstandard')
+    path = _dictionary(tmp_path, 'a.zdict', 1)
+    text = _corpus(1)[5]
+    dictionary = zstandard.ZstdCompressionDict((tmp_path / 'a.zdict').read_bytes())
+    legacy = bytes([compression.ZSTD]) + zstandard.ZstdCompressor(dict_data=dictionary).compress(text.encode())
+    settings.TEXT_COMPRESSION_DICT = ''
+    settings.TEXT_COMPRESSION_DICTS = [path]
+    assert decompress_text(legacy) == text
+
+
+@pytest.mark.django_db
+def test_field_reads_rows_written_with_different_codecs(settings):
+    doc = Document.objects.create(owner_sub='compression-test', filename='a.txt', content_type='text/plain',
+                                  text='document text')
+    for i, codec in enumerate(['zlib', 'none', 'zlib']):
+        settings.TEXT_COMPRESSION = codec
+        Chunk.objects.create(document=doc, owner_sub='compression-test', idx=i, text=f'chunk {i}', embedding=[0.0])
+    assert [c.text for c in Chunk.objects.filter(document=doc).order_by('idx')] == ['chunk 0', 'chunk 1', 'chunk 2']
+    assert Document.objects.get(pk=doc.pk).text == 'document text'
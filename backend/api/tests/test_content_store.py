@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from api import indexing
+from api.models import Chunk, Document, ExtractedContent
+
+TEXT = ' '.join(f'Clause {i}: the supplier delivers goods within {i % 30} days.' for i in range(500))
+
+
+@pytest.fixture
+def events(monkeypatch):
+    sent = []
+    monkeypatch.setattr(indexing, '_send_progress', lambda sub, payload, durable=True: sent.append(payload))
+    return sent
+
+
+def _index(owner_sub, filename='contract.txt'):
+    indexing.index_file(owner_sub, filename, TEXT.encode(), 'text/plain')
+    return Document.objects.get(owner_sub=owner_sub, filename=filename)
+
+
+def _embeddings(doc):
+    return np.array(list(Chunk.objects.filter(document=doc).order_by('idx').values_list('embedding', flat=True)))
+
+
+class _Refuse:
+    def __init__(self, what):
+        self.what = what
+
+    def __call__(self, *args, **kwargs):
+        raise AssertionError(f'{self.what} should have been reused')
+
+    def embed(self, texts):
+        self(texts)
+
+
+@pytest.mark.django_db
+def test_same_file_reuses_text_and_embeddings(events, monkeypatch):
+    first = _index('store-a')
+    assert events[-1]['reused'] is None
+    assert ExtractedContent.objects.count() == 1
+
+    monkeypatch.setattr(indexing, '_extract_text', _Refuse('extraction'))
+    monkeypatch.setattr(indexing, 'get_embedder', lambda: _Refuse('embedding'))
+    second = _index('store-b')
+
+    assert events[-1]['stage'] == 'done' and events[-1]['reused'] == 'embeddings'
+    assert second.text == first.text and second.content_hash == first.content_hash
+    # Own rows for the second owner, with the stored vectors (float32 round trip)
+    assert Chunk.objects.filter(document=second).count() == Chunk.objects.filter(document=first).count()
+    np.testing.assert_allclose(_embeddings(second), _embeddings(first), rtol=1e-6)
+    assert ExtractedContent.objects.count() == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('setting, value', [('MAX_CHUNK_TOKENS', 300), ('EMBEDDING_MODEL', 'another-model')])
+def test_changed_chunking_or_model_reuses_only_the_text(events, monkeypatch, settings, setting, value):
+    _index('store-a')
+    setattr(settings, setting, value)
+    monkeypatch.setattr(indexing, '_extract_text', _Refuse('extraction'))
+    second = _index('store-b')
+
+    assert events[-1]['reused'] == 'text'
+    assert Chunk.objects.filter(document=second).exists()
+    # Refreshed for the new settings, so the next copy reuses embeddings again
+    _index('store-c')
+    assert events[-1]['reused'] == 'embeddings'
+
+
+@pytest.mark.django_db
+def test_disabled_store_is_neither_read_nor_written(events, settings):
+    settings.CONTENT_STORE = False
+    _index('store-a')
+    _index('store-b')
+    assert [e['reused'] for e in events if e['stage'] == 'done'] == [None, None]
+    assert not ExtractedContent.objects.exists()
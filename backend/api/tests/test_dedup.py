@@ -0,0 +1,140 @@
+import random
+import pytest
+from api import dedup, indexing
+from api.models import Chunk, ChunkBand, Document
+
+_rng = random.Random(1)
+WORDS = [f'w{_rng.randrange(5000)}' for _ in range(300)]
+TEXT = ' '.join(WORDS)
+
+
+def _edited(n: int) -> str:
+    """TEXT with n words replaced, spread out (each changes up to 3 shingles)."""
+    words = list(WORDS)
+    for i in range(n):
+        words[i * (len(words) // n) + 5] = f'changed{i}'
+    return ' '.join(words)
+
+
+def _jaccard(a: str, b: str) -> float:
+    def shingles(text):
+        words = text.lower().split()
+        return {' '.join(words[i:i + dedup.SHINGLE_WORDS]) for i in range(len(words) - dedup.SHINGLE_WORDS + 1)}
+    sa, sb = shingles(a), shingles(b)
+    return len(sa & sb) / len(sa | sb)
+
+
+def test_signature_is_stable_and_case_insensitive():
+    sig = dedup.signature(TEXT)
+    assert len(sig) == dedup.NUM_PERM * 4
+    assert dedup.signature(TEXT.upper()) == sig
+    assert dedup.similarity(sig, dedup.signature(TEXT)) == 1.0
+
+
+@pytest.mark.parametrize('edits', [1, 3, 10, 30])
+def test_similarity_estimates_shingle_jaccard(edits):
+    other = _edited(edits)
+    estimate = dedup.similarity(dedup.signature(TEXT), dedup.signature(other))
+    assert abs(estimate - _jaccard(TEXT, other)) < 0.1
+
+
+def test_band_keys_collide_only_for_similar_texts():
+    keys = set(dedup.band_keys(dedup.signature(TEXT)))
+    assert len(keys) == dedup.BANDS
+    assert keys & set(dedup.band_keys(dedup.signature(_edited(3))))
+    unrelated = ' '.join(f'x{i}' for i in range(300))
+    assert not keys & set(dedup.band_keys(dedup.signature(unrelated)))
+
+
+@pytest.fixture
+def canonical():
+    doc = Document.objects.create(owner_sub='dedup-test', filename='a.txt', content_type='text/plain', text=TEXT)
+    chunk = Chunk.objects.create(document=doc, owner_sub='dedup-test', idx=0, text=TEXT, embedding=[1.0, 0.0],
+                                 minhash=dedup.signature(TEXT))
+    ChunkBand.objects.bulk_create(dedup.bands_for([chunk]))
+    return chunk
+
+
+@pytest.mark.django_db
+def test_find_duplicates_applies_threshold(canonical, settings):
+    settings.DEDUP_THRESHOLD = 0.9
+    near, far = dedup.signature(_edited(3)), dedup.signature(_edited(10))  # estimated 0.98 and 0.86
+    assert dedup.find_duplicates('dedup-test', [near, far]) == [(canonical.pk, [1.0, 0.0]), None]
+
+    settings.DEDUP_THRESHOLD = 0.8
+    assert dedup.find_duplicates('dedup-test', [far]) == [(canonical.pk, [1.0, 0.0])]
+
+
+@pytest.mark.django_db
+def test_find_duplicates_stays_within_the_owner(canonical):
+    assert dedup.find_duplicates('someone-else', [dedup.signature(TEXT)]) == [None]
+
+
+@pytest.mark.django_db
+def test_near_duplicates_get_no_bands(canonical):
+    copy = Chunk(document=canonical.document, owner_sub='dedup-test', idx=1, text=TEXT, embedding=[1.0, 0.0],
+                 minhash=dedup.signature(TEXT), duplicate_of=canonical)
+    copy.save()
+    assert dedup.bands_for([copy]) == []
+
+
+def test_find_repeats_points_at_the_first_canonical_copy(settings):
+    settings.DEDUP_THRESHOLD = 0.9
+    unrelated = ' '.join(f'x{i}' for i in range(300))
+    sig, near, other = dedup.signature(TEXT), dedup.signature(_edited(3)), dedup.signature(unrelated)
+    signatures = [other, sig, near, None, sig, sig]
+    # The fifth is skipped (a duplicate of a stored chunk), so it is neither matched nor matched against
+    assert dedup.find_repeats(signatures, skip=[None, None, None, None, (7, []), None]) == [
+        None, None, 1, None, None, 1]
+
+
+def _chunked(owner_sub, filename, text):
+    job = indexing._Job(owner_sub, filename, text.encode(), 'text/plain')
+    indexing._extract(job)
+    indexing._chunk(job)
+    indexing._embed(job)
+    return job
+
+
+@pytest.fixture
+def small_chunks(settings):
+    settings.MAX_CHUNK_TOKENS, settings.CHUNK_OVERLAP_TOKENS = 100, 0
+    settings.CONTENT_STORE = False
+
+
+def _rows(job):
+    return list(Chunk.objects.filter(document=job.doc).order_by('idx').values_list('id', 'duplicate_of_id'))
+
+
+@pytest.mark.django_db
+def test_repeats_within_a_document_are_duplicates(small_chunks, monkeypatch):
+    embedded = []
+    embedder = indexing.get_embedder()
+    monkeypatch.setattr(indexing, 'get_embedder', lambda: embedder)
+    monkeypatch.setattr(embedder, 'embed', lambda texts: embedded.extend(texts) or [[1.0, 0.0]] * len(texts))
+    part = ' '.join(WORDS[:100])
+    job = _chunked('dedup-test', 'a.txt', ' '.join([part, ' '.join(WORDS[100:200]), part]))
+    assert len(embedded) == 2  # the repeated part is embedded once
+
+    indexing._persist([job])
+    (first, _), (second, _), (third, dup_of) = _rows(job)
+    assert dup_of == first
+    assert not ChunkBand.objects.filter(chunk_id=third).exists()
+    assert job.deduplicated == 1
+
+
+@pytest.mark.django_db
+def test_repeats_across_a_persist_batch_are_duplicates(small_chunks):
+    # Both were chunked before either was stored, so neither saw the other
+    a, b = _chunked('dedup-test', 'a.txt', TEXT), _chunked('dedup-test', 'b.txt', TEXT)
+    other = _chunked('someone-else', 'c.txt', TEXT)
+    assert not any(b.duplicates)
+    indexing._persist([a, b, other])
+
+    canonical = [pk for pk, _ in _rows(a)]
+    assert [dup_of for _, dup_of in _rows(b)] == canonical
+    assert (a.deduplicated, b.deduplicated, other.deduplicated) == (0, 3, 0)
+    assert not any(dup_of for _, dup_of in _rows(other))  # owners are never mixed
+    b_chunks = Chunk.objects.filter(document=b.doc).order_by('idx')
+    assert [c.embedding for c in b_chunks] == [c.embedding for c in Chunk.objects.filter(pk__in=canonical)
+                                               .order_by('idx')]
@@ -0,0 +1,67 @@
+import random
+import pytest
+from api import deletion, indexing, rag
+from api.embeddings import get_embedder
+from api.models import Chunk, ChunkBand, Document
+
+OWNER = 'deletion-test'
+_rng = random.Random(2)
+WORDS = [f'w{_rng.randrange(5000)}' for _ in range(300)]
+
+
+def _text(edits=()):
+    words = list(WORDS)
+    for i in edits:
+        words[i] = f'changed{i}'
+    return ' '.join(words)
+
+
+@pytest.fixture
+def indexed(settings):
+    """a.txt, and b.txt whose every chunk is a near-duplicate of one in a.txt."""
+    settings.MAX_CHUNK_TOKENS, settings.CHUNK_OVERLAP_TOKENS = 100, 0
+    settings.CONTENT_STORE = False
+    docs = {}
+    for name, text in (('a.txt', _text()), ('b.txt', _text(edits=(50, 150, 250)))):
+        indexing.index_file(OWNER, name, text.encode(), 'text/plain')
+        docs[name] = Document.objects.get(owner_sub=OWNER, filename=name)
+    assert not Chunk.objects.filter(document=docs['b.txt'], duplicate_of__isnull=True).exists()
+    yield docs
+    rag.residency.discard(OWNER)
+
+
+def _assert_promoted(doc):
+    chunks = list(Chunk.objects.filter(document=doc).order_by('idx'))
+    assert all(c.duplicate_of_id is None for c in chunks)
+    # Their own embeddings, not those of the deleted chunks they duplicated
+    assert [c.embedding for c in chunks] == get_embedder().embed([c.text for c in chunks])
+    for c in chunks:
+        assert ChunkBand.objects.filter(owner_sub=OWNER, chunk_id=c.pk).count() == 8
+    # Searchable and matched as duplicates again
+    indexing.index_file(OWNER, 'b-again.txt', _text(edits=(50, 150, 250)).encode(), 'text/plain')
+    again = Chunk.objects.filter(owner_sub=OWNER, document__filename='b-again.txt').order_by('idx')
+    assert [c.duplicate_of_id for c in again] == [c.pk for c in chunks]
+
+
+@pytest.mark.django_db
+def test_bulk_delete_promotes_duplicates_with_bands_and_embeddings(indexed):
+    assert deletion.delete_documents(OWNER, [indexed['a.txt'].pk]) == {'documents': 1, 'chunks': 3}
+    _assert_promoted(indexed['b.txt'])
+
+
+@pytest.mark.django_db
+def test_orm_delete_promotes_duplicates_with_bands_and_embeddings(indexed):
+    indexed['a.txt'].delete()
+    _assert_promoted(indexed['b.txt'])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('bulk', [True, False])
+def test_deleting_duplicates_with_their_canonicals_leaves_no_bands(indexed, bulk):
+    ids = [doc.pk for doc in indexed.values()]
+    if bulk:
+        deletion.delete_documents(OWNER, ids)
+    else:
+        Document.objects.filter(pk__in=ids).delete()
+    assert not Chunk.objects.filter(owner_sub=OWNER).exists()
+    assert not ChunkBand.objects.filter(owner_sub=OWNER).exists()
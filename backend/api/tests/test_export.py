@@ -0,0 +1,133 @@
+import io
+import hashlib
+import json
+import zipfile
+import numpy as np
+import pytest
+from rest_framework.test import APIClient
+from api import export, indexing, rag
+from api.models import Chunk, ChunkBand, Document
+
+SOURCE, TARGET = 'export-source', 'export-target'
+TEXT = ' '.join(f'Section {i} covers warranty claims and returns.' for i in range(300))
+
+
+@pytest.fixture
+def exported(settings):
+    """An export of two documents, the second a copy whose chunks are all near-duplicates."""
+    settings.OIDC_VERIFY = 'mock'
+    indexing.index_file(SOURCE, 'terms.txt', TEXT.encode(), 'text/plain')
+    indexing.index_file(SOURCE, 'terms-copy.txt', TEXT.encode(), 'text/plain')
+    buffer = io.BytesIO()
+    export.export_owner(SOURCE, buffer)
+    yield buffer.getvalue()
+    rag.residency.discard(TARGET)
+
+
+def _chunks(owner_sub):
+    chunks = Chunk.objects.filter(owner_sub=owner_sub).select_related('document', 'duplicate_of')
+    # Embeddings are exported as float32
+    return sorted((c.document.filename, c.idx, c.text, np.float32(c.embedding).tolist(), bytes(c.minhash or b''),
+                   (c.duplicate_of.document.filename, c.duplicate_of.idx) if c.duplicate_of else None)
+                  for c in chunks)
+
+
+def _tampered(data: bytes, **members) -> bytes:
+    """The export with members replaced (and their manifest checksums updated, so only consistency checks fail)."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as src, zipfile.ZipFile(buffer, 'w') as out:
+        manifest = json.loads(src.read(export.MANIFEST))
+        for name, content in members.items():
+            manifest['sha256'][name] = hashlib.sha256(content).hexdigest()
+        for name in src.namelist():
+            if name != export.MANIFEST:
+                out.writestr(name, members.get(name, src.read(name)))
+        out.writestr(export.MANIFEST, json.dumps(manifest))
+    return buffer.getvalue()
+
+
+def _array(data: bytes, name: str):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return np.load(io.BytesIO(zf.read(name)))
+
+
+@pytest.mark.django_db
+def test_round_trip_restores_documents_chunks_and_duplicates(exported):
+    result = export.import_owner(io.BytesIO(exported), TARGET)
+    chunks = Chunk.objects.filter(owner_sub=SOURCE).count()
+    assert result == {'owner_sub': TARGET, 'documents': 2, 'chunks': chunks, 'duplicates': chunks // 2}
+
+    def documents(owner_sub):
+        return sorted((d.filename, d.status, d.text, d.created_at)
+                      for d in Document.objects.filter(owner_sub=owner_sub))
+    assert documents(TARGET) == documents(SOURCE)
+    assert _chunks(TARGET) == _chunks(SOURCE)
+    assert ChunkBand.objects.filter(owner_sub=TARGET).count() == ChunkBand.objects.filter(owner_sub=SOURCE).count()
+    # The copy's chunks are duplicates of the imported chunks, not of the source owner's
+    assert not Chunk.objects.filter(owner_sub=TARGET, duplicate_of__owner_sub=SOURCE).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('status', [Document.STATUS_INDEXING, Document.STATUS_DELETING])
+def test_documents_exported_mid_operation_import_as_failed(settings, status):
+    indexing.index_file(SOURCE, 'terms.txt', TEXT.encode(), 'text/plain')
+    Document.objects.filter(owner_sub=SOURCE).update(status=status)
+    buffer = io.BytesIO()
+    export.export_owner(SOURCE, buffer)
+    buffer.seek(0)
+    export.import_owner(buffer, TARGET)
+    assert list(Document.objects.filter(owner_sub=TARGET).values_list('status', flat=True)) == [
+        Document.STATUS_FAILED]
+
+
+def _lines(data: bytes):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return [json.loads(line) for line in zf.read('documents.jsonl').splitlines()]
+
+
+def _jsonl(rows) -> bytes:
+    return b''.join(json.dumps(row).encode() + b'\n' for row in rows)
+
+
+INCONSISTENT = {
+    'unknown document': lambda data: {'chunk_documents.npy': export._npy(
+        _array(data, 'chunk_documents.npy') + 1000)},
+    'short array': lambda data: {'chunk_idx.npy': export._npy(_array(data, 'chunk_idx.npy')[:-1])},
+    'offsets past texts.bin': lambda data: {'text_offsets.npy': export._npy(
+        _array(data, 'text_offsets.npy') + 1)},
+    'decreasing offsets': lambda data: {'text_offsets.npy': export._npy(
+        _array(data, 'text_offsets.npy')[::-1].copy())},
+    'repeated chunk id': lambda data: {'chunk_ids.npy': export._npy(
+        np.zeros_like(_array(data, 'chunk_ids.npy')))},
+    'embeddings shape': lambda data: {'embeddings.npy': export._npy(np.zeros((1, 3), dtype='<f4'))},
+    'unknown status': lambda data: {'documents.jsonl': _jsonl(
+        [{**row, 'status': 'archived'} for row in _lines(data)])},
+    'bad created_at': lambda data: {'documents.jsonl': _jsonl(
+        [{**row, 'created_at': 'yesterday'} for row in _lines(data)])},
+    'missing field': lambda data: {'documents.jsonl': _jsonl(
+        [{k: v for k, v in row.items() if k != 'filename'} for row in _lines(data)])},
+    'repeated document': lambda data: {'documents.jsonl': _jsonl(
+        [{**row, 'id': 1} for row in _lines(data)])},
+    'texts not UTF-8': lambda data: {'texts.bin': b'\xff' * len(zipfile.ZipFile(io.BytesIO(data)).read('texts.bin'))},
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('case', INCONSISTENT)
+def test_inconsistent_export_is_rejected_without_writing(exported, case):
+    damaged = _tampered(exported, **INCONSISTENT[case](exported))
+    with pytest.raises(ValueError):
+        export.import_owner(io.BytesIO(damaged), TARGET)
+    assert not Document.objects.filter(owner_sub=TARGET).exists()
+    assert not Chunk.objects.filter(owner_sub=TARGET).exists()
+
+
+@pytest.mark.django_db
+def test_import_view_answers_400_for_an_inconsistent_export(exported):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer mock:{TARGET}')
+    damaged = io.BytesIO(_tampered(exported, **INCONSISTENT['unknown document'](exported)))
+    damaged.name = 'export.zip'
+    response = client.post('/api/import', {'file': damaged}, format='multipart')
+    assert response.status_code == 400
+    assert 'chunk_documents' in response.json()['detail']
@@ -0,0 +1,55 @@
+import io
+import zipfile
+from api.indexing import DOCX_CONTENT_TYPE, _extract_text, _iter_docx_blocks
+
+NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def _p(*runs):
+    return '<w:p>' + ''.join(f'<w:r><w:t>{text}</w:t></w:r>' for text in runs) + '</w:p>'
+
+
+def _table(*rows):
+    return '<w:tbl>' + ''.join('<w:tr>' + ''.join(f'<w:tc>{cell}</w:tc>' for cell in row) + '</w:tr>'
+                               for row in rows) + '</w:tbl>'
+
+
+def _docx(body: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', f'<w:document xmlns:w="{NS}"><w:body>{body}</w:body></w:document>')
+    return buffer.getvalue()
+
+
+def test_paragraphs_and_table_rows_in_reading_order():
+    content = _docx(
+        _p('Quarterly ', 'report')
+        + _table([_p('Region'), _p('Revenue')], [_p('North'), _p('12')])
+        + _p('Closing remarks')
+    )
+    assert list(_iter_docx_blocks(content)) == ['Quarterly report', 'Region | Revenue', 'North | 12',
+                                               'Closing remarks']
+
+
+def test_cell_paragraphs_tabs_and_breaks():
+    content = _docx(
+        '<w:p><w:r><w:t>a</w:t><w:tab/><w:t>b</w:t><w:br/><w:t>c</w:t></w:r></w:p>'
+        + _table([_p('first line') + _p('second line'), '<w:p/>', _p('last')])
+    )
+    assert list(_iter_docx_blocks(content)) == ['a\tb\nc', 'first line second line | last']
+
+
+def test_empty_paragraphs_are_skipped():
+    assert list(_iter_docx_blocks(_docx(_p('one') + '<w:p/>' + _p('  ') + _p('two')))) == ['one', 'two']
+
+
+def test_nested_table_lands_in_its_cell():
+    inner = _table([_p('x'), _p('y')])
+    content = _docx(_table([_p('outer') + inner, _p('next')]))
+    assert list(_iter_docx_blocks(content)) == ['outer x | y | next']
+
+
+def test_docx_blocks_are_separated_by_blank_lines():
+    content = _docx(_p('Title') + _table([_p('k'), _p('v')]))
+    assert _extract_text('notes.bin', content, DOCX_CONTENT_TYPE) == 'Title\n\nk | v'
+    assert _extract_text('notes.docx', content, 'application/octet-stream') == 'Title\n\nk | v'
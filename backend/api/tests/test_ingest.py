@@ -0,0 +1,76 @@
+import json
+import pytest
+from django.db import connection
+from api import dedup, ingest
+from api.compression import decompress_text
+from api.models import Chunk, ChunkBand, Document
+
+OWNER = 'ingest-test'
+postgres_only = pytest.mark.skipif(connection.vendor != 'postgresql', reason='COPY needs PostgreSQL')
+
+
+def _chunks(doc, texts, duplicate_of=None):
+    return [Chunk(document=doc, owner_sub=OWNER, idx=i, text=text, embedding=[i / 2, -1.0, 1e-7],
+                  minhash=dedup.signature(text), duplicate_of_id=duplicate_of)
+            for i, text in enumerate(texts)]
+
+
+@pytest.fixture
+def doc():
+    return Document.objects.create(owner_sub=OWNER, filename='a.txt', content_type='text/plain', text='x')
+
+
+def _stored(doc):
+    return [(c.idx, c.text, c.embedding) for c in Chunk.objects.filter(document=doc).order_by('idx')]
+
+
+@pytest.mark.django_db
+def test_copy_row_matches_the_columns(doc):
+    chunk = _chunks(doc, ['naïve café, tab\there'])[0]
+    row = ingest._copy_row(chunk)
+    assert len(row) == len(ingest.COLUMNS)
+    document_id, owner_sub, idx, text, embedding, minhash, duplicate_of = row
+    assert (document_id, owner_sub, idx, duplicate_of) == (doc.pk, OWNER, 0, None)
+    assert decompress_text(text) == 'naïve café, tab\there'  # stored compressed, like the ORM writes it
+    assert embedding == '[0.0,-1.0,1e-07]' and json.loads(embedding) == chunk.embedding
+    assert minhash == bytes(chunk.minhash)
+
+
+@pytest.mark.django_db
+def test_copy_falls_back_to_bulk_create_off_postgres(doc, settings):
+    settings.CHUNK_INGEST = 'copy'
+    assert ingest.copy_supported() == (connection.vendor == 'postgresql')
+    settings.CHUNK_INGEST = 'orm'
+    assert not ingest.copy_supported()
+
+
+def _write_and_check(doc):
+    texts = [f'chunk {i} of the ingest test document with some words' for i in range(5)]
+    objs = ingest.write_chunks(_chunks(doc, texts))
+    assert [obj.pk for obj in objs] == list(Chunk.objects.filter(document=doc).order_by('idx')
+                                           .values_list('pk', flat=True))
+    assert _stored(doc) == [(i, text, [i / 2, -1.0, 1e-7]) for i, text in enumerate(texts)]
+    assert ChunkBand.objects.filter(chunk_id__in=[obj.pk for obj in objs]).count() == len(dedup.bands_for(objs))
+
+
+@pytest.mark.django_db
+def test_orm_ingest_sets_ids_and_writes_bands(doc, settings):
+    settings.CHUNK_INGEST = 'orm'
+    _write_and_check(doc)
+
+
+@postgres_only
+@pytest.mark.django_db
+def test_copy_ingest_sets_ids_and_writes_bands(doc, settings):
+    settings.CHUNK_INGEST = 'copy'
+    _write_and_check(doc)
+
+
+@postgres_only
+@pytest.mark.django_db
+def test_copy_ingest_writes_a_batch_of_documents(doc, settings):
+    settings.CHUNK_INGEST = 'copy'
+    other = Document.objects.create(owner_sub=OWNER, filename='b.txt', content_type='text/plain', text='y')
+    objs = ingest.write_chunks(_chunks(doc, ['one', 'two']) + _chunks(other, ['three']))
+    assert {(obj.document_id, obj.idx): obj.pk for obj in objs} == {
+        (c.document_id, c.idx): c.pk for c in Chunk.objects.filter(document__in=[doc, other])}
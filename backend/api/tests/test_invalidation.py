@@ -0,0 +1,96 @@
+import json
+import pytest
+from django.db import transaction
+from api import invalidation, rag
+from api.models import Chunk, Document
+
+OWNER = 'invalidation-test'
+
+
+@pytest.fixture(autouse=True)
+def no_resident_index():
+    rag.residency.discard(OWNER)
+    yield
+    rag.residency.discard(OWNER)
+
+
+def _document(embedding=(1.0, 0.0)):
+    doc = Document.objects.create(owner_sub=OWNER, filename='a.txt', content_type='text/plain', text='x')
+    Chunk.objects.create(document=doc, owner_sub=OWNER, idx=0, text='x', embedding=list(embedding))
+    return doc
+
+
+def _documents_in_index():
+    return set(rag.get_index(OWNER).doc_ids.tolist())
+
+
+@pytest.mark.django_db
+def test_bump_counts_up_per_owner():
+    assert invalidation.current_version(OWNER) == 0
+    assert [invalidation.bump(OWNER) for _ in range(3)] == [1, 2, 3]
+    assert invalidation.current_version(OWNER) == 3
+    assert invalidation.current_version('someone-else') == 0
+
+
+@pytest.mark.django_db
+def test_resident_index_is_patched_once_the_change_commits(django_capture_on_commit_callbacks):
+    first = _document()
+    assert _documents_in_index() == {first.pk}
+    resident = rag.residency.peek(OWNER)
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        second = _document((0.0, 1.0))
+        version = invalidation.publish(OWNER, added=[second.pk])
+        assert rag.residency.peek(OWNER).version == resident.version  # nothing applied before commit
+    assert len(callbacks) == 1
+
+    patched = rag.residency.peek(OWNER)
+    assert patched is not resident and patched.version == version
+    assert set(patched.doc_ids.tolist()) == {first.pk, second.pk}
+
+
+@pytest.mark.django_db
+def test_a_missed_message_costs_a_reload():
+    first = _document()
+    assert _documents_in_index() == {first.pk}
+
+    second = _document()
+    invalidation.bump(OWNER)  # another worker's change whose message never arrived
+    assert _documents_in_index() == {first.pk, second.pk}
+    assert rag.residency.peek(OWNER).version == invalidation.current_version(OWNER)
+
+
+@pytest.mark.django_db
+def test_a_gap_in_versions_drops_the_index():
+    _document()
+    index = rag.get_index(OWNER)
+    rag.apply_change(OWNER, index.version + 2, added=[])
+    assert rag.residency.peek(OWNER) is None
+
+
+@pytest.mark.django_db
+def test_stale_and_own_messages_are_ignored():
+    doc = _document()
+    index = rag.get_index(OWNER)
+    rag.apply_change(OWNER, index.version, removed=[doc.pk])
+    assert rag.residency.peek(OWNER) is index
+
+    own = {'owner': OWNER, 'version': index.version + 1, 'added': [], 'removed': [doc.pk],
+           'origin': invalidation._ORIGIN}
+    invalidation._handle(json.dumps(own).encode())
+    assert rag.residency.peek(OWNER) is index
+
+    invalidation._handle(json.dumps({**own, 'origin': 'another-worker'}).encode())
+    assert rag.residency.peek(OWNER).version == index.version + 1
+    assert not len(rag.residency.peek(OWNER).doc_ids)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rolled_back_change_neither_bumps_nor_broadcasts():
+    _document()
+    index = rag.get_index(OWNER)
+    with pytest.raises(RuntimeError), transaction.atomic():
+        invalidation.publish(OWNER, added=[_document().pk])
+        raise RuntimeError('indexing failed')
+    assert invalidation.current_version(OWNER) == index.version
+    assert rag.residency.peek(OWNER) is index
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from rest_framework.test import APIClient
+from api.models import Document
+
+OWNER = 'pagination-test'
+T0 = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def api(settings):
+    settings.OIDC_VERIFY = 'mock'
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer mock:{OWNER}')
+    return client
+
+
+def _documents(created_at):
+    """One document per timestamp; returns their ids newest first (ties: highest id first)."""
+    docs = [Document.objects.create(owner_sub=OWNER, filename=f'{i}.txt', content_type='text/plain', text='x')
+            for i in range(len(created_at))]
+    for doc, ts in zip(docs, created_at):
+        Document.objects.filter(pk=doc.pk).update(created_at=ts)  # created_at is auto_now_add
+    return [pk for _, pk in sorted(zip(created_at, (doc.pk for doc in docs)), reverse=True)]
+
+
+def _walk(api, page_size):
+    ids, pages, cursor = [], 0, None
+    while True:
+        params = {'page_size': page_size, **({'cursor': cursor} if cursor else {})}
+        body = api.get('/api/documents', params).json()
+        ids += [d['id'] for d in body['results']]
+        pages += 1
+        cursor = body['next']
+        if cursor is None:
+            return ids, pages
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page_size', [1, 2, 3, 7, 50])
+def test_cursor_round_trip_visits_every_document_once(api, page_size):
+    # Runs of equal created_at straddle page boundaries; id breaks the ties
+    expected = _documents([T0] * 4 + [T0 + timedelta(seconds=1)] * 3 + [T0 - timedelta(days=1)] * 3)
+    ids, pages = _walk(api, page_size)
+    assert ids == expected
+    assert pages == max(1, -(-len(expected) // page_size))
+
+
+@pytest.mark.django_db
+def test_rows_created_behind_the_cursor_do_not_shift_pages(api):
+    expected = _documents([T0] * 5)
+    first = api.get('/api/documents', {'page_size': 2}).json()
+    _documents([T0 + timedelta(hours=1)])  # newer: sorts before the cursor
+    second = api.get('/api/documents', {'page_size': 2, 'cursor': first['next']}).json()
+    assert [d['id'] for d in first['results'] + second['results']] == expected[:4]
+
+
+@pytest.mark.django_db
+def test_invalid_cursor_is_404(api):
+    assert api.get('/api/documents', {'cursor': 'not-a-cursor'}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_documents_of_other_owners_are_not_listed(api):
+    Document.objects.create(owner_sub='someone-else', filename='x.txt', content_type='text/plain', text='x')
+    assert api.get('/api/documents').json() == {'results': [], 'next': None}
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+import pytest
+from api.pipeline import AsyncStage, BatchStage, Pipeline, Stage
+
+TIMEOUT = 5
+
+
+def _settle(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+    time.sleep(0.1)  # give any stage that could still move a chance to
+
+
+def test_items_pass_every_stage_in_order():
+    pipeline = Pipeline('t', [
+        Stage('double', lambda item: item.append(item[0] * 2), workers=2),
+        Stage('square', lambda item: item.append(item[-1] ** 2)),
+    ], queue_size=2)
+    futures = [pipeline.submit([n]) for n in range(5)]
+    assert [f.result(TIMEOUT) for f in futures] == [[n, 2 * n, 4 * n * n] for n in range(5)]
+
+
+def test_failed_item_skips_later_stages():
+    later = []
+
+    def check(item):
+        if item == 'bad':
+            raise ValueError(item)
+
+    pipeline = Pipeline('t', [Stage('check', check), Stage('later', later.append)], queue_size=2)
+    good, bad = pipeline.submit('good'), pipeline.submit('bad')
+    assert good.result(TIMEOUT) == 'good'
+    with pytest.raises(ValueError):
+        bad.result(TIMEOUT)
+    assert later == ['good']
+
+
+def test_failed_batch_is_retried_one_item_at_a_time():
+    calls = []
+    gate = threading.Event()
+
+    def persist(items):
+        calls.append(list(items))
+        gate.wait(TIMEOUT)
+        if 3 in items:
+            raise ValueError('bad item')
+
+    pipeline = Pipeline('t', [BatchStage('persist', persist, batch=8)], queue_size=8)
+    futures = [pipeline.submit(0)]
+    _settle(lambda: calls)
+    # These wait while the first batch runs, then go as one batch
+    futures += [pipeline.submit(n) for n in range(1, 5)]
+    gate.set()
+    for n, future in enumerate(futures):
+        if n == 3:
+            with pytest.raises(ValueError):
+                future.result(TIMEOUT)
+        else:
+            assert future.result(TIMEOUT) == n
+    assert calls == [[0], [1, 2, 3, 4], [1], [2], [3], [4]]
+
+
+def test_slow_stage_holds_back_earlier_ones():
+    extracted = []
+    gate = threading.Event()
+    pipeline = Pipeline('t', [
+        Stage('extract', extracted.append),
+        Stage('embed', lambda item: gate.wait(TIMEOUT)),
+    ], queue_size=1)
+    submitted = []
+
+    def submit_all():
+        for n in range(10):
+            submitted.append(pipeline.submit(n))
+
+    submitter = threading.Thread(target=submit_all, daemon=True)
+    submitter.start()
+    _settle(lambda: len(extracted) >= 3)
+    # embed holds 1, its queue 1, extract is stuck handing over 1, its queue holds 1
+    assert len(extracted) == 3
+    assert len(submitted) == 4
+    assert submitter.is_alive()
+
+    gate.set()
+    submitter.join(TIMEOUT)
+    assert [f.result(TIMEOUT) for f in submitted] == list(range(10))
+
+
+def test_async_stage_caps_calls_in_flight():
+    in_flight, peak = 0, 0
+
+    async def embed(item):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        if item == 7:
+            raise RuntimeError('embedding failed')
+
+    pipeline = Pipeline('t', [AsyncStage('embed', embed, concurrency=3)], queue_size=4)
+    futures = [pipeline.submit(n) for n in range(12)]
+    for n, future in enumerate(futures):
+        if n == 7:
+            with pytest.raises(RuntimeError):
+                future.result(TIMEOUT)
+        else:
+            assert future.result(TIMEOUT) == n
+    assert peak == 3
@@ -0,0 +1,44 @@
+import pytest
+from rest_framework.test import APIClient
+from api import profiling
+
+ADMIN, USER = 'profiling-admin', 'profiling-user'
+FILE_HEADER = 'X-Docuchat-Profile-File'
+
+
+@pytest.fixture(autouse=True)
+def profiling_settings(settings, tmp_path, monkeypatch):
+    settings.OIDC_VERIFY = 'mock'
+    settings.PROFILING_DIR = str(tmp_path)
+    settings.PROFILING_ADMIN_SUBS = [ADMIN]
+    settings.PROFILING_MIN_INTERVAL = 0
+    monkeypatch.setattr(profiling, '_last_capture', float('-inf'))
+
+
+def _ask(sub, **headers):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer mock:{sub}')
+    response = client.post('/api/chat/ask', {'question': 'anything?'}, format='json', **headers)
+    assert response.status_code == 200
+    return response
+
+
+@pytest.mark.django_db
+def test_admin_request_names_the_profile_file(tmp_path):
+    response = _ask(ADMIN, HTTP_X_DOCUCHAT_PROFILE='1')
+    assert (tmp_path / response[FILE_HEADER]).is_file()
+
+
+@pytest.mark.django_db
+def test_sampled_profile_is_written_but_not_named(settings, tmp_path):
+    settings.PROFILING_SAMPLE_RATE = 1.0
+    response = _ask(USER)
+    assert FILE_HEADER not in response
+    assert len(list(tmp_path.glob('ask-*.pstats'))) == 1
+
+
+@pytest.mark.django_db
+def test_header_from_a_non_admin_is_ignored(tmp_path):
+    response = _ask(USER, HTTP_X_DOCUCHAT_PROFILE='1')
+    assert FILE_HEADER not in response
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,111 @@
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+import pytest
+from api import progress_log
+from api.authentication import WebSocketTokenAuthMiddleware
+from api.routing import websocket_urlpatterns
+
+# The local log lives as long as the process, so each test uses its own owners
+application = WebSocketTokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+
+@pytest.fixture(autouse=True)
+def mock_oidc(settings):
+    settings.OIDC_VERIFY = 'mock'
+
+
+def _log(owner, count):
+    return [progress_log.append(owner, {'stage': 'indexed', 'n': n}) for n in range(count)]
+
+
+def test_since_returns_events_after_id():
+    ids = _log('since-test', 3)
+    events, complete = progress_log.since('since-test', ids[0])
+    assert [e['n'] for e in events] == [1, 2]
+    assert [e['id'] for e in events] == ids[1:]
+    assert complete
+
+
+def test_since_zero_returns_everything():
+    _log('since-zero-test', 3)
+    events, complete = progress_log.since('since-zero-test', '0')
+    assert [e['n'] for e in events] == [0, 1, 2]
+    assert complete
+
+
+def test_since_malformed_id_is_incomplete():
+    _log('since-malformed-test', 1)
+    assert progress_log.since('since-malformed-test', 'yesterday') == ([], False)
+
+
+def test_since_after_trimmed_events_is_incomplete(settings):
+    settings.PROGRESS_LOG_MAX = 2
+    ids = _log('since-trimmed-test', 4)
+    events, complete = progress_log.since('since-trimmed-test', ids[0])
+    # Event 1 fell out of the log, so what is left can't be trusted to be everything
+    assert [e['n'] for e in events] == [2, 3]
+    assert not complete
+    # From the oldest event still logged nothing can be missing
+    events, complete = progress_log.since('since-trimmed-test', ids[2])
+    assert [e['n'] for e in events] == [3]
+    assert complete
+
+
+def test_since_when_disabled(settings):
+    ids = _log('since-disabled-test', 1)
+    settings.PROGRESS_LOG = ''
+    assert progress_log.since('since-disabled-test', ids[0]) == ([], False)
+
+
+async def _receive_all(path):
+    """(accepted, messages sent before the socket went quiet)."""
+    communicator = WebsocketCommunicator(application, path)
+    accepted, _ = await communicator.connect()
+    messages = []
+    if accepted:
+        while not await communicator.receive_nothing(timeout=0.2):
+            messages.append(await communicator.receive_json_from())
+        await communicator.disconnect()
+    return accepted, messages
+
+
+def test_socket_without_token_is_rejected():
+    _log('socket-anonymous-test', 1)
+    accepted, _ = async_to_sync(_receive_all)('/ws/progress?sub=socket-anonymous-test&last_id=0')
+    assert not accepted
+
+
+def test_socket_replays_only_the_token_owners_events():
+    _log('socket-victim-test', 2)
+    _log('socket-owner-test', 1)
+    accepted, messages = async_to_sync(_receive_all)(
+        '/ws/progress?access_token=mock:socket-owner-test&sub=socket-victim-test&last_id=0')
+    assert accepted
+    assert [m['n'] for m in messages] == [0]
+
+
+def test_socket_accepts_authorization_header():
+    _log('socket-header-test', 1)
+
+    async def run():
+        communicator = WebsocketCommunicator(application, '/ws/progress?last_id=0',
+                                             headers=[(b'authorization', b'Bearer mock:socket-header-test')])
+        accepted, _ = await communicator.connect()
+        message = await communicator.receive_json_from()
+        await communicator.disconnect()
+        return accepted, message
+
+    accepted, message = async_to_sync(run)()
+    assert accepted
+    assert message['n'] == 0
+
+
+def test_socket_sends_resync_before_trimmed_replay(settings):
+    settings.PROGRESS_LOG_MAX = 2
+    ids = _log('socket-trimmed-test', 4)
+    accepted, messages = async_to_sync(_receive_all)(
+        f'/ws/progress?access_token=mock:socket-trimmed-test&last_id={ids[0]}')
+    assert accepted
+    assert messages[0] == {'stage': 'resync'}
+    assert [m['n'] for m in messages[1:]] == [2, 3]
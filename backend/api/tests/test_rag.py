@@ -0,0 +1,51 @@
+import pytest
+from api import indexing, rag
+from api.embeddings import get_embedder
+from api.models import Chunk, Document
+
+TEXT = ' '.join(f'paragraph {i} about invoices, shipping terms and the refund policy.' for i in range(400))
+
+
+@pytest.fixture
+def owner():
+    owner_sub = 'rag-test'
+    yield owner_sub
+    rag.residency.discard(owner_sub)
+
+
+def _index(owner_sub, filename):
+    indexing.index_file(owner_sub, filename, TEXT.encode(), 'text/plain')
+    return Document.objects.get(owner_sub=owner_sub, filename=filename)
+
+
+@pytest.mark.django_db
+def test_document_filter_reaches_duplicate_chunks(owner):
+    original = _index(owner, 'terms.txt')
+    copy = _index(owner, 'terms-copy.txt')
+    # Every chunk of the re-upload is a near-duplicate, so it has no rows of its own
+    assert not Chunk.objects.filter(document=copy, duplicate_of__isnull=True).exists()
+
+    query = get_embedder().embed(['refund policy'])[0]
+    results = rag.search(owner, query, 3, document_ids=[copy.pk])
+
+    assert len(results) == 3
+    # Reported as the filtered document's chunks, not the canonical ones they duplicate
+    assert {chunk.document_id for chunk, _ in results} == {copy.pk}
+    assert [chunk.document_id for chunk, _ in rag.search(owner, query, 3, document_ids=[original.pk])] == [
+        original.pk] * 3
+
+
+@pytest.mark.django_db
+def test_duplicate_chunks_follow_index_changes(owner):
+    _index(owner, 'terms.txt')
+    rag.get_index(owner)  # resident, so the next upload is patched in
+    copy = _index(owner, 'terms-copy.txt')
+    index = rag.get_index(owner)
+    query = get_embedder().embed(['shipping terms'])[0]
+
+    rag.apply_change(owner, index.version + 1, added=[copy.pk])
+    patched = rag.residency.peek(owner)
+    assert patched.version == index.version + 1
+    assert set(patched.dup_doc_ids.tolist()) == {copy.pk}
+    assert len(patched.dup_chunk_ids) == Chunk.objects.filter(document=copy).count()
+    assert {chunk.document_id for chunk, _ in rag.search(owner, query, 2, document_ids=[copy.pk])} == {copy.pk}
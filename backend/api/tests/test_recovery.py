@@ -0,0 +1,59 @@
+from datetime import timedelta
+import pytest
+from django.utils import timezone
+from api import deletion, recovery
+from api.models import Document
+
+OWNER = 'recovery-test'
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    calls = []
+    monkeypatch.setattr(deletion, 'submit', lambda owner_sub, ids: calls.append((owner_sub, ids)))
+    return calls
+
+
+def _doc(status, age_seconds=0):
+    doc = Document.objects.create(owner_sub=OWNER, filename=f'{status}.txt', content_type='text/plain', text='x',
+                                  status=status)
+    Document.objects.filter(pk=doc.pk).update(status_changed_at=timezone.now() - timedelta(seconds=age_seconds))
+    return doc.pk
+
+
+def _status(pk):
+    return Document.objects.get(pk=pk).status
+
+
+@pytest.mark.django_db
+def test_stale_indexing_fails_and_stale_deleting_resumes(settings, submitted):
+    settings.STALE_DOCUMENT_SECONDS = 60
+    stale_indexing, fresh_indexing = _doc('indexing', 120), _doc('indexing', 10)
+    stale_deleting, fresh_deleting = _doc('deleting', 120), _doc('deleting', 10)
+
+    assert recovery.recover() == {'failed': 1, 'resumed': 1}
+    assert [_status(pk) for pk in (stale_indexing, fresh_indexing, stale_deleting, fresh_deleting)] == [
+        'failed', 'indexing', 'deleting', 'deleting']
+    assert submitted == [(OWNER, [stale_deleting])]
+    # Claimed: a second process starting now leaves it to the first
+    assert recovery.recover() == {'failed': 0, 'resumed': 0}
+
+
+@pytest.mark.django_db
+def test_stale_indexing_document_can_be_deleted(settings, submitted):
+    settings.STALE_DOCUMENT_SECONDS = 60
+    stale, fresh = _doc('indexing', 120), _doc('indexing', 10)
+    assert deletion.delete_documents_async(OWNER, [stale, fresh]) == [stale]
+    assert (_status(stale), _status(fresh)) == ('deleting', 'indexing')
+
+
+@pytest.mark.django_db
+def test_failed_deletion_makes_documents_visible_again(monkeypatch):
+    pk = _doc('deleting')
+
+    def fail(owner_sub, document_ids):
+        raise RuntimeError('database went away')
+    monkeypatch.setattr(deletion, 'delete_documents', fail)
+    monkeypatch.setattr(deletion.connections, 'close_all', lambda: None)  # keep the test's transaction
+    deletion._run(OWNER, [pk])
+    assert _status(pk) == 'failed'
@@ -0,0 +1,83 @@
+import numpy as np
+from api.residency import ResidencyManager
+
+
+class FakeIndex:
+    def __init__(self, nbytes: int, version: int = 1):
+        self.nbytes = nbytes
+        self.version = version
+        self.snapshot_version = None
+        for name in ResidencyManager.SNAPSHOT_ARRAYS:
+            setattr(self, name, np.arange(3, dtype=np.int64))
+
+
+def _resident(manager):
+    return list(manager._indexes)
+
+
+def test_least_recently_queried_is_evicted_first():
+    manager = ResidencyManager(budget_bytes=100)
+    manager.put('a', FakeIndex(40))
+    manager.put('b', FakeIndex(40))
+    manager.get('a')
+    manager.put('c', FakeIndex(40))
+    assert _resident(manager) == ['a', 'c']
+    assert manager.stats() == {'owners': 2, 'bytes': 80, 'budget_bytes': 100}
+
+
+def test_peek_does_not_count_as_a_query():
+    manager = ResidencyManager(budget_bytes=100)
+    manager.put('a', FakeIndex(40))
+    manager.put('b', FakeIndex(40))
+    manager.peek('a')
+    manager.put('c', FakeIndex(40))
+    assert _resident(manager) == ['b', 'c']
+
+
+def test_most_recent_index_stays_even_over_budget():
+    manager = ResidencyManager(budget_bytes=100)
+    manager.put('a', FakeIndex(40))
+    manager.put('huge', FakeIndex(500))
+    assert _resident(manager) == ['huge']
+    assert manager.stats()['bytes'] == 500
+
+
+def test_replace_accounts_for_growth_and_skips_stale_indexes():
+    manager = ResidencyManager(budget_bytes=100)
+    a = FakeIndex(40)
+    manager.put('a', a)
+    manager.put('b', FakeIndex(40))
+    assert not manager.replace('a', FakeIndex(40), FakeIndex(10))  # not the resident one
+    assert manager.replace('b', manager.peek('b'), FakeIndex(70))  # 110 bytes: a goes
+    assert _resident(manager) == ['b']
+    assert manager.stats()['bytes'] == 70
+
+
+def test_evicted_index_is_snapshotted_once_per_version(tmp_path):
+    manager = ResidencyManager(budget_bytes=100, snapshot_dir=str(tmp_path))
+    a = FakeIndex(60, version=7)
+    manager.put('a', a)
+    manager.put('b', FakeIndex(60))
+    assert a.snapshot_version == 7
+    arrays = manager.load_snapshot('a', 7)
+    assert sorted(arrays) == sorted(ResidencyManager.SNAPSHOT_ARRAYS)
+    assert manager.load_snapshot('a', 8) is None
+    assert manager.load_snapshot('b', 1) is None
+
+    # Unchanged since its snapshot: evicting it again writes nothing
+    path = next(tmp_path.iterdir())
+    path.write_bytes(b'not a snapshot')
+    manager.put('a', a)
+    manager.put('b', FakeIndex(60))
+    assert path.read_bytes() == b'not a snapshot'
+    assert manager.load_snapshot('a', 7) is None  # unreadable snapshots are ignored
+
+
+def test_discard_frees_the_budget():
+    manager = ResidencyManager(budget_bytes=100)
+    old = FakeIndex(60)
+    manager.put('a', old)
+    manager.discard('a', FakeIndex(60))  # a different index: kept
+    assert _resident(manager) == ['a']
+    manager.discard('a', old)
+    assert manager.stats() == {'owners': 0, 'bytes': 0, 'budget_bytes': 100}
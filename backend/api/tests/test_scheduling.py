@@ -0,0 +1,147 @@
+import threading
+import time
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from api import indexing, progress_log
+from api.scheduling import FairScheduler
+
+TIMEOUT = 5
+
+
+def _scheduler(run, workers=1, quantum=10, owner_concurrency=4, owner_inflight_bytes=10 ** 9):
+    return FairScheduler(workers=workers, run=run, notify=lambda *a: None, quantum=quantum,
+                         owner_concurrency=owner_concurrency, owner_inflight_bytes=owner_inflight_bytes)
+
+
+def _run_order(jobs, **kwargs):
+    """Names in the order one worker ran them; all `jobs` (owner, name, size) are queued before any starts."""
+    order, gate = [], threading.Event()
+
+    def run(owner, name):
+        if name == 'gate':
+            gate.wait(TIMEOUT)
+        else:
+            order.append(name)
+
+    scheduler = _scheduler(run, **kwargs)
+    scheduler.submit('other', 'gate', 1)
+    for owner, name, size in jobs:
+        scheduler.submit(owner, name, size)
+    gate.set()
+    assert scheduler.wait_idle(TIMEOUT)
+    return order
+
+
+def test_owners_take_turns():
+    order = _run_order([('a', f'a{i}', 10) for i in range(4)] + [('b', f'b{i}', 10) for i in range(4)])
+    assert order == ['a0', 'b0', 'a1', 'b1', 'a2', 'b2', 'a3', 'b3']
+
+
+def test_large_files_do_not_starve_small_ones():
+    # Deficit round-robin shares bytes: b runs a small file per round while a saves up 100 bytes of quantum
+    order = _run_order([('a', 'large', 100)] + [('b', f'small{i}', 10) for i in range(12)])
+    assert order.index('large') == 9
+
+
+def test_smallest_job_of_an_owner_first():
+    order = _run_order([('a', 'big', 30), ('a', 'tiny', 1), ('a', 'mid', 10)])
+    assert order == ['tiny', 'mid', 'big']
+
+
+def test_owner_concurrency_cap_leaves_workers_for_others():
+    running, peak, lock = {}, {}, threading.Lock()
+
+    def run(owner, name):
+        with lock:
+            running[owner] = running.get(owner, 0) + 1
+            peak[owner] = max(peak.get(owner, 0), running[owner])
+        time.sleep(0.05)
+        with lock:
+            running[owner] -= 1
+
+    scheduler = _scheduler(run, workers=3, owner_concurrency=1)
+    for i in range(4):
+        scheduler.submit('a', f'a{i}', 10)
+    scheduler.submit('b', 'b0', 10)
+    assert scheduler.wait_idle(TIMEOUT)
+    assert peak == {'a': 1, 'b': 1}
+
+
+def test_inflight_bytes_cap_still_runs_an_oversized_job_alone():
+    done = []
+    scheduler = _scheduler(lambda owner, name: done.append(name), workers=2, owner_inflight_bytes=50)
+    scheduler.submit('a', 'huge', 500)
+    assert scheduler.wait_idle(TIMEOUT)
+    assert done == ['huge']
+
+
+def test_admission_counts_queued_files_and_bytes():
+    gate = threading.Event()
+    scheduler = _scheduler(lambda owner, name: gate.wait(TIMEOUT))
+    scheduler.submit('a', 'running', 10)
+    time.sleep(0.05)  # let it start; running jobs don't count against admission
+    scheduler.submit('a', 'queued', 40)
+    assert scheduler.admits('a', 1, 60, max_files=2, max_bytes=100)
+    assert not scheduler.admits('a', 2, 10, max_files=2, max_bytes=100)
+    assert not scheduler.admits('a', 1, 61, max_files=2, max_bytes=100)
+    assert scheduler.admits('b', 2, 100, max_files=2, max_bytes=100)
+    gate.set()
+    assert scheduler.wait_idle(TIMEOUT)
+
+
+def _notified(notify_interval=0.0):
+    """A one-worker scheduler whose queued-position updates are recorded, and its gate."""
+    updates, gate = [], threading.Event()
+    scheduler = FairScheduler(workers=1, run=lambda owner, name: gate.wait(TIMEOUT),
+                              notify=lambda *update: updates.append(update), quantum=10,
+                              owner_concurrency=4, owner_inflight_bytes=10 ** 9, notify_interval=notify_interval)
+    return scheduler, updates, gate
+
+
+def test_positions_are_reported_by_workers_not_on_submit():
+    scheduler, updates, gate = _notified()
+    scheduler.submit('a', 'running', 10)
+    time.sleep(0.05)
+    for i in range(3):
+        scheduler.submit('a', f'a{i}', 10)
+    assert updates == []
+    gate.set()
+    assert scheduler.wait_idle(TIMEOUT)
+    # Each start reports the jobs still waiting
+    assert updates == [('a', 'a1', 1), ('a', 'a2', 2), ('a', 'a2', 1)]
+
+
+def test_long_queue_reports_only_noticeable_moves():
+    scheduler, updates, gate = _notified()
+    scheduler.submit('a', 'running', 10)
+    time.sleep(0.05)
+    for i in range(100):
+        scheduler.submit('a', f'a{i:02}', 10)
+    gate.set()
+    assert scheduler.wait_idle(TIMEOUT)
+    last = [position for owner, name, position in updates if name == 'a99']
+    assert last[0] == 99 and last[-1] == 1
+    assert len(last) < 25
+    assert len(updates) < 100 * 15  # against 5050 when every move is reported
+
+
+def test_positions_are_recomputed_at_most_once_per_interval():
+    scheduler, updates, gate = _notified(notify_interval=60)
+    scheduler.submit('a', 'running', 10)
+    time.sleep(0.05)
+    for i in range(5):
+        scheduler.submit('a', f'a{i}', 10)
+    gate.set()
+    assert scheduler.wait_idle(TIMEOUT)
+    assert updates == []  # the first start came before anything was queued and used up the interval
+
+
+def test_queued_events_are_sent_live_but_not_logged():
+    layer = get_channel_layer()
+    channel = async_to_sync(layer.new_channel)()
+    async_to_sync(layer.group_add)('progress.queued-test', channel)
+    indexing._queued_progress('queued-test', 'a.txt', 3)
+    payload = async_to_sync(layer.receive)(channel)['payload']
+    assert (payload['stage'], payload['position']) == ('queued', 3)
+    assert 'id' not in payload
+    assert progress_log.since('queued-test', '0') == ([], True)
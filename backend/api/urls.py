@@ -1,26 +1,18 @@
 from django.urls import path
-from .views import UploadView, AskView, MeView, ListDocumentsView
-# backend/core/urls.py
-from django.urls import path
-from .views import health
-
-urlpatterns = [
-    path("health/", health),
-]
-
-urlpatterns = [
-    path('me', MeView.as_view(), name='me'),
-    path('documents', ListDocumentsView.as_view(), name='documents'),
-    path('upload', UploadView.as_view(), name='upload'),
-    path('chat/ask', AskView.as_view(), name='chat-ask'),
-]
-from .views import UploadView, AskView, MeView, ListDocumentsView, health
+from .views import (HealthView, ReadinessView, MeView, DocumentsView, DeleteDocumentsView, UploadView, AskView,
+                    BatchAskView, ExportView, ImportView, metrics)
 
+# Mounted under /api/ by backend/urls.py
 urlpatterns = [
+    path('health', HealthView.as_view(), name='health'),
+    path('health/ready', ReadinessView.as_view(), name='health-ready'),
+    path('metrics', metrics, name='metrics'),
     path('me', MeView.as_view(), name='me'),
-    path('documents', ListDocumentsView.as_view(), name='documents'),
+    path('documents', DocumentsView.as_view(), name='documents'),
+    path('documents/delete', DeleteDocumentsView.as_view(), name='documents-delete'),
     path('upload', UploadView.as_view(), name='upload'),
+    path('export', ExportView.as_view(), name='export'),
+    path('import', ImportView.as_view(), name='import'),
     path('chat/ask', AskView.as_view(), name='chat-ask'),
-    path('health', health, name='health'),          # ← add this
-    path('health/', health),                        # ← optional, trailing slash
+    path('chat/ask/batch', BatchAskView.as_view(), name='chat-ask-batch'),
 ]
@@ -1,31 +1,53 @@
 # backend/api/views.py
-from django.http import JsonResponse
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from typing import List
+import asyncio
+import fnmatch
+import hashlib
+import json
+import logging
 from django.conf import settings
-from rest_framework.views import APIView
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework import status, permissions, parsers
-from .serializers import DocumentSerializer, AskSerializer
-from .models import Document
+from rest_framework.views import APIView
+from backend.postgresql_pool.base import pool_stats
+from . import chat, deletion, export, indexing, profiling, warmup
+from .embeddings import get_embedder
 from .indexing import index_file_async
-from .embeddings import Embedder
-from .rag import search
-EMBEDDER = Embedder()
-from django.http import JsonResponse
-# 👇 If you have a Document model, import it. Otherwise this still runs without it.
-try:
-    from .models import Document
-except Exception:
-    Document = None
+from .metrics import ASKS, INDEXING_JOBS, stage
+from .models import ChatSession, Chunk, Document
+from .pagination import KeysetPagination
+from .rag import search, search_many
+from .serializers import (AskSerializer, BatchAskSerializer, DeleteDocumentsSerializer, DocumentFilterSerializer,
+                          DocumentSerializer)
+
+logger = logging.getLogger(__name__)
 
 
 class HealthView(APIView):
     permission_classes = [AllowAny]
     def get(self, request):
-        return JsonResponse({"status": "ok"})
+        # Liveness: always 200 while the process serves requests
+        body = {"status": "ok", "ready": warmup.is_ready(), "warmup": warmup.status()}
+        db_pool = pool_stats()
+        if db_pool:
+            body["db_pool"] = db_pool
+        return JsonResponse(body)
+
+
+class ReadinessView(APIView):
+    permission_classes = [AllowAny]
+    def get(self, request):
+        # 503 until start-up warm-up of recently active owners has finished
+        ready = warmup.is_ready()
+        return JsonResponse({"ready": ready, "warmup": warmup.status()}, status=200 if ready else 503)
+
+
+def metrics(request):
+    # Prometheus scrape target; plain Django view so DRF auth/throttling never applies
+    return HttpResponse(generate_latest(), content_type=CONTENT_TYPE_LATEST)
 
 
 class MeView(APIView):
@@ -37,10 +59,21 @@ class MeView(APIView):
 
 class DocumentsView(APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    # Only the columns DocumentSerializer emits; Document.text is never loaded here
+    list_fields = ['id', 'filename', 'content_type', 'created_at', 'status']
+
     def get(self, request):
         sub = getattr(request.user, 'oidc_sub', 'mock-user')
-        docs = Document.objects.filter(owner_sub=sub).order_by('-created_at')
-        return Response(DocumentSerializer(docs, many=True).data)
+        # Correlated count: evaluated only for the rows of the page, via the chunk FK index
+        chunk_count = (Chunk.objects.filter(document=OuterRef('pk'))
+                       .order_by().values('document').annotate(n=Count('*')).values('n'))
+        docs = (Document.objects.filter(owner_sub=sub).exclude(status=Document.STATUS_DELETING)
+                .only(*self.list_fields)
+                .annotate(num_chunks=Coalesce(Subquery(chunk_count, output_field=IntegerField()), 0)))
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(docs, request, view=self)
+        return paginator.get_paginated_response(DocumentSerializer(page, many=True).data)
 
 
 class UploadView(APIView):
@@ -52,20 +85,91 @@ class UploadView(APIView):
             return Response({'detail': 'No files uploaded'}, status=400)
         if len(files) > settings.MAX_UPLOAD_FILES:
             return Response({'detail': f'Max {settings.MAX_UPLOAD_FILES} files'}, status=400)
+        if not indexing.admits(sub, len(files), sum(f.size for f in files)):
+            INDEXING_JOBS.labels(outcome='rejected').inc(len(files))
+            return Response({'detail': 'Indexing queue full; retry later'}, status=429,
+                            headers={'Retry-After': str(settings.INDEXING_RETRY_AFTER)})
 
+        profile = profiling.requested_by(request)
         for f in files:
-            content = f.read()
-            index_file_async(sub, f.name, content, f.content_type or 'application/octet-stream')
+            # Hashed while reading, for the content store (api.content_store)
+            digest, parts = hashlib.sha256(), []
+            for part in f.chunks():
+                digest.update(part)
+                parts.append(part)
+            index_file_async(sub, f.name, b''.join(parts), f.content_type or 'application/octet-stream',
+                             profile=profile, content_hash=digest.hexdigest())
         return Response({'status': 'queued', 'count': len(files)})
 
+class DeleteDocumentsView(APIView):
+    permission_classes = [IsAuthenticated]
+    def post(self, request):
+        sub = getattr(request.user, 'oidc_sub', 'mock-user')
+        serializer = DeleteDocumentsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        document_ids = filtered_document_ids(sub, serializer.validated_data)
+        if document_ids:
+            # Only indexed or failed documents; progress and completion arrive on the progress WebSocket
+            document_ids = deletion.delete_documents_async(sub, document_ids)
+        return Response({'status': 'deleting', 'count': len(document_ids), 'document_ids': document_ids},
+                        status=202)
+
+
+class ExportView(APIView):
+    permission_classes = [IsAuthenticated]
+    def get(self, request):
+        sub = getattr(request.user, 'oidc_sub', 'mock-user')
+        # Built in a temporary file first: the zip manifest can only be written once every member is
+        f = export.export_to_tempfile(sub)
+        return FileResponse(f, as_attachment=True, filename='docuchat-export.zip', content_type='application/zip')
+
+
+class ImportView(APIView):
+    permission_classes = [IsAuthenticated]
+    def post(self, request):
+        sub = getattr(request.user, 'oidc_sub', 'mock-user')
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'No file uploaded'}, status=400)
+        try:
+            result = export.import_owner(upload, sub)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+        return Response(result, status=201)
+
+
+def _prompt(question, results, history=()):
+    """The LLM prompt for a question, its retrieved chunks and any session history, plus the citations to return."""
+    context_blocks = []
+    citations = []
+    for i, (chunk, score) in enumerate(results, start=1):
+        context_blocks.append(f"[Doc {i}] {chunk.text}")
+        citations.append({
+            'index': i,
+            'document_id': chunk.document.id,
+            'filename': chunk.document.filename,
+            'score': round(float(score), 4),
+        })
+    conversation = ''.join(f"{role.capitalize()}: {content}\n" for role, content in history)
+    if conversation:
+        conversation = f"Conversation so far:\n{conversation}\n"
+    prompt = (
+            'Answer the question using only the context. Cite sources using [Doc i].\n\n' +
+            conversation +
+            '\n\n'.join(context_blocks) +
+            f"\n\nQuestion: {question}\nAnswer:"
+    )
+    return prompt, citations
+
 def _call_llm(prompt: str) -> str:
-    # Minimal: use OpenAI if key present else return deterministic mock
+    # Minimal: use OpenAI (or any OpenAI-compatible server at LLM_BASE_URL) else return deterministic mock
     import os
     api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
+    base_url = os.getenv('LLM_BASE_URL')
+    if not api_key and not base_url:
         return '[MOCK ANSWER] This is a placeholder answer generated without external LLM.'
     from openai import OpenAI
-    client = OpenAI(api_key=api_key)
+    client = OpenAI(api_key=api_key or 'unused', base_url=base_url or None)
     chat = client.chat.completions.create(
         model=os.getenv('LLM_MODEL', 'gpt-4o-mini'),
         messages=[{'role': 'system', 'content': 'You are a helpful RAG assistant.'}, {'role': 'user', 'content': prompt}],
@@ -73,35 +177,140 @@ def _call_llm(prompt: str) -> str:
     )
     return chat.choices[0].message.content.strip()
 
+def filtered_document_ids(owner_sub: str, data: dict):
+    """Ids of the owner's documents matching the document filters in `data`, or None when there are none."""
+    if not any(f in data for f in DocumentFilterSerializer.FILTER_FIELDS):
+        return None
+    docs = Document.objects.filter(owner_sub=owner_sub)
+    if 'document_ids' in data:
+        docs = docs.filter(id__in=data['document_ids'])
+    if 'content_type' in data:
+        docs = docs.filter(content_type=data['content_type'])
+    if 'created_after' in data:
+        docs = docs.filter(created_at__gte=data['created_after'])
+    if 'created_before' in data:
+        docs = docs.filter(created_at__lte=data['created_before'])
+    if 'filename' not in data:
+        return list(docs.values_list('id', flat=True))
+    # Globs don't translate portably to SQL; the owner's filenames are few enough to match here
+    pattern = data['filename'].lower()
+    return [pk for pk, name in docs.values_list('id', 'filename') if fnmatch.fnmatchcase(name.lower(), pattern)]
+
+
+def mmr_options(data: dict):
+    """(lambda, pool) for rag's diversity re-ranking, from the ask body or the settings."""
+    return data.get('mmr_lambda', settings.MMR_LAMBDA), data.get('mmr_pool', settings.MMR_POOL)
+
+
 class AskView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        requested = profiling.requested_by(request)
+        with profiling.profiled('ask', profiling.should_profile(requested)) as capture:
+            response = self._ask(request)
+        # Sampled profiles stay server-side; only the admin who asked learns the file name
+        if capture and requested:
+            response[profiling.PROFILE_HEADER + '-File'] = capture.path.name
+        return response
+
+    def _ask(self, request):
         sub = getattr(request.user, 'oidc_sub', 'mock-user')
         serializer = AskSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        question = serializer.validated_data['question']
+        data = serializer.validated_data
+        question = data['question']
+        top_k = data.get('top_k', settings.TOP_K)
+        session = None
+        if 'session_id' in data:
+            session = ChatSession.objects.filter(pk=data['session_id'], owner_sub=sub).first()
+            if session is None:
+                return Response({'detail': 'Session not found'}, status=404)
+        elif data['new_session']:
+            session = ChatSession.objects.create(owner_sub=sub, title=question[:255])
+
+        try:
+            with stage('embed_query'):
+                qvec = get_embedder().embed([question])[0]
+            with stage('search'):
+                document_ids = filtered_document_ids(sub, data)
+                if session is None:
+                    results = search(sub, qvec, top_k, document_ids, *mmr_options(data))
+                else:
+                    results, _ = chat.retrieve(session, sub, qvec, top_k, document_ids, *mmr_options(data))
+            body = self._answer(question, results, chat.history(session) if session else ())
+            if session is not None:
+                chat.record(session, question, body['answer'])
+                body['session_id'] = session.pk
+        except Exception:
+            ASKS.labels(outcome='error').inc()
+            raise
+        ASKS.labels(outcome='ok').inc()
+        return Response(body)
+
+    def _answer(self, question, results, history=()):
+        prompt, citations = _prompt(question, results, history)
+        with stage('llm'):
+            answer = _call_llm(prompt)
+        return {'answer': answer, 'citations': citations}
+
+
+class BatchAskView(APIView):
+    """Answers many questions in one request, streamed back as NDJSON.
+
+    Questions are embedded in one call and scored together against the
+    owner's index; LLM calls run ASK_BATCH_LLM_CONCURRENCY at a time and each
+    answer is written as its own line as soon as it completes, so lines
+    arrive out of order (match them by `index`).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        sub = getattr(request.user, 'oidc_sub', 'mock-user')
+        serializer = BatchAskSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        questions = serializer.validated_data['questions']
         top_k = serializer.validated_data.get('top_k', settings.TOP_K)
 
-        qvec = EMBEDDER.embed([question])[0]
-        results = search(sub, qvec, top_k)
-
-        # Build prompt with citations
-        context_blocks = []
-        citations = []
-        for i, (chunk, score) in enumerate(results, start=1):
-            context_blocks.append(f"[Doc {i}] {chunk.text}")
-            citations.append({
-                'index': i,
-                'document_id': chunk.document.id,
-                'filename': chunk.document.filename,
-                'score': round(float(score), 4),
-            })
-        prompt = (
-                'Answer the question using only the context. Cite sources using [Doc i].\n\n' +
-                '\n\n'.join(context_blocks) +
-                f"\n\nQuestion: {question}\nAnswer:"
-        )
-
-        answer = _call_llm(prompt)
-        return Response({'answer': answer, 'citations': citations})
+        try:
+            with stage('embed_query'):
+                qvecs = get_embedder().embed(questions)
+            with stage('search'):
+                document_ids = filtered_document_ids(sub, serializer.validated_data)
+                results = search_many(sub, qvecs, top_k, document_ids, *mmr_options(serializer.validated_data))
+            # Prompts are built here: reading chunk text touches the database
+            prompts = [_prompt(q, r) for q, r in zip(questions, results)]
+        except Exception:
+            ASKS.labels(outcome='error').inc(len(questions))
+            raise
+        return StreamingHttpResponse(self._stream(questions, prompts), content_type='application/x-ndjson')
+
+    async def _stream(self, questions, prompts):
+        # Served by the ASGI handler on the event loop; LLM calls run in threads
+        limit = asyncio.Semaphore(settings.ASK_BATCH_LLM_CONCURRENCY)
+
+        async def answer(i):
+            prompt, citations = prompts[i]
+            async with limit:
+                try:
+                    text = await asyncio.to_thread(self._llm, prompt)
+                except Exception:
+                    logger.exception('Batch ask LLM call failed')
+                    ASKS.labels(outcome='error').inc()
+                    return {'index': i, 'question': questions[i], 'error': 'LLM call failed'}
+            ASKS.labels(outcome='ok').inc()
+            return {'index': i, 'question': questions[i], 'answer': text, 'citations': citations}
+
+        tasks = [asyncio.ensure_future(answer(i)) for i in range(len(questions))]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield json.dumps(await done) + '\n'
+        finally:
+            # Client went away: don't start the remaining LLM calls
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _llm(prompt):
+        with stage('llm'):
+            return _call_llm(prompt)
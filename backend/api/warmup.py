@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+from typing import List
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+from .models import ChatSession, Document
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# 'disabled' until start() runs (WSGI, management commands); warming never blocks readiness
+# once it has finished or failed, since cold owners are still served, just slower
+_status = {'state': 'disabled'}
+
+
+def status() -> dict:
+    with _lock:
+        return dict(_status)
+
+
+def is_ready() -> bool:
+    return status()['state'] in ('disabled', 'ready', 'failed')
+
+
+def recent_owners(limit: int) -> List[str]:
+    """Owners ordered by their latest document upload or chat session."""
+    last = {}
+    for model in (Document, ChatSession):
+        rows = (model.objects.values('owner_sub').annotate(last=Max('created_at'))
+                .order_by('-last')[:limit])
+        for row in rows:
+            if row['owner_sub'] not in last or row['last'] > last[row['owner_sub']]:
+                last[row['owner_sub']] = row['last']
+    return sorted(last, key=last.get, reverse=True)[:limit]
+
+
+def start():
+    """Warm retrieval for recently active owners in a background thread (called from backend.asgi)."""
+    limit = settings.WARMUP_OWNERS
+    if limit <= 0:
+        return
+    with _lock:
+        if _status['state'] != 'disabled':
+            return
+        _status.update(state='pending')
+    threading.Thread(target=_run, args=(limit,), name='warmup', daemon=True).start()
+
+
+def _run(limit: int):
+    t0 = time.monotonic()
+    try:
+        # Heavy imports happen here, off the request path
+        import numpy  # noqa: F401
+        from . import rag
+        if settings.OPENAI_API_KEY:
+            import openai  # noqa: F401
+        owners = recent_owners(limit)
+        with _lock:
+            _status.update(state='warming', owners=len(owners), warmed=0)
+        for sub in owners:
+            stats = rag.residency.stats()
+            if stats['bytes'] >= stats['budget_bytes']:
+                break  # warming more would only evict what was just warmed
+            rag.warm(sub)
+            with _lock:
+                _status['warmed'] += 1
+        state = 'ready'
+    except Exception:
+        logger.exception('Retrieval warm-up failed')
+        state = 'failed'
+    finally:
+        connections.close_all()
+    with _lock:
+        _status.update(state=state, seconds=round(time.monotonic() - t0, 3))
@@ -1,17 +1,30 @@
 import os
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from django.conf import settings
-import api.routing as api_routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# The server extracts files in a process pool (see INDEXING_EXTRACT_PROCESSES); its entry point is import-safe
+os.environ.setdefault('INDEXING_EXTRACT_PROCESSES', '2')
 
 django_asgi_app = get_asgi_application()
 
+# Imported after Django is set up
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+import api.routing as api_routing  # noqa: E402
+from api.authentication import WebSocketTokenAuthMiddleware  # noqa: E402
+from api import invalidation, recovery, warmup  # noqa: E402
+
 application = ProtocolTypeRouter({
     'http': django_asgi_app,
-    'websocket': AuthMiddlewareStack(
+    # Same bearer tokens as the REST API; the progress socket serves only the token's owner
+    'websocket': WebSocketTokenAuthMiddleware(
         URLRouter(api_routing.websocket_urlpatterns)
     ),
 })
+
+# Start-up hooks: follow other workers' index changes, take over documents a
+# dead process left indexing or deleting, and warm retrieval for recently
+# active owners in the background while traffic is already served;
+# /api/health/ready reports when warm-up is done
+invalidation.start_listener()
+recovery.start()
+warmup.start()
@@ -0,0 +1 @@
+# PostgreSQL backend with a psycopg_pool connection pool (ENGINE = 'backend.postgresql_pool')
@@ -0,0 +1,106 @@
+import threading
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as BaseDatabaseCreation
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections to the test database would block DROP DATABASE
+        self.connection.close_pool(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Django's PostgreSQL backend, but connections come from a per-process pool.
+
+    Mirrors the OPTIONS['pool'] support that Django 5.1 ships natively, so the
+    settings carry over unchanged on upgrade. Closing a Django connection (end of
+    request, end of an indexing job) returns it to the pool instead of dropping it,
+    and web threads and indexing workers share the same bounded set of server
+    connections. With CONN_HEALTH_CHECKS, connections are checked on checkout.
+    """
+    creation_class = DatabaseCreation
+
+    def check_settings(self):
+        super().check_settings()
+        if self._pool_options() and self.settings_dict['CONN_MAX_AGE']:
+            raise ImproperlyConfigured("Pooling doesn't support persistent connections (set CONN_MAX_AGE = 0).")
+
+    def _pool_options(self):
+        if self.alias == NO_DB_ALIAS:
+            return None
+        return self.settings_dict['OPTIONS'].get('pool')
+
+    @property
+    def pool(self):
+        options = self._pool_options()
+        if not options:
+            return None
+        # Keyed by NAME too so the test database (benchmarks, test runner) gets its own pool
+        key = (self.alias, self.settings_dict['NAME'])
+        with _pools_lock:
+            if key not in _pools:
+                from psycopg_pool import ConnectionPool
+                if options is True:
+                    options = {}
+                kwargs = self.get_connection_params()
+                # Django switches autocommit itself right after checkout
+                kwargs['autocommit'] = True
+                _pools[key] = ConnectionPool(
+                    kwargs=kwargs,
+                    open=False,
+                    check=ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                    name=self.alias,
+                    **options,
+                )
+            return _pools[key]
+
+    def close_pool(self, name: str = None):
+        with _pools_lock:
+            pool = _pools.pop((self.alias, name or self.settings_dict['NAME']), None)
+        if pool is not None:
+            pool.close()
+
+    def get_connection_params(self):
+        # The stock backend copies OPTIONS into the params; drop 'pool' from that copy only.
+        # settings_dict is shared by every thread's connection, so it is never modified
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        pool.open()
+        connection = pool.getconn()
+        # Same isolation level handling as the stock backend, minus the connect()
+        level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = base.IsolationLevel(base.IsolationLevel.READ_COMMITTED if level is None else level)
+        if level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        # Return to the pool the connection came from, even if NAME changed since
+        pool = getattr(self.connection, '_pool', None)
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
+            self.connection = None
+
+
+def pool_stats(alias: str = 'default') -> dict:
+    """Pool gauges/counters for monitoring; empty when pooling is off."""
+    pool = getattr(connections[alias], 'pool', None)
+    if pool is None:
+        return {}
+    # requests_wait_ms / requests_queued: time spent and checkouts that had to wait
+    return dict(pool.get_stats())
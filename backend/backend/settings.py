@@ -68,25 +68,53 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 ASGI_APPLICATION = 'backend.asgi.application'
 
+# Connection pool shared by request threads and indexing workers (psycopg_pool).
+# With DB_POOL=0 connections are instead kept open per thread for DB_CONN_MAX_AGE seconds.
+DB_POOL = os.getenv('DB_POOL', '1') == '1'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'backend.postgresql_pool' if DB_POOL else 'django.db.backends.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'docuchat'),
         'USER': os.getenv('POSTGRES_USER', 'docu'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'docu'),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         'PORT': int(os.getenv('POSTGRES_PORT', 5432)),
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),  # seconds to wait for a free connection
+                'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+            },
+        } if DB_POOL else {},
     }
 }
 
+# Local runs without Postgres/Redis (benchmarks, quick experiments): DB_ENGINE=sqlite, CHANNEL_LAYER=memory.
+# CI sets DATABASE_URL=sqlite:///<path> instead
+SQLITE_URL = os.getenv('DATABASE_URL', '') if os.getenv('DATABASE_URL', '').startswith('sqlite:///') else ''
+if os.getenv('DB_ENGINE', 'postgresql') == 'sqlite' or SQLITE_URL:
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': SQLITE_URL[len('sqlite:///'):] or os.getenv('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+    }
+
+REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            'hosts': [(os.getenv('REDIS_HOST', 'localhost'), int(os.getenv('REDIS_PORT', 6379)))],
+            'hosts': [(REDIS_HOST, REDIS_PORT)],
         },
     },
 }
+if os.getenv('CHANNEL_LAYER', 'redis') == 'memory':
+    CHANNEL_LAYERS['default'] = {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
@@ -123,7 +151,77 @@ OIDC_VERIFY = os.getenv('OIDC_VERIFY', 'mock')  # 'on' | 'mock'
 MAX_UPLOAD_FILES = int(os.getenv('MAX_UPLOAD_FILES', '20'))
 MAX_CHUNK_TOKENS = int(os.getenv('MAX_CHUNK_TOKENS', '600'))
 CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '80'))
+DEDUP_CHUNKS = os.getenv('DEDUP_CHUNKS', '1') == '1'  # MinHash near-duplicate chunks reuse embeddings
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.9'))  # estimated shingle Jaccard similarity
+CONTENT_STORE = os.getenv('CONTENT_STORE', '1') == '1'  # re-uploaded files reuse stored text and embeddings
+CHUNK_INGEST = os.getenv('CHUNK_INGEST', 'copy')  # 'copy' streams chunks with COPY on Postgres; 'orm' uses bulk_create
+# Concurrent indexing jobs per process; keep below DB_POOL_MAX_SIZE so requests still get connections
+INDEXING_WORKERS = int(os.getenv('INDEXING_WORKERS', '4'))
+# Files of running jobs move through extract -> chunk -> embed -> persist stages (api.pipeline); '0' runs them in turn
+INDEXING_PIPELINE = os.getenv('INDEXING_PIPELINE', '1') == '1'
+# Extraction worker processes; 0 extracts in a thread. backend.asgi defaults it to 2: a spawned pool re-imports the
+# parent's __main__, so scripts and commands that enable it need an `if __name__ == '__main__':` guard
+INDEXING_EXTRACT_PROCESSES = int(os.getenv('INDEXING_EXTRACT_PROCESSES', '0'))
+INDEXING_CHUNK_WORKERS = int(os.getenv('INDEXING_CHUNK_WORKERS', '1'))
+INDEXING_EMBED_CONCURRENCY = int(os.getenv('INDEXING_EMBED_CONCURRENCY', '4'))  # embedding requests in flight
+INDEXING_PERSIST_WORKERS = int(os.getenv('INDEXING_PERSIST_WORKERS', '1'))
+# Documents written per transaction; no more than INDEXING_WORKERS files are ever in the pipeline to batch
+INDEXING_PERSIST_BATCH = int(os.getenv('INDEXING_PERSIST_BATCH', str(INDEXING_WORKERS)))
+INDEXING_STAGE_QUEUE = int(os.getenv('INDEXING_STAGE_QUEUE', '4'))  # files waiting in front of each stage
+# Fair scheduling between owners (deficit round-robin on bytes) and per-owner caps
+INDEXING_QUANTUM_BYTES = int(os.getenv('INDEXING_QUANTUM_BYTES', str(1024 * 1024)))
+INDEXING_OWNER_CONCURRENCY = int(os.getenv('INDEXING_OWNER_CONCURRENCY', '2'))
+INDEXING_OWNER_INFLIGHT_BYTES = int(os.getenv('INDEXING_OWNER_INFLIGHT_BYTES', str(50 * 1024 * 1024)))
+INDEXING_OWNER_MAX_QUEUED_FILES = int(os.getenv('INDEXING_OWNER_MAX_QUEUED_FILES', '100'))
+INDEXING_OWNER_MAX_QUEUED_BYTES = int(os.getenv('INDEXING_OWNER_MAX_QUEUED_BYTES', str(200 * 1024 * 1024)))
+# Seconds between recomputing queued files' positions ('queued' progress events)
+INDEXING_QUEUE_NOTIFY_INTERVAL = float(os.getenv('INDEXING_QUEUE_NOTIFY_INTERVAL', '2'))
+DELETION_WORKERS = int(os.getenv('DELETION_WORKERS', '1'))  # background bulk deletes (api.deletion)
+DELETION_BATCH_CHUNKS = int(os.getenv('DELETION_BATCH_CHUNKS', '1000'))  # chunks per delete transaction
+# Documents indexing or deleting for longer are presumed orphaned by a dead process (api.recovery)
+STALE_DOCUMENT_SECONDS = int(os.getenv('STALE_DOCUMENT_SECONDS', '3600'))
+INDEXING_RETRY_AFTER = int(os.getenv('INDEXING_RETRY_AFTER', '30'))  # seconds, on 429 from /api/upload
 TOP_K = int(os.getenv('TOP_K', '5'))
+# Maximal marginal relevance over the best MMR_POOL candidates; 1.0 is pure relevance (MMR off),
+# lower values trade relevance for diversity. Both can be overridden per ask (mmr_lambda, mmr_pool)
+MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', '1.0'))
+MMR_POOL = int(os.getenv('MMR_POOL', '50'))
+MMR_MAX_POOL = int(os.getenv('MMR_MAX_POOL', '500'))
+# Session asks (api.chat): history window sent to the LLM, and follow-up retrieval reuse
+CHAT_HISTORY_MESSAGES = int(os.getenv('CHAT_HISTORY_MESSAGES', '20'))
+CHAT_HISTORY_TOKENS = int(os.getenv('CHAT_HISTORY_TOKENS', '1500'))  # estimated, ~4 characters per token
+CHAT_CANDIDATE_POOL = int(os.getenv('CHAT_CANDIDATE_POOL', '50'))  # chunk ids cached per session
+CHAT_REUSE_SIMILARITY = float(os.getenv('CHAT_REUSE_SIMILARITY', '0.8'))  # query cosine needed to reuse them
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv('ASK_BATCH_MAX_QUESTIONS', '256'))  # per POST /api/chat/ask/batch
+ASK_BATCH_LLM_CONCURRENCY = int(os.getenv('ASK_BATCH_LLM_CONCURRENCY', '4'))  # concurrent LLM calls per batch
+RETRIEVAL_MEMORY_BUDGET_MB = int(os.getenv('RETRIEVAL_MEMORY_BUDGET_MB', '512'))  # per-process, for resident search indexes
+RETRIEVAL_SNAPSHOT_DIR = os.getenv('RETRIEVAL_SNAPSHOT_DIR', '/tmp/docuchat-index')  # evicted indexes; empty disables
+# Reduced-dimension candidate search (manage.py fit_projection); empty disables
+RETRIEVAL_PROJECTION = os.getenv('RETRIEVAL_PROJECTION', '')
+RETRIEVAL_PROJECTION_MIN_ROWS = int(os.getenv('RETRIEVAL_PROJECTION_MIN_ROWS', '5000'))  # smaller indexes scan in full
+RETRIEVAL_RERANK_FACTOR = int(os.getenv('RETRIEVAL_RERANK_FACTOR', '10'))  # shortlist = top_k * factor
+WARMUP_OWNERS = int(os.getenv('WARMUP_OWNERS', '20'))  # recently active owners warmed at ASGI start; 0 disables
+# 'redis' pub/sub tells every worker when an owner's chunks change; 'local' is for single-process setups
+INVALIDATION_BUS = os.getenv('INVALIDATION_BUS', 'local' if os.getenv('CHANNEL_LAYER', 'redis') == 'memory' else 'redis')
+# Progress events replayable after reconnects: 'redis' (per-owner stream) | 'local' (this process) | '' (off)
+PROGRESS_LOG = os.getenv('PROGRESS_LOG', 'local' if os.getenv('CHANNEL_LAYER', 'redis') == 'memory' else 'redis')
+PROGRESS_LOG_MAX = int(os.getenv('PROGRESS_LOG_MAX', '1000'))  # events kept per owner
+PROGRESS_LOG_TTL = int(os.getenv('PROGRESS_LOG_TTL', '86400'))  # seconds an idle owner's log is kept (redis)
+
+# On-demand profiling of asks/indexing jobs (api.profiling); inspect with python -m pstats or snakeviz
+PROFILING_DIR = os.getenv('PROFILING_DIR', '/tmp/docuchat-profiles')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))  # fraction of asks/jobs profiled
+PROFILING_MIN_INTERVAL = float(os.getenv('PROFILING_MIN_INTERVAL', '60'))  # seconds between captures per process
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', '200'))
+PROFILING_ADMIN_SUBS = [s for s in os.getenv('PROFILING_ADMIN_SUBS', '').split(',') if s]
+DOCUMENTS_PAGE_SIZE = int(os.getenv('DOCUMENTS_PAGE_SIZE', '50'))
+
+# Document/Chunk text storage: 'zlib' | 'zstd' (needs zstandard) | 'none'
+TEXT_COMPRESSION = os.getenv('TEXT_COMPRESSION', 'zlib')
+TEXT_COMPRESSION_LEVEL = int(os.getenv('TEXT_COMPRESSION_LEVEL', '6'))
+TEXT_COMPRESSION_DICT = os.getenv('TEXT_COMPRESSION_DICT', '')  # zstd dictionary file (manage.py train_text_dictionary)
+# Older dictionary files, comma-separated, still needed to read rows compressed with them
+TEXT_COMPRESSION_DICTS = [p for p in os.getenv('TEXT_COMPRESSION_DICTS', '').split(',') if p]
 # CORS (dev)
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
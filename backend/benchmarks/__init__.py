@@ -0,0 +1 @@
+# Runnable benchmarks: python -m benchmarks.<name> --help (from backend/)
@@ -0,0 +1,95 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def scratch_database():
+    """Run against a throwaway test database so benchmarks never touch real data."""
+    from django.db import connection
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def timed(fn: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {'n': 0}
+    s = sorted(samples_ms)
+
+    def pct(p):
+        return s[min(len(s) - 1, int(round(p / 100.0 * (len(s) - 1))))]
+    return {
+        'n': len(s),
+        'mean_ms': round(sum(s) / len(s), 3),
+        'p50_ms': round(pct(50), 3),
+        'p99_ms': round(pct(99), 3),
+        'max_ms': round(s[-1], 3),
+    }
+
+
+def emit(result: dict, out: str = None):
+    text = json.dumps(result, indent=2, sort_keys=True, default=str)
+    if out:
+        Path(out).write_text(text + '\n')
+    print(text)
+
+
+_VOCAB = None
+
+
+def synthetic_text(rng, words: int) -> str:
+    """Pseudo-English with a Zipf-like word distribution (compresses like real prose)."""
+    global _VOCAB
+    if _VOCAB is None:
+        import random
+        vrng = random.Random(1234)
+        letters = 'etaoinshrdlucmfwypvbgkjqxz'
+        _VOCAB = ['the', 'of', 'and', 'to', 'in', 'a', 'is', 'that', 'for', 'shall']
+        _VOCAB += [''.join(vrng.choice(letters[:10 + i % 16]) for _ in range(2 + i % 9)) for i in range(5000)]
+    weights = _zipf_weights(len(_VOCAB))
+    out = []
+    for i, w in enumerate(rng.choices(_VOCAB, cum_weights=weights, k=words)):
+        out.append(w)
+        if i % 17 == 16:
+            out[-1] += '.'
+    return ' '.join(out)
+
+
+_ZIPF = {}
+
+
+def _zipf_weights(n: int):
+    if n not in _ZIPF:
+        total, cum = 0.0, []
+        for rank in range(1, n + 1):
+            total += 1.0 / rank
+            cum.append(total)
+        _ZIPF[n] = cum
+    return _ZIPF[n]
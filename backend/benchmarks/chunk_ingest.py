@@ -0,0 +1,72 @@
+"""Chunk write throughput: bulk_create versus COPY (api.ingest).
+
+Writes synthetic documents' chunks (compressed text, JSON embeddings,
+MinHash signatures and their bands) through api.ingest.write_chunks, once
+per ingest mode, and reports rows per second. COPY runs only on Postgres;
+on SQLite only the ORM path is measured.
+
+    DB_ENGINE=postgresql python -m benchmarks.chunk_ingest --docs 20 --chunks-per-doc 2000 --out ingest.json
+"""
+import argparse
+import random
+import time
+
+from benchmarks._common import emit, scratch_database, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=10)
+    parser.add_argument('--chunks-per-doc', type=int, default=1000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--words', type=int, default=200, help='Words per chunk')
+    parser.add_argument('--out')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from api import dedup, ingest
+    from api.models import Chunk, Document
+
+    rng = random.Random(0)
+    vocabulary = [f'word{i}' for i in range(5000)]
+    texts = [' '.join(rng.choices(vocabulary, k=args.words)) for _ in range(args.chunks_per_doc)]
+    signatures = [dedup.signature(text) for text in texts]
+    vectors = [[rng.uniform(-1, 1) for _ in range(args.dim)] for _ in range(args.chunks_per_doc)]
+
+    rows = []
+    with scratch_database() as connection:
+        modes = ['orm', 'copy'] if connection.vendor == 'postgresql' else ['orm']
+        for mode in modes:
+            settings.CHUNK_INGEST = mode
+            owner = f'ingest-{mode}'
+            elapsed = 0.0
+            for d in range(args.docs):
+                doc = Document.objects.create(owner_sub=owner, filename=f'doc-{d}.txt', content_type='text/plain',
+                                              text='')
+                objs = [Chunk(document=doc, owner_sub=owner, idx=i, text=text, embedding=vectors[i],
+                              minhash=signatures[i]) for i, text in enumerate(texts)]
+                t0 = time.perf_counter()
+                ingest.write_chunks(objs)
+                elapsed += time.perf_counter() - t0
+            total = args.docs * args.chunks_per_doc
+            rows.append({
+                'mode': mode,
+                'rows': total,
+                'seconds': round(elapsed, 3),
+                'rows_per_second': round(total / elapsed, 1),
+                'per_document_ms': round(elapsed / args.docs * 1000, 2),
+            })
+
+        emit({
+            'benchmark': 'chunk_ingest',
+            'vendor': connection.vendor,
+            'docs': args.docs,
+            'chunks_per_doc': args.chunks_per_doc,
+            'dim': args.dim,
+            'results': rows,
+        }, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Compare two benchmark JSON files (e.g. from two commits) row by row.
+
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+
+
+def _flatten(obj, prefix=''):
+    out = {}
+    for k, v in obj.items():
+        key = f'{prefix}{k}'
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + '.'))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args()
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print(f"{before.get('benchmark')}: {before.get('revision')} -> {after.get('revision')}")
+    for i, (old, new) in enumerate(zip(before.get('results', []), after.get('results', []))):
+        old, new = _flatten(old), _flatten(new)
+        print(f'\n[row {i}]')
+        for key in sorted(set(old) & set(new)):
+            a, b = old[key], new[key]
+            change = f'{(b - a) / a * 100:+.1f}%' if a else ''
+            print(f'  {key:<40} {a:>14} {b:>14} {change:>9}')
+
+
+if __name__ == '__main__':
+    main()
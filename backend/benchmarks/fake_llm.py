@@ -0,0 +1,63 @@
+"""Minimal OpenAI-compatible chat completions server with a fixed latency.
+
+Point the backend at it with LLM_BASE_URL=http://127.0.0.1:<port>/v1 (leave
+OPENAI_API_KEY unset so embeddings stay on the mock embedder).
+
+    python -m benchmarks.fake_llm --port 9100 --latency-ms 300
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(latency_ms: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if not self.path.endswith('/chat/completions'):
+                self.send_error(404)
+                return
+            time.sleep(latency_ms / 1000.0)
+            req = json.loads(body or b'{}')
+            out = json.dumps({
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': req.get('model', 'fake'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': '[FAKE LLM] Answer citing [Doc 1].'}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+
+def start(port: int = 0, latency_ms: float = 0.0) -> ThreadingHTTPServer:
+    """Serve in a daemon thread; base URL is http://127.0.0.1:<server.server_port>/v1."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(latency_ms))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--latency-ms', type=float, default=300.0)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.latency_ms))
+    print(f'Fake LLM on http://127.0.0.1:{args.port}/v1 ({args.latency_ms} ms)')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""Concurrent users against the ASGI app: uploads, progress WebSockets and asks.
+
+Each simulated user (subject load-<i>, via mock 'mock:<sub>' tokens) opens
+/ws/progress, uploads files through /api/upload and fires /api/chat/ask while
+its files index. Reports throughput, latency percentiles and error rates per
+operation, upload-to-done indexing time and progress-event delivery lag.
+
+In-process (default): drives backend.asgi.application directly on a throwaway
+database with the mock embedder, the in-memory channel layer and a fake LLM
+server started here.
+
+    python -m benchmarks.loadtest --users 20 --uploads-per-user 2 --asks-per-user 10
+
+Against a running daphne (needs `pip install websockets`; start the server with
+OIDC_VERIFY=mock and LLM_BASE_URL pointing at `python -m benchmarks.fake_llm`):
+
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --users 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+
+from channels.layers import InMemoryChannelLayer
+
+from benchmarks._common import emit, percentiles, synthetic_text
+
+
+def _multipart(files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, content in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{name}"\r\n'
+            f'Content-Type: text/plain\r\n\r\n'.encode('utf-8') + content + b'\r\n'
+        )
+    body = b''.join(parts) + f'--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class InProcessTransport:
+    def __init__(self, application, timeout: float):
+        self.app = application
+        self.timeout = timeout
+
+    async def request(self, method, path, headers, body=b''):
+        from channels.testing import HttpCommunicator
+        # Django sizes the request body from content-length; HttpCommunicator doesn't set it
+        headers = {**headers, 'content-length': str(len(body))}
+        comm = HttpCommunicator(self.app, method, path, body=body,
+                                headers=[(k.encode(), v.encode()) for k, v in headers.items()])
+        response = await comm.get_response(timeout=self.timeout)
+        return response['status'], response['body']
+
+    async def websocket(self, path):
+        from channels.testing import WebsocketCommunicator
+        comm = WebsocketCommunicator(self.app, path)
+        connected, _ = await comm.connect(timeout=self.timeout)
+        if not connected:
+            raise RuntimeError(f'WebSocket rejected: {path}')
+        return _InProcessSocket(comm)
+
+    async def close(self):
+        pass
+
+
+class _InProcessSocket:
+    def __init__(self, comm):
+        self.comm = comm
+
+    async def receive_json(self, timeout):
+        return await self.comm.receive_json_from(timeout=timeout)
+
+    async def close(self):
+        await self.comm.disconnect()
+
+
+class LoopBoundLayer(InMemoryChannelLayer):
+    """InMemoryChannelLayer whose queues are only touched on the benchmark's loop.
+
+    Indexing threads send through async_to_sync on their own event loops,
+    which the stock layer doesn't support: its asyncio queues are not
+    thread-safe and progress events get lost.
+    """
+    loop = None
+
+    async def group_send(self, group, message):
+        if self.loop is None or asyncio.get_running_loop() is self.loop:
+            return await super().group_send(group, message)
+        send = super().group_send(group, message)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(send, self.loop))
+
+
+class RemoteTransport:
+    def __init__(self, base_url: str, timeout: float):
+        import httpx
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+        self.ws_base = base_url.replace('http', 'ws', 1)
+
+    async def request(self, method, path, headers, body=b''):
+        r = await self.client.request(method, path, headers=headers, content=body)
+        return r.status_code, r.content
+
+    async def websocket(self, path):
+        try:
+            import websockets
+        except ImportError:
+            raise SystemExit('--url mode needs the "websockets" package: pip install websockets')
+        return _RemoteSocket(await websockets.connect(self.ws_base + path))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class _RemoteSocket:
+    def __init__(self, ws):
+        self.ws = ws
+
+    async def receive_json(self, timeout):
+        return json.loads(await asyncio.wait_for(self.ws.recv(), timeout))
+
+    async def close(self):
+        await self.ws.close()
+
+
+class Stats:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lag_ms = []
+        self.events = 0
+
+    def record(self, op: str, ms: float, ok: bool):
+        self.latency[op].append(ms)
+        if not ok:
+            self.errors[op] += 1
+
+    def report(self, wall_s: float) -> dict:
+        ops = {}
+        for op, samples in self.latency.items():
+            ops[op] = {
+                **percentiles(samples),
+                'errors': self.errors[op],
+                'error_rate': round(self.errors[op] / len(samples), 4),
+                'per_s': round(len(samples) / wall_s, 2),
+            }
+        return {'wall_s': round(wall_s, 3), 'ops': ops, 'progress_events': self.events,
+                'progress_lag': percentiles(self.lag_ms)}
+
+
+async def _listen(ws, stats: Stats, pending: dict):
+    while True:
+        try:
+            event = await ws.receive_json(timeout=1.0)
+        except asyncio.TimeoutError:
+            continue
+        now = time.time()
+        stats.events += 1
+        if 'ts' in event:
+            stats.lag_ms.append((now - event['ts']) * 1000.0)
+        if event.get('stage') in ('done', 'error') and event.get('filename') in pending:
+            sent = pending.pop(event['filename'])
+            stats.record('index', (now - sent) * 1000.0, ok=event['stage'] == 'done')
+
+
+async def _timed(stats: Stats, op: str, coro):
+    t0 = time.perf_counter()
+    try:
+        status, _ = await coro
+        ok = status == 200
+    except Exception:
+        ok = False
+    stats.record(op, (time.perf_counter() - t0) * 1000.0, ok)
+
+
+async def _user(i: int, transport, args, stats: Stats):
+    rng = random.Random(i)
+    sub = f'load-{i}'
+    headers = {'authorization': f'Bearer mock:{sub}', 'host': 'localhost'}
+    ws = await transport.websocket(f'/ws/progress?sub={sub}')
+    pending = {}
+    listener = asyncio.create_task(_listen(ws, stats, pending))
+
+    async def uploads():
+        for u in range(args.uploads_per_user):
+            name = f'{sub}-{u}.txt'
+            body, ctype = _multipart([(name, synthetic_text(rng, args.words_per_file).encode('utf-8'))])
+            pending[name] = time.time()
+            await _timed(stats, 'upload', transport.request('POST', '/api/upload', {**headers, 'content-type': ctype}, body))
+            await asyncio.sleep(args.think_ms / 1000.0)
+
+    async def asks():
+        for _ in range(args.asks_per_user):
+            body = json.dumps({'question': synthetic_text(rng, 12)}).encode('utf-8')
+            await _timed(stats, 'ask', transport.request(
+                'POST', '/api/chat/ask', {**headers, 'content-type': 'application/json'}, body))
+            await asyncio.sleep(args.think_ms / 1000.0)
+
+    await asyncio.gather(uploads(), asks())
+    deadline = time.monotonic() + args.drain_timeout
+    while pending and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    for name in list(pending):
+        stats.record('index', args.drain_timeout * 1000.0, ok=False)
+        pending.pop(name)
+    listener.cancel()
+    await ws.close()
+
+
+async def _run(transport, args) -> dict:
+    stats = Stats()
+    if isinstance(transport, InProcessTransport):
+        from channels.layers import get_channel_layer
+        get_channel_layer().loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_user(i, transport, args, stats) for i in range(args.users)))
+    await transport.close()
+    return stats.report(time.perf_counter() - t0)
+
+
+def _in_process(args) -> dict:
+    from benchmarks import fake_llm
+    server = fake_llm.start(latency_ms=args.llm_latency_ms)
+    os.environ.pop('OPENAI_API_KEY', None)
+    os.environ['LLM_BASE_URL'] = f'http://127.0.0.1:{server.server_port}/v1'
+    os.environ.setdefault('DB_ENGINE', 'sqlite')
+    os.environ.setdefault('CHANNEL_LAYER', 'memory')
+    os.environ['OIDC_VERIFY'] = 'mock'
+    os.environ['WARMUP_OWNERS'] = '0'  # the scratch database doesn't exist yet at import
+
+    from benchmarks._common import scratch_database, setup_django
+    import tempfile
+    setup_django()
+    from django.conf import settings
+    from channels.layers import channel_layers
+    from django.db import connection
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'benchmarks.loadtest.LoopBoundLayer'}}
+    channel_layers.backends.clear()
+    if connection.vendor == 'sqlite':
+        # A file (not shared-memory) database so request and indexing threads can wait on locks
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'loadtest.sqlite3')
+        connection.settings_dict['OPTIONS']['timeout'] = 30
+    from backend.asgi import application
+    from api import indexing
+    with scratch_database():
+        result = asyncio.run(_run(InProcessTransport(application, args.request_timeout), args))
+        indexing._SCHEDULER.wait_idle()
+    server.shutdown()
+    return {**result, 'vendor': connection.vendor}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Base URL of a running server; default drives the app in-process')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--uploads-per-user', type=int, default=2)
+    parser.add_argument('--asks-per-user', type=int, default=5)
+    parser.add_argument('--words-per-file', type=int, default=3000)
+    parser.add_argument('--think-ms', type=float, default=0.0)
+    parser.add_argument('--llm-latency-ms', type=float, default=200.0, help='In-process fake LLM delay')
+    parser.add_argument('--request-timeout', type=float, default=60.0)
+    parser.add_argument('--drain-timeout', type=float, default=120.0,
+                        help='Seconds to wait for outstanding done events after the last request')
+    parser.add_argument('--out')
+    args = parser.parse_args()
+
+    if args.url:
+        result = {**asyncio.run(_run(RemoteTransport(args.url, args.request_timeout), args)), 'url': args.url}
+    else:
+        result = _in_process(args)
+    emit({'benchmark': 'loadtest', 'params': {k: v for k, v in vars(args).items() if k != 'out'}, **result}, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Scan latency and recall@k of reduced-dimension candidate search.
+
+Builds a synthetic owner index whose variance decays across dimensions (like
+real embeddings) and compares rag's exact scan with shortlisting on reduced
+vectors, by truncation and by PCA, at several target dimensions. Recall is
+the fraction of the exact top-k that the reduced search also returns. No
+database is needed; the scan is what differs.
+
+    python -m benchmarks.reduced_search --rows 50000 --dims 64,128,256 --out reduced_search.json
+    python -m benchmarks.reduced_search --rotate   # spectrum not aligned with the axes
+"""
+import argparse
+
+from benchmarks._common import emit, percentiles, setup_django, timed
+
+
+def _embeddings(rng, n: int, dim: int, decay: float, rotate: bool):
+    import numpy as np
+    scale = np.exp(-decay * np.arange(dim) / dim).astype(np.float32)
+    x = rng.standard_normal((n, dim), dtype=np.float32) * scale
+    if rotate:
+        # Truncation helps only when leading axes carry the signal (Matryoshka models)
+        basis, _ = np.linalg.qr(rng.standard_normal((dim, dim)))
+        x = x @ basis.astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--dims', default='64,128,256,512', help='Comma-separated reduced dimensions')
+    parser.add_argument('--decay', type=float, default=4.0, help='Per-dimension variance decay rate')
+    parser.add_argument('--rotate', action='store_true')
+    parser.add_argument('--fit-rows', type=int, default=10000, help='Rows sampled to fit PCA')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--rerank-factor', type=int, default=10)
+    parser.add_argument('--out')
+    args = parser.parse_args()
+
+    setup_django()
+    import numpy as np
+    from django.conf import settings
+    from api.projection import Projection, fit_pca
+    from api.rag import OwnerIndex, top_rows
+
+    settings.RETRIEVAL_RERANK_FACTOR = args.rerank_factor
+    rng = np.random.default_rng(0)
+    data = _embeddings(rng, args.rows + args.queries, args.dim, args.decay, args.rotate)
+    matrix, queries = data[:args.rows], data[args.rows:]
+    ids = np.arange(args.rows, dtype=np.int64)
+    exact_index = OwnerIndex(ids, ids, matrix, 1)
+    exact = [set(top_rows(exact_index, q, args.top_k)[0].tolist()) for q in queries]
+
+    def scan(index):
+        q = iter(queries)
+        return lambda: top_rows(index, next(q, queries[0]), args.top_k)
+
+    rows = [{'method': 'exact', 'dims': args.dim, 'recall': 1.0,
+             'index_mb': round(exact_index.nbytes / 2 ** 20, 1),
+             'scan': percentiles(timed(scan(exact_index), len(queries)))}]
+    sample = matrix[rng.choice(args.rows, min(args.fit_rows, args.rows), replace=False)]
+    for dims in sorted(int(d) for d in args.dims.split(',')):
+        for method in ('truncate', 'pca'):
+            projection = fit_pca(sample, dims) if method == 'pca' else Projection('truncate', dims)
+            index = OwnerIndex(ids, ids, matrix, 1, projection=projection, reduced=projection.reduce(matrix))
+            found = [set(top_rows(index, q, args.top_k)[0].tolist()) for q in queries]
+            rows.append({
+                'method': method,
+                'dims': dims,
+                'recall': round(sum(len(e & f) for e, f in zip(exact, found)) / (args.top_k * len(queries)), 4),
+                'index_mb': round(index.nbytes / 2 ** 20, 1),
+                'scan': percentiles(timed(scan(index), len(queries))),
+            })
+
+    emit({
+        'benchmark': 'reduced_search',
+        'rows': args.rows,
+        'dim': args.dim,
+        'rotate': args.rotate,
+        'top_k': args.top_k,
+        'rerank_factor': args.rerank_factor,
+        'results': rows,
+    }, args.out)
+
+
+if __name__ == '__main__':
+    main()
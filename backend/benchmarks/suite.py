@@ -0,0 +1,189 @@
+"""End-to-end benchmark suite on a synthetic corpus.
+
+For each corpus size (in chunks) it measures indexing throughput through
+index_file, rag.search latency, peak memory and POST /api/chat/ask latency,
+using the mock embedder and a fake LLM with a fixed delay. Sizes grow
+incrementally inside one throwaway database.
+
+    python -m benchmarks.suite --sizes 1k,100k --out before.json
+    DB_ENGINE=postgresql python -m benchmarks.suite --sizes 1k,100k,1m --out after.json
+    python -m benchmarks.compare before.json after.json
+
+Defaults to SQLite and the in-memory channel layer; export DB_ENGINE=postgresql
+(plus the usual POSTGRES_* variables) to run against a local Postgres.
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+from benchmarks._common import BACKEND_DIR, emit, percentiles, scratch_database, setup_django, synthetic_text, timed
+
+OWNER = 'mock-user'  # the subject mock OIDC auth assigns, so /api/chat/ask sees the corpus
+
+
+def _parse_size(text: str) -> int:
+    text = text.strip().lower()
+    for suffix, mult in (('k', 1000), ('m', 1000000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * mult)
+    return int(text)
+
+
+def _words_for(chunks: int, chunk_tokens: int, overlap: int) -> int:
+    # _chunk_text starts a new window every (chunk_tokens - overlap) words
+    return max(chunks, 1) * (chunk_tokens - overlap)
+
+
+def _index_documents(rng, chunks: int, args) -> dict:
+    """Run documents through the real index_file until `chunks` chunks exist."""
+    from api.indexing import index_file
+    produced, files, t0 = 0, 0, time.perf_counter()
+    while produced < chunks:
+        n = min(args.chunks_per_doc, chunks - produced)
+        text = synthetic_text(rng, _words_for(n, args.chunk_tokens, args.overlap))
+        index_file(OWNER, f'bench-{rng.random():.8f}.txt', text.encode('utf-8'), 'text/plain')
+        produced += n
+        files += 1
+    elapsed = time.perf_counter() - t0
+    return {
+        'files': files,
+        'chunks': produced,
+        'seconds': round(elapsed, 3),
+        'chunks_per_s': round(produced / elapsed, 1) if elapsed else None,
+        'files_per_s': round(files / elapsed, 2) if elapsed else None,
+    }
+
+
+def _bulk_load(rng, chunks: int, args):
+    """Fill the rest of a size step directly; only retrieval is measured on these rows."""
+    import numpy as np
+    from api.invalidation import publish
+    from api.models import Chunk, Document
+    nrng = np.random.default_rng(rng.randrange(1 << 30))
+    vocab = synthetic_text(rng, 2000).split()
+    remaining, added = chunks, []
+    while remaining > 0:
+        n = min(args.chunks_per_doc, remaining)
+        doc = Document.objects.create(owner_sub=OWNER, filename=f'bulk-{remaining}.txt', content_type='text/plain',
+                                      text='', status=Document.STATUS_INDEXED)
+        vectors = nrng.uniform(-1, 1, size=(n, args.dim)).tolist()
+        Chunk.objects.bulk_create([
+            Chunk(document=doc, owner_sub=OWNER, idx=i, embedding=vectors[i],
+                  text=' '.join(rng.choices(vocab, k=args.chunk_tokens)))
+            for i in range(n)
+        ], batch_size=1000)
+        added.append(doc.pk)
+        remaining -= n
+    if added:
+        publish(OWNER, added=added)
+
+
+def _memory_of(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1k,100k', help='Comma-separated corpus sizes in chunks, e.g. 1k,100k,1m')
+    parser.add_argument('--max-indexed-chunks', type=int, default=5000,
+                        help='Chunks per size step that go through index_file; the rest are bulk-loaded')
+    parser.add_argument('--chunks-per-doc', type=int, default=50)
+    parser.add_argument('--chunk-tokens', type=int, default=100)
+    parser.add_argument('--overlap', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=256, help='Must match the mock embedder')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--search-repeat', type=int, default=20)
+    parser.add_argument('--ask-repeat', type=int, default=10)
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0, help='Delay of the fake LLM')
+    parser.add_argument('--out')
+    args = parser.parse_args()
+
+    # Mock embedder and no external calls, whatever the shell environment says
+    os.environ.pop('OPENAI_API_KEY', None)
+    os.environ.setdefault('DB_ENGINE', 'sqlite')
+    os.environ.setdefault('CHANNEL_LAYER', 'memory')
+    setup_django()
+    from django.test import Client, override_settings
+    from api.embeddings import Embedder
+    from api.models import Chunk
+    from api.rag import search
+
+    def fake_llm(prompt: str) -> str:
+        if args.llm_latency_ms:
+            time.sleep(args.llm_latency_ms / 1000.0)
+        return '[BENCH ANSWER]'
+
+    sizes = sorted(_parse_size(s) for s in args.sizes.split(','))
+    rng = random.Random(42)
+    questions = [synthetic_text(rng, 12) for _ in range(max(args.search_repeat, args.ask_repeat))]
+    qvecs = Embedder().embed(questions)
+    client = Client()
+    rows = []
+
+    with override_settings(MAX_CHUNK_TOKENS=args.chunk_tokens, CHUNK_OVERLAP_TOKENS=args.overlap,
+                           ALLOWED_HOSTS=['*']), \
+            mock.patch('api.views._call_llm', fake_llm), \
+            scratch_database() as connection:
+        loaded = 0
+        for size in sizes:
+            step = size - loaded
+            indexed = min(step, args.max_indexed_chunks)
+            indexing = _index_documents(rng, indexed, args)
+            _bulk_load(rng, step - indexed, args)
+            loaded = size
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cur:
+                    cur.execute('ANALYZE api_chunk; ANALYZE api_document')
+
+            it = iter(range(10 ** 9))
+            search_ms = timed(lambda: search(OWNER, qvecs[next(it) % len(qvecs)], args.top_k), args.search_repeat)
+            search_peak = _memory_of(lambda: search(OWNER, qvecs[0], args.top_k))
+
+            def ask():
+                q = questions[next(it) % len(questions)]
+                r = client.post('/api/chat/ask', {'question': q, 'top_k': args.top_k},
+                                content_type='application/json', HTTP_AUTHORIZATION='Bearer bench')
+                if r.status_code != 200:
+                    raise RuntimeError(f'ask failed: {r.status_code} {r.content[:200]!r}')
+            ask_ms = timed(ask, args.ask_repeat)
+
+            rows.append({
+                'chunks': Chunk.objects.filter(owner_sub=OWNER).count(),
+                'indexing': indexing,
+                'search': percentiles(search_ms),
+                'search_peak_traced_bytes': search_peak,
+                'ask': percentiles(ask_ms),
+                'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            })
+            print(f'... {size} chunks done', file=sys.stderr)
+
+        emit({
+            'benchmark': 'suite',
+            'revision': _git_revision(),
+            'vendor': connection.vendor,
+            'params': {k: v for k, v in vars(args).items() if k != 'out'},
+            'results': rows,
+        }, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Per-owner query latency as the total number of tenants grows.
+
+With the (owner_sub, ...) indexes the probe owner's rag.search and document
+listing should stay flat while the table fills up with other tenants' rows.
+
+    python -m benchmarks.tenant_scan --tenants 10,100,1000 --out tenant_scan.json
+    python -m benchmarks.tenant_scan --partitions 16   # Postgres only
+"""
+import argparse
+import random
+
+from benchmarks._common import emit, percentiles, scratch_database, setup_django, timed
+
+
+def _load_tenants(start: int, stop: int, docs_per_owner: int, chunks_per_doc: int, dim: int):
+    from api.models import Chunk, Document
+    rng = random.Random(start)
+    for t in range(start, stop):
+        owner = f'tenant-{t}'
+        docs = Document.objects.bulk_create([
+            Document(owner_sub=owner, filename=f'doc-{d}.txt', content_type='text/plain', text='')
+            for d in range(docs_per_owner)
+        ])
+        Chunk.objects.bulk_create([
+            Chunk(document=doc, owner_sub=owner, idx=i, text=f'chunk {i} of {doc.filename}',
+                  embedding=[rng.uniform(-1, 1) for _ in range(dim)])
+            for doc in docs for i in range(chunks_per_doc)
+        ], batch_size=500)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', default='10,100,1000', help='Comma-separated total tenant counts')
+    parser.add_argument('--docs-per-owner', type=int, default=4)
+    parser.add_argument('--chunks-per-doc', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--partitions', type=int, default=0, help='Hash-partition api_chunk first (Postgres)')
+    parser.add_argument('--out')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from api.models import Chunk, Document
+    from api.rag import search
+
+    steps = sorted(int(x) for x in args.tenants.split(','))
+    probe = 'tenant-0'
+    query = [random.Random(0).uniform(-1, 1) for _ in range(args.dim)]
+    rows = []
+    with scratch_database() as connection:
+        if args.partitions:
+            call_command('partition_chunks', args.partitions)
+        loaded = 0
+        for total in steps:
+            _load_tenants(loaded, total, args.docs_per_owner, args.chunks_per_doc, args.dim)
+            loaded = total
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cur:
+                    cur.execute('ANALYZE api_chunk; ANALYZE api_document')
+
+            def list_documents():
+                list(Document.objects.filter(owner_sub=probe).order_by('-created_at').values('id', 'filename'))
+
+            rows.append({
+                'tenants': total,
+                'total_chunks': Chunk.objects.count(),
+                'search': percentiles(timed(lambda: search(probe, query, 5), args.repeat)),
+                'list_documents': percentiles(timed(list_documents, args.repeat)),
+            })
+
+        emit({
+            'benchmark': 'tenant_scan',
+            'vendor': connection.vendor,
+            'partitions': args.partitions,
+            'chunks_per_owner': args.docs_per_owner * args.chunks_per_doc,
+            'dim': args.dim,
+            'results': rows,
+        }, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Storage savings and per-ask decompression cost of compressed text columns.
+
+Compresses a corpus of chunks (synthetic by default, or real files through
+the indexing extractor) with each codec and reports bytes stored vs raw plus
+the time to decompress the top-k chunk texts an ask actually reads.
+
+    python -m benchmarks.text_compression --docs 200 --out text_compression.json
+    python -m benchmarks.text_compression --files ~/corpus/*.pdf
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks._common import emit, percentiles, setup_django, synthetic_text, timed
+
+CODECS = [('none', 0), ('zlib', 1), ('zlib', 6), ('zlib', 9), ('zstd', 3), ('zstd', 19)]
+
+
+def _corpus(args):
+    from django.conf import settings
+    from api.indexing import _chunk_text, _extract_text
+    if args.files:
+        docs = []
+        for path in args.files:
+            with open(path, 'rb') as f:
+                docs.append(_extract_text(os.path.basename(path), f.read(), ''))
+    else:
+        rng = random.Random(0)
+        docs = [synthetic_text(rng, rng.randint(500, args.max_words)) for _ in range(args.docs)]
+    chunks = [c for d in docs for c in _chunk_text(d, settings.MAX_CHUNK_TOKENS, settings.CHUNK_OVERLAP_TOKENS)]
+    return docs, chunks
+
+
+def _measure(label, docs, chunks, top_k, repeat):
+    from api.compression import compress_text, decompress_text
+    t0 = time.perf_counter()
+    blobs = [compress_text(c) for c in chunks]
+    compress_s = time.perf_counter() - t0
+    raw = sum(len(c.encode('utf-8')) for c in chunks) + sum(len(d.encode('utf-8')) for d in docs)
+    stored = sum(len(b) for b in blobs) + sum(len(compress_text(d)) for d in docs)
+    rng = random.Random(1)
+
+    def one_ask():
+        for b in rng.sample(blobs, min(top_k, len(blobs))):
+            decompress_text(b)
+    return {
+        'codec': label,
+        'raw_bytes': raw,
+        'stored_bytes': stored,
+        'ratio': round(raw / stored, 2) if stored else None,
+        'compress_mb_per_s': round(sum(len(c) for c in chunks) / 1e6 / compress_s, 1) if compress_s else None,
+        'decompress_per_ask': percentiles(timed(one_ask, repeat)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', nargs='*', help='Real documents to use instead of a synthetic corpus')
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--max-words', type=int, default=20000)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--out')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.exceptions import ImproperlyConfigured
+    from django.test import override_settings
+    from api import compression
+
+    docs, chunks = _corpus(args)
+    rows, skipped = [], []
+    for codec, level in CODECS:
+        label = f'{codec}-{level}' if codec != 'none' else codec
+        try:
+            with override_settings(TEXT_COMPRESSION=codec, TEXT_COMPRESSION_LEVEL=level, TEXT_COMPRESSION_DICT=''):
+                compression._load_dictionary.cache_clear()
+                rows.append(_measure(label, docs, chunks, args.top_k, args.repeat))
+        except ImproperlyConfigured as e:
+            skipped.append({'codec': label, 'reason': str(e)})
+
+    # Dictionary trained on half the chunks, measured on all of them
+    dict_path = os.path.join(tempfile.mkdtemp(), 'corpus.zdict')
+    try:
+        with open(dict_path, 'wb') as f:
+            f.write(compression.train_dictionary(chunks[::2], 112640))
+        with override_settings(TEXT_COMPRESSION='zstd', TEXT_COMPRESSION_LEVEL=3, TEXT_COMPRESSION_DICT=dict_path):
+            compression._load_dictionary.cache_clear()
+            rows.append(_measure('zstd-3+dict', docs, chunks, args.top_k, args.repeat))
+    except ImproperlyConfigured as e:
+        skipped.append({'codec': 'zstd-3+dict', 'reason': str(e)})
+    finally:
+        if os.path.exists(dict_path):
+            os.unlink(dict_path)
+        compression._load_dictionary.cache_clear()
+
+    emit({
+        'benchmark': 'text_compression',
+        'documents': len(docs),
+        'chunks': len(chunks),
+        'top_k': args.top_k,
+        'results': rows,
+        'skipped': skipped,
+    }, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+"""Test settings on top of backend.settings (loaded by pytest-django before this file).
+
+Run with DATABASE_URL=sqlite:///ci.sqlite3 (as CI does) or DB_ENGINE=sqlite.
+Progress events, index invalidation and the progress log stay in-process,
+so no Redis is needed.
+"""
+from django.conf import settings
+
+
+def pytest_configure(config):
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    settings.INVALIDATION_BUS = 'local'
+    settings.PROGRESS_LOG = 'local'
+    settings.RETRIEVAL_SNAPSHOT_DIR = ''
@@ -1,17 +1,49 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 
-export default function ProgressStream() {
+const LAST_ID_KEY = 'progressLastId';
+
+type Props = {
+  // Called when the server can't replay everything missed; the caller should reload its documents
+  onResync?: () => void;
+};
+
+export default function ProgressStream({ onResync }: Props) {
   const [events, setEvents] = useState<any[]>([]);
+  const onResyncRef = useRef(onResync);
+  onResyncRef.current = onResync;
 
   useEffect(() => {
     const WS_URL = import.meta.env.VITE_WS_URL || 'ws://localhost/ws/progress';
-    const sub = import.meta.env.VITE_OIDC_MOCK_SUB || 'mock-user';
-    const ws = new WebSocket(`${WS_URL}?sub=${encodeURIComponent(sub)}`);
-    ws.onmessage = (ev) => {
-      const data = JSON.parse(ev.data);
-      setEvents(prev => [data, ...prev].slice(0, 50));
+    let ws: WebSocket;
+    let retry: ReturnType<typeof setTimeout>;
+    let closed = false;
+
+    // The server takes the owner from the token; browsers can't set headers on a WebSocket.
+    // Reconnects resume after the last event seen (the first connect replays the whole log),
+    // so nothing is missed while disconnected
+    const connect = () => {
+      const token = localStorage.getItem('token') || '';
+      const lastId = sessionStorage.getItem(LAST_ID_KEY) || '0';
+      ws = new WebSocket(`${WS_URL}?access_token=${encodeURIComponent(token)}&last_id=${encodeURIComponent(lastId)}`);
+      ws.onmessage = (ev) => {
+        const data = JSON.parse(ev.data);
+        if (data.id) sessionStorage.setItem(LAST_ID_KEY, data.id);
+        if (data.stage === 'resync') {
+          onResyncRef.current?.();
+          return;
+        }
+        setEvents(prev => [data, ...prev].slice(0, 50));
+      };
+      ws.onclose = () => {
+        if (!closed) retry = setTimeout(connect, 2000);
+      };
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      ws.close();
     };
-    return () => ws.close();
   }, []);
 
   return (
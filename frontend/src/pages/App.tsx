@@ -85,7 +85,7 @@ export default function App() {
   <p className="ant-upload-hint">PDF, Markdown, Text</p>
 </Upload.Dragger>
           <Divider />
-          <ProgressStream />
+          <ProgressStream onResync={refresh} />
           <Divider />
           <List
             header={<div className="font-medium">Your Documents</div>}
@@ -69,7 +69,7 @@ export default function UploadPage() {
         )}
 
         <Divider />
-        <ProgressStream /> {/* server-side indexing progress via WebSocket */}
+        <ProgressStream onResync={refresh} /> {/* server-side indexing progress via WebSocket */}
       </Card>
 
       <Card title="Your Documents" className="shadow">
@@ -11,10 +11,16 @@ export async function getMe() {
   return r.json();
 }
 
-export async function listDocuments() {
-  const r = await fetch(`${API_URL}/documents`, { headers: { ...authHeader() } });
+export async function listDocumentsPage(cursor?: string) {
+  const qs = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+  const r = await fetch(`${API_URL}/documents${qs}`, { headers: { ...authHeader() } });
   if (!r.ok) throw new Error('Failed /documents');
-  return r.json();
+  return r.json() as Promise<{ results: any[]; next: string | null }>;
+}
+
+export async function listDocuments() {
+  // Newest page only; use listDocumentsPage(next) to walk further back
+  return (await listDocumentsPage()).results;
 }
 
 export async function uploadFiles(files: File[]) {